@@ -0,0 +1,120 @@
+import os
+import json
+
+# ==========================================
+# 追加写入的分析结果存储 (JSONL)
+# ==========================================
+# 每条分析完成后立即追加写入磁盘，内存中只保留 (score, domain, offset, brief) 索引，
+# 报告渲染时按索引排序/分组后逐条从文件读取，内存占用与文章数量无关。
+
+
+UNKNOWN_DOMAIN = '未知'
+
+
+def article_domain(analysis):
+    """分析结果所属领域；缺失或为空时归入「未知」(索引分组、渲染、归档统一使用)"""
+    return (analysis or {}).get('domain') or UNKNOWN_DOMAIN
+
+
+def get_store_path(output_dir, date_str):
+    """某一天的分析结果存储文件路径"""
+    return os.path.join(output_dir, "store", f"analyses_{date_str}.jsonl")
+
+
+class AnalysisStore:
+    """
+    按天存放的追加写入分析结果存储。
+    每行一个 JSON 对象 (即 process_feed 产出的 article 字典)。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = []  # [(score, domain, offset, brief), ...]，brief 表示预筛选跳过、只保留标题的条目
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        if os.path.exists(path):
+            self._rebuild_index()
+
+    def _rebuild_index(self):
+        """扫描已有文件重建索引 (用于重新渲染历史日报)"""
+        self.index = []
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    try:
+                        article = json.loads(line)
+                        self.index.append(self._index_entry(article, offset))
+                    except ValueError:
+                        print(f"[-] 跳过损坏的存储行 (offset={offset})")
+                offset += len(line)
+
+    @staticmethod
+    def _index_entry(article, offset):
+        analysis = article.get('analysis') or {}
+        try:
+            score = int(analysis.get('score', 0))
+        except (TypeError, ValueError):
+            score = 0
+        return (score, article_domain(analysis), offset, bool(article.get('prefiltered')))
+
+    def reset(self):
+        """清空当天的存储 (重新执行当天任务时使用)"""
+        with open(self.path, 'wb'):
+            pass
+        self.index = []
+
+    def append(self, article):
+        """追加一条分析结果"""
+        line = (json.dumps(article, ensure_ascii=False) + "\n").encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(line)
+        self.index.append(self._index_entry(article, offset))
+
+    def __len__(self):
+        return len(self.index)
+
+    def full_count(self):
+        """经过完整分析的条目数"""
+        return sum(1 for e in self.index if not e[3])
+
+    def sorted_index(self, group_by_domain=False):
+        """
+        完整分析条目的索引，按评分降序；group_by_domain 时先按领域聚合 (领域按最高分排序)。
+        """
+        entries = sorted((e for e in self.index if not e[3]), key=lambda e: (-e[0], e[2]))
+        if not group_by_domain:
+            return entries
+        domain_rank = {}
+        for rank, (_, domain, _, _) in enumerate(entries):
+            domain_rank.setdefault(domain, rank)
+        return sorted(entries, key=lambda e: (domain_rank[e[1]], -e[0], e[2]))
+
+    def brief_index(self):
+        """预筛选跳过的条目索引 (按预测评分降序)"""
+        return sorted((e for e in self.index if e[3]), key=lambda e: (-e[0], e[2]))
+
+    def view(self, predicate):
+        """
+        按条件筛选的只读视图 (共享同一文件和索引格式，可直接交给渲染器)。
+        用于多个订阅者从同一份分析结果分别生成日报。
+        """
+        view = AnalysisStore.__new__(AnalysisStore)
+        view.path = self.path
+        entries = sorted(self.index, key=lambda e: e[2])
+        view.index = [entry for entry, article in zip(entries, self.iter_articles(entries)) if predicate(article)]
+        return view
+
+    def iter_articles(self, entries=None):
+        """按给定索引顺序逐条读取文章 (默认评分降序)"""
+        if entries is None:
+            entries = self.sorted_index()
+        if not entries:
+            return
+        with open(self.path, 'rb') as f:
+            for _, _, offset, _ in entries:
+                f.seek(offset)
+                yield json.loads(f.readline())
@@ -0,0 +1,265 @@
+import os
+import gzip
+import json
+import time
+import base64
+import hashlib
+import datetime
+import threading
+from collections import defaultdict, deque
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+
+# ==========================================
+# 录制 / 回放 (Record / Replay)
+# ==========================================
+# record 模式: 拦截一次 job() 运行中所有出站 HTTP (requests) 和 DashScope SDK 调用，
+#              把请求摘要与响应写入压缩的 cassette 文件。
+# replay 模式: 按相同请求摘要依次返回录制的响应，可按原始耗时或零耗时回放，
+#              用于离线、确定性的日报回归测试和无网络噪声的 CPU 性能分析。
+#
+# 请求按 (方法, 去敏 URL, 请求体哈希) 匹配，同一请求多次出现时按录制顺序依次返回
+# (例如转写任务状态轮询)。回放时时钟会被拨回录制时刻，保证时间窗口过滤结果一致。
+
+# URL 中不参与匹配且不写入 cassette 的查询参数 (签名、时间戳、令牌)
+VOLATILE_PARAMS = {"timestamp", "sign", "access_token", "token", "api_key", "key"}
+# 回放时需要去掉的响应头 (录制的是解压后的内容)
+DROP_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+_ACTIVE = None
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """回放时找不到匹配的录制请求"""
+
+
+def now():
+    """当前时间；回放时返回录制时刻起算的时间，保证时间窗口判断与录制时一致"""
+    current = datetime.datetime.now()
+    if _ACTIVE is not None and _ACTIVE.mode == "replay":
+        return current - _ACTIVE.clock_offset
+    return current
+
+
+def sleep(seconds):
+    """等待指定秒数；零耗时回放时直接返回 (转写状态轮询、限频间隔不依赖真实时间)"""
+    if _ACTIVE is not None and _ACTIVE.mode == "replay" and _ACTIVE.latency == "zero":
+        return
+    time.sleep(seconds)
+
+
+def active():
+    return _ACTIVE
+
+
+def _clean_url(url):
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in VOLATILE_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def _body_digest(data=None, json_body=None):
+    if json_body is not None:
+        data = json.dumps(json_body, sort_keys=True, ensure_ascii=False)
+    if data is None:
+        return ""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if isinstance(data, dict):
+        data = urlencode(sorted(data.items())).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def _to_plain(obj):
+    """把 SDK 响应对象转换为可 JSON 序列化的结构"""
+    return json.loads(json.dumps(obj, ensure_ascii=False, default=lambda o: getattr(o, '__dict__', str(o))))
+
+
+class AttrDict(dict):
+    """支持属性访问的字典，用于回放 SDK 响应 (response.output.task_id 等)"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            return None
+
+    @classmethod
+    def wrap(cls, value):
+        if isinstance(value, dict):
+            return cls({k: cls.wrap(v) for k, v in value.items()})
+        if isinstance(value, list):
+            return [cls.wrap(v) for v in value]
+        return value
+
+
+class Cassette:
+    """一次运行的全部出站交互"""
+
+    def __init__(self, path, mode="record", latency="original"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"未知的 cassette 模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency  # original / zero
+        self.entries = []
+        self.queues = defaultdict(deque)
+        self.recorded_at = time.time()
+        self.clock_offset = datetime.timedelta(0)
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._patches = []
+        if mode == "replay":
+            self._load()
+
+    # ---------- 读写 ----------
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            self.recorded_at = header["recorded_at"]
+            for line in f:
+                entry = json.loads(line)
+                self.queues[entry["key"]].append(entry)
+        self.clock_offset = datetime.timedelta(seconds=time.time() - self.recorded_at)
+        total = sum(len(q) for q in self.queues.values())
+        print(f"[*] 回放 cassette: {self.path} ({total} 条交互，录制于 "
+              f"{datetime.datetime.fromtimestamp(self.recorded_at):%Y-%m-%d %H:%M})")
+
+    def save(self):
+        if self.mode != "record":
+            return
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({"recorded_at": self.recorded_at, "version": 1}) + "\n")
+            for entry in self.entries:
+                if "chunks" in entry:
+                    entry["body"] = base64.b64encode(b"".join(entry.pop("chunks"))).decode('ascii')
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        print(f"[+] 已录制 {len(self.entries)} 条交互: {self.path}")
+
+    # ---------- 回放 ----------
+
+    def _next(self, key):
+        with self._lock:
+            queue = self.queues.get(key)
+            if not queue:
+                self.misses += 1
+                raise CassetteMiss(f"cassette 中没有匹配的请求: {key}")
+            entry = queue.popleft()
+        if self.latency == "original" and entry.get("elapsed"):
+            time.sleep(entry["elapsed"])
+        return entry
+
+    # ---------- 拦截 requests ----------
+
+    def _patch_requests(self):
+        original = requests.Session.request
+        cassette = self
+
+        def request(session, method, url, **kwargs):
+            full_url = url
+            if kwargs.get('params'):
+                full_url += ('&' if '?' in url else '?') + urlencode(kwargs['params'])
+            key = f"HTTP {method.upper()} {_clean_url(full_url)} {_body_digest(kwargs.get('data'), kwargs.get('json'))}"
+            if cassette.mode == "replay":
+                entry = cassette._next(key)
+                resp = requests.Response()
+                resp.status_code = entry["status"]
+                resp.reason = entry.get("reason")
+                resp.headers.update(entry["headers"])
+                resp.url = url
+                resp.encoding = entry.get("encoding")
+                resp._content = base64.b64decode(entry["body"])
+                resp._content_consumed = True
+                resp.request = requests.Request(method, url).prepare()
+                resp.elapsed = datetime.timedelta(seconds=entry.get("elapsed", 0))
+                return resp
+
+            start = time.time()
+            resp = original(session, method, url, **kwargs)
+            entry = {
+                "key": key,
+                "status": resp.status_code,
+                "reason": resp.reason,
+                "headers": {k: v for k, v in resp.headers.items() if k.lower() not in DROP_RESPONSE_HEADERS},
+                "encoding": resp.encoding,
+                "elapsed": round(time.time() - start, 3),
+                "chunks": [],
+            }
+            with cassette._lock:
+                cassette.entries.append(entry)
+
+            if resp._content_consumed:
+                # 非流式请求在返回前已读取完响应体
+                entry["chunks"].append(resp.content or b"")
+                return resp
+
+            # 以旁路方式记录实际读取的响应体 (流式读取时只记录被消费的部分，保持大小上限)
+            iter_content = resp.iter_content
+
+            def tee(chunk_size=1, decode_unicode=False):
+                for chunk in iter_content(chunk_size, decode_unicode):
+                    entry["chunks"].append(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                    yield chunk
+
+            resp.iter_content = tee
+            return resp
+
+        requests.Session.request = request
+        self._patches.append((requests.Session, "request", original))
+
+    # ---------- 拦截 DashScope SDK ----------
+
+    def _patch_sdk_method(self, cls, name, label):
+        original = cls.__dict__[name]
+        bound = getattr(cls, name)
+        cassette = self
+
+        def call(*args, **kwargs):
+            params = {k: v for k, v in kwargs.items() if k not in ("api_key", "request_timeout")}
+            key = f"SDK {label} " + hashlib.sha1(
+                json.dumps([_to_plain(list(args)), _to_plain(params)], sort_keys=True).encode('utf-8')
+            ).hexdigest()[:16]
+            if cassette.mode == "replay":
+                return AttrDict.wrap(cassette._next(key)["response"])
+            start = time.time()
+            response = bound(*args, **kwargs)
+            with cassette._lock:
+                cassette.entries.append({"key": key, "elapsed": round(time.time() - start, 3),
+                                         "response": _to_plain(response)})
+            return response
+
+        setattr(cls, name, staticmethod(call))
+        self._patches.append((cls, name, original))
+
+    def _patch_dashscope(self):
+        try:
+            from dashscope import Generation
+            from dashscope.audio.asr import Transcription
+        except ImportError:
+            return
+        self._patch_sdk_method(Generation, "call", "Generation.call")
+        self._patch_sdk_method(Transcription, "async_call", "Transcription.async_call")
+        self._patch_sdk_method(Transcription, "fetch", "Transcription.fetch")
+
+    # ---------- 安装 / 卸载 ----------
+
+    def install(self):
+        global _ACTIVE
+        self._patch_requests()
+        self._patch_dashscope()
+        _ACTIVE = self
+        print(f"[*] Cassette {self.mode} 模式已启用 (回放耗时: {self.latency})")
+        return self
+
+    def uninstall(self):
+        global _ACTIVE
+        for cls, name, original in reversed(self._patches):
+            setattr(cls, name, original)
+        self._patches = []
+        _ACTIVE = None
+        if self.mode == "replay" and self.misses:
+            print(f"[!] 回放期间有 {self.misses} 个请求未在 cassette 中找到")
@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import datetime
+from analysis_store import AnalysisStore, article_domain
+
+# ==========================================
+# 历史归档 (SQLite + FTS5)
+# ==========================================
+# 每次运行后把当天的分析结果写入归档库，支持按关键词、领域、来源、评分区间检索，
+# 并在写入时增量维护周 / 月汇总 (rollups)，生成周报月报时无需回读历史日报文件。
+
+DEFAULT_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_reports", "archive.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    link TEXT UNIQUE NOT NULL,
+    digest_date TEXT NOT NULL,
+    published TEXT,
+    source TEXT,
+    original_title TEXT,
+    title TEXT,
+    one_sentence_summary TEXT,
+    summary TEXT,
+    key_takeaways TEXT,
+    domain TEXT,
+    score INTEGER,
+    reason TEXT,
+    is_podcast INTEGER DEFAULT 0,
+    excerpt TEXT,
+    prefilter_weight REAL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_date_score ON articles(digest_date, score);
+CREATE INDEX IF NOT EXISTS idx_articles_domain ON articles(domain);
+CREATE INDEX IF NOT EXISTS idx_articles_source ON articles(source);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    period_key TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    article_count INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, period_key, dimension, value)
+);
+
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, title, original_title, one_sentence_summary, summary, key_takeaways, excerpt)
+    VALUES (new.id, new.title, new.original_title, new.one_sentence_summary, new.summary, new.key_takeaways, new.excerpt);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, original_title, one_sentence_summary, summary, key_takeaways, excerpt)
+    VALUES ('delete', old.id, old.title, old.original_title, old.one_sentence_summary, old.summary, old.key_takeaways, old.excerpt);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, original_title, one_sentence_summary, summary, key_takeaways, excerpt)
+    VALUES ('delete', old.id, old.title, old.original_title, old.one_sentence_summary, old.summary, old.key_takeaways, old.excerpt);
+    INSERT INTO articles_fts(rowid, title, original_title, one_sentence_summary, summary, key_takeaways, excerpt)
+    VALUES (new.id, new.title, new.original_title, new.one_sentence_summary, new.summary, new.key_takeaways, new.excerpt);
+END;
+"""
+
+# excerpt 为正文开头片段，使只出现在正文中的词也能被检索到
+FTS_COLUMNS = "title, original_title, one_sentence_summary, summary, key_takeaways, excerpt"
+
+# 中文没有空格分词，优先使用 trigram 分词器 (SQLite >= 3.34)，否则退回 unicode61
+FTS_TOKENIZERS = ["trigram", "unicode61"]
+
+
+def period_keys(digest_date):
+    """返回某天所属的周 / 月汇总键，如 {'week': '2025-W03', 'month': '2025-01'}"""
+    day = datetime.datetime.strptime(digest_date, "%Y-%m-%d").date()
+    year, week, _ = day.isocalendar()
+    return {"week": f"{year}-W{week:02d}", "month": day.strftime("%Y-%m")}
+
+
+class DigestArchive:
+    """历史分析结果归档库"""
+
+    def __init__(self, db_file=DEFAULT_DB_FILE):
+        directory = os.path.dirname(db_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(db_file)
+        self.conn.row_factory = sqlite3.Row
+        self.tokenizer = self._create_fts_table()
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.commit()
+
+    def _migrate(self):
+        """为旧版本归档库补充新增的列"""
+        columns = {r[1] for r in self.conn.execute("PRAGMA table_info(articles)")}
+        if "excerpt" not in columns:
+            # 正文片段，用于训练本地预筛选模型
+            self.conn.execute("ALTER TABLE articles ADD COLUMN excerpt TEXT")
+        if "prefilter_weight" not in columns:
+            # 预筛选启用后入库文章的逆倾向权重 (见 DigestPipeline._prefilter)，NULL 表示入库时未启用预筛选
+            self.conn.execute("ALTER TABLE articles ADD COLUMN prefilter_weight REAL")
+        fts_sql = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'articles_fts'").fetchone()[0]
+        if "excerpt" not in fts_sql:
+            # 旧版全文索引不含正文片段: 按原分词器重建索引与同步触发器
+            self.conn.executescript(
+                "DROP TRIGGER IF EXISTS articles_ai; DROP TRIGGER IF EXISTS articles_ad; "
+                "DROP TRIGGER IF EXISTS articles_au; DROP TABLE articles_fts;"
+            )
+            self.tokenizer = self._create_fts_table([self.tokenizer])
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("INSERT INTO articles_fts(articles_fts) VALUES ('rebuild')")
+
+    def _create_fts_table(self, tokenizers=FTS_TOKENIZERS):
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'articles_fts'").fetchone()
+        if row:
+            return "trigram" if "trigram" in row[0] else "unicode61"
+        for tokenizer in tokenizers:
+            try:
+                self.conn.execute(
+                    f"CREATE VIRTUAL TABLE articles_fts USING fts5({FTS_COLUMNS}, "
+                    f"content='articles', content_rowid='id', tokenize='{tokenizer}')"
+                )
+                return tokenizer
+            except sqlite3.OperationalError:
+                continue
+        raise RuntimeError("当前 SQLite 不支持 FTS5")
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- 写入 ----------
+
+    def _update_rollups(self, digest_date, domain, source, score, sign):
+        for period, period_key in period_keys(digest_date).items():
+            for dimension, value in (("all", "*"), ("domain", domain), ("source", source)):
+                self.conn.execute(
+                    "INSERT INTO rollups (period, period_key, dimension, value, article_count, score_sum) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (period, period_key, dimension, value) DO UPDATE SET "
+                    "article_count = article_count + excluded.article_count, "
+                    "score_sum = score_sum + excluded.score_sum",
+                    (period, period_key, dimension, value or "未知", sign, sign * score),
+                )
+
+    def add_article(self, article, digest_date):
+        """写入 (或按链接覆盖) 一条分析结果，并增量更新周 / 月汇总"""
+        analysis = article.get('analysis') or {}
+        try:
+            score = int(analysis.get('score', 0))
+        except (TypeError, ValueError):
+            score = 0
+        row = {
+            "link": article['link'],
+            "digest_date": digest_date,
+            "published": article.get('published'),
+            "source": article.get('author') or "未知",
+            "original_title": article.get('original_title'),
+            "title": analysis.get('title_translated') or article.get('original_title'),
+            "one_sentence_summary": analysis.get('one_sentence_summary', ''),
+            "summary": analysis.get('summary', ''),
+            "key_takeaways": "\n".join(str(t) for t in analysis.get('key_takeaways', [])),
+            "domain": article_domain(analysis),
+            "score": score,
+            "reason": analysis.get('reason', ''),
+            "is_podcast": 1 if article.get('is_podcast') else 0,
+            "excerpt": article.get('excerpt'),
+            "prefilter_weight": article.get('prefilter_weight'),
+        }
+
+        old = self.conn.execute(
+            "SELECT id, digest_date, domain, source, score FROM articles WHERE link = ?", (row['link'],)
+        ).fetchone()
+        if old:
+            # 同一链接重复出现 (例如当天重跑)，先撤销旧记录对汇总的贡献
+            self._update_rollups(old['digest_date'], old['domain'], old['source'], old['score'], -1)
+            assignments = ", ".join(f"{key} = :{key}" for key in row)
+            self.conn.execute(f"UPDATE articles SET {assignments} WHERE id = :id", dict(row, id=old['id']))
+        else:
+            columns = ", ".join(row)
+            placeholders = ", ".join(f":{key}" for key in row)
+            self.conn.execute(f"INSERT INTO articles ({columns}) VALUES ({placeholders})", row)
+        self._update_rollups(digest_date, row['domain'], row['source'], score, 1)
+
+    def add_store(self, store, digest_date):
+        """
+        把一天的 AnalysisStore 写入归档。预筛选跳过的文章没有 LLM 评分，不入库；
+        被拦下一侧的情况由探索样本 (带 prefilter_weight) 代表。
+        """
+        count = 0
+        with self.conn:
+            for article in store.iter_articles(store.index):
+                if article.get('prefiltered'):
+                    continue
+                self.add_article(article, digest_date)
+                count += 1
+        self.conn.execute("DELETE FROM rollups WHERE article_count <= 0")
+        self.conn.commit()
+        return count
+
+    # ---------- 查询 ----------
+
+    def _fts_query(self, keyword):
+        terms = [t for t in keyword.split() if t]
+        return " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+    def search(self, keyword=None, domain=None, source=None, min_score=None, max_score=None,
+               since=None, until=None, limit=50):
+        """按关键词 / 领域 / 来源 / 评分区间 / 日期范围检索，结果按评分降序"""
+        clauses = []
+        params = []
+        join = ""
+        if keyword:
+            # trigram 分词器无法匹配少于 3 个字符的词，这类关键词退回 LIKE
+            if self.tokenizer == "trigram" and any(len(t) < 3 for t in keyword.split()):
+                # 与全文索引检索相同的列
+                columns = [c.strip() for c in FTS_COLUMNS.split(",")]
+                for term in keyword.split():
+                    clauses.append("(" + " OR ".join(f"a.{c} LIKE ?" for c in columns) + ")")
+                    params.extend([f"%{term}%"] * len(columns))
+            else:
+                join = "JOIN articles_fts f ON f.rowid = a.id"
+                clauses.append("articles_fts MATCH ?")
+                params.append(self._fts_query(keyword))
+        if domain:
+            clauses.append("a.domain = ?")
+            params.append(domain)
+        if source:
+            clauses.append("a.source = ?")
+            params.append(source)
+        if min_score is not None:
+            clauses.append("a.score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            clauses.append("a.score <= ?")
+            params.append(max_score)
+        if since:
+            clauses.append("a.digest_date >= ?")
+            params.append(since)
+        if until:
+            clauses.append("a.digest_date <= ?")
+            params.append(until)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT a.* FROM articles a {join} {where} "
+               f"ORDER BY a.score DESC, a.digest_date DESC LIMIT ?")
+        params.append(limit)
+        return [dict(r) for r in self.conn.execute(sql, params)]
+
+    def rollup(self, period, period_key, top_n=10):
+        """读取某周 / 某月的汇总: 总数、平均分、领域与来源分布、高分文章"""
+        rows = self.conn.execute(
+            "SELECT dimension, value, article_count, score_sum FROM rollups "
+            "WHERE period = ? AND period_key = ? ORDER BY article_count DESC",
+            (period, period_key),
+        ).fetchall()
+        result = {"period": period, "period_key": period_key, "article_count": 0, "avg_score": 0,
+                  "domains": [], "sources": [], "top_articles": []}
+        for r in rows:
+            avg = round(r['score_sum'] / r['article_count'], 1) if r['article_count'] else 0
+            if r['dimension'] == "all":
+                result["article_count"] = r['article_count']
+                result["avg_score"] = avg
+            else:
+                result[r['dimension'] + "s"].append({"name": r['value'], "count": r['article_count'], "avg_score": avg})
+
+        if period == "week":
+            year, week = period_key.split("-W")
+            start = datetime.date.fromisocalendar(int(year), int(week), 1)
+            end = start + datetime.timedelta(days=6)
+        else:
+            start = datetime.datetime.strptime(period_key + "-01", "%Y-%m-%d").date()
+            end = (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+        result["top_articles"] = self.search(since=start.isoformat(), until=end.isoformat(), limit=top_n)
+        return result
+
+
+def render_rollup_markdown(rollup):
+    """把汇总结果渲染为 Markdown 周报 / 月报"""
+    label = "周报" if rollup['period'] == "week" else "月报"
+    lines = [f"# 📊 【RSS】Digest {label} - {rollup['period_key']}\n\n",
+             f"> 共 {rollup['article_count']} 篇文章，平均评分 {rollup['avg_score']}\n\n"]
+    lines.append("## 🗂️ 领域分布\n\n")
+    for d in rollup['domains']:
+        lines.append(f"- `{d['name']}`: {d['count']} 篇 (平均 {d['avg_score']} 分)\n")
+    lines.append("\n## 📰 来源分布\n\n")
+    for s in rollup['sources'][:20]:
+        lines.append(f"- {s['name']}: {s['count']} 篇 (平均 {s['avg_score']} 分)\n")
+    lines.append("\n## ⭐ 高分文章\n\n")
+    for i, a in enumerate(rollup['top_articles'], 1):
+        lines.append(f"{i}. [{a['title']}]({a['link']}) - {a['source']} · `{a['domain']}` · {a['score']} 分\n")
+        if a['one_sentence_summary']:
+            lines.append(f"   > {a['one_sentence_summary']}\n")
+    return "".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查询 Daily Digest 历史归档")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="归档数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_search = sub.add_parser("search", help="检索历史文章")
+    p_search.add_argument("keyword", nargs="?", help="关键词 (空格分隔表示同时包含)；匹配标题、摘要、要点和正文开头片段")
+    p_search.add_argument("--domain")
+    p_search.add_argument("--source")
+    p_search.add_argument("--min-score", type=int)
+    p_search.add_argument("--max-score", type=int)
+    p_search.add_argument("--since", help="起始日期 YYYY-MM-DD")
+    p_search.add_argument("--until", help="截止日期 YYYY-MM-DD")
+    p_search.add_argument("--limit", type=int, default=50)
+    p_search.add_argument("--json", action="store_true", help="以 JSON 输出")
+
+    p_rollup = sub.add_parser("rollup", help="输出周报 / 月报汇总")
+    p_rollup.add_argument("period", choices=["week", "month"])
+    p_rollup.add_argument("period_key", nargs="?", help="如 2025-W03 或 2025-01，默认当前周期")
+    p_rollup.add_argument("--top", type=int, default=10)
+
+    p_import = sub.add_parser("import", help="从 JSONL 存储回填归档")
+    p_import.add_argument("files", nargs="+", help="daily_reports/store/analyses_YYYY-MM-DD.jsonl")
+
+    args = parser.parse_args()
+    archive = DigestArchive(args.db)
+
+    if args.command == "search":
+        results = archive.search(args.keyword, args.domain, args.source, args.min_score, args.max_score,
+                                 args.since, args.until, args.limit)
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+        else:
+            for a in results:
+                print(f"[{a['digest_date']}] {a['score']:>3} | {a['domain']} | {a['source']} | {a['title']}")
+                print(f"      {a['link']}")
+            print(f"[*] 共 {len(results)} 条结果")
+    elif args.command == "rollup":
+        period_key = args.period_key or period_keys(datetime.date.today().isoformat())[args.period]
+        print(render_rollup_markdown(archive.rollup(args.period, period_key, args.top)))
+    elif args.command == "import":
+        for path in args.files:
+            digest_date = os.path.basename(path).replace("analyses_", "").replace(".jsonl", "")
+            try:
+                period_keys(digest_date)
+            except ValueError:
+                print(f"[-] 无法从文件名识别日期: {path}")
+                sys.exit(1)
+            count = archive.add_store(AnalysisStore(path), digest_date)
+            print(f"[+] 已导入 {count} 篇: {path}")
+
+    archive.close()
@@ -0,0 +1,1216 @@
+import os
+import copy
+import re
+import json
+import time
+import asyncio
+import calendar
+import datetime
+import hmac
+import hashlib
+import base64
+import urllib.parse
+import requests
+import feedparser
+import html2text
+import cassette
+from podcast_analyzer import analyze_podcast_audio, find_audio_enclosure, screen_episode, ASR_MODEL, DEFAULT_SCREEN_POLICY, SCREEN_ACTIONS
+from report_renderer import iter_markdown_lines, iter_dingtalk_chunks
+from feed_health import FeedHealthTracker
+from http_fetch import stream_download, FetchAborted, NotModified, HTML_CONTENT_TYPES, FEED_CONTENT_TYPES
+from usage_ledger import UsageLedger
+from prefilter_ranker import PrefilterRanker, train_from_archive, TEXT_CHARS as PREFILTER_TEXT_CHARS
+from source_registry import canonical_url, dedup_feeds
+from llm_router import LLMRouter, DeepSeekProvider, QwenProvider
+
+# ==========================================
+# 日报流水线 (可嵌入的 asyncio 接口)
+# ==========================================
+# DigestPipeline 把一次日报运行拆成可替换的阶段:
+#   fetcher  - fetch(url, is_feed[, validators]) -> bytes / None
+#              (持续运行模式会传入条件请求的 validators，内容未变化时抛出 http_fetch.NotModified)
+#   analyzer - analyze(content, feed) / analyze_batch(items) / analyze_podcast(audio_url, feed[, expected_seconds]) -> dict / None
+#              (Feed 元数据给出预计音频时长时传入 expected_seconds，用于调整转写轮询节奏)
+#   notifier - send(title, chunks)
+# 阶段方法可以是普通函数 (放到线程池执行) 或协程函数。所有配置来自 DigestSettings 实例，
+# 不依赖模块级全局状态，可在同一进程中创建多个互不影响的流水线。
+#
+#   pipeline = DigestPipeline(DigestSettings(config))
+#   async for article in pipeline.run(feeds, window=datetime.timedelta(hours=24)):
+#       ...
+#
+# 持续运行模式 (realtime_watcher.py) 使用 fetch_feed / process_update 逐次处理单个 Feed 的更新。
+
+DEFAULT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 核心 Prompt
+# 单篇与批量请求都以它作为 system 消息的开头、文章内容放在其后，保证共享前缀逐字节一致，
+# 可以命中 DeepSeek 的前缀缓存；不要在其中插入日期、来源等随请求变化的内容。
+ARTICLE_ANALYSIS_PROMPT = """
+# 深度文章分析专家
+
+## 角色
+你是一位资深的行业分析师，擅长从长文中提炼高价值信息。
+
+## 目标
+深度阅读文章内容，生成一份包含关键细节的详细摘要。**拒绝空洞的套话，必须保留具体的论据、数据和事实。**
+
+## 分析要求
+1. **详细摘要 (summary)**:
+   - 字数要求: 300-600字。
+   - 内容要求: 必须涵盖文章的核心论点、支持这些论点的关键论据、引用的具体数据或案例、以及重要的事实陈述。
+   - 风格要求: 逻辑清晰，信息密度高，让读者不看原文也能获取 90% 的关键信息。
+2. **一句话总结 (one_sentence_summary)**: 50字以内，高度概括。
+3. **关键洞察 (key_takeaways)**: 3-5 个具体的深度洞察。
+
+## 输出格式 (JSON)
+请直接输出 JSON，不要包含 Markdown 代码块标记，确保 JSON 格式合法：
+{
+  "title_translated": "中文标题",
+  "one_sentence_summary": "一句话核心总结",
+  "summary": "详细摘要(包含观点、论据、数据、事实)",
+  "key_takeaways": ["关键洞察1", "关键洞察2", "关键洞察3"],
+  "domain": "所属领域",
+  "score": 85,
+  "reason": "评分理由"
+}
+"""
+
+# 批量模式追加说明 (拼接在 ARTICLE_ANALYSIS_PROMPT 之后，保持共享前缀不变)
+ARTICLE_BATCH_INSTRUCTIONS = """
+## 批量模式
+本次输入包含多篇相互独立的短文，每篇以 `=== 文章 id=N ===` 开头。
+请逐篇独立分析，不要混淆不同文章的内容。由于文章较短，summary 可适当精简 (100-300字)。
+直接输出一个 JSON 数组，数组中每个元素对应一篇文章，格式同上，并额外包含整数字段 "id" (与输入中的 id 一致)：
+[
+  {"id": 1, "title_translated": "...", "one_sentence_summary": "...", "summary": "...", "key_takeaways": ["..."], "domain": "...", "score": 85, "reason": "..."}
+]
+"""
+
+# 共享前缀的指纹 (Prompt 修改后缓存会失效，缓存报告中据此区分)
+ARTICLE_PROMPT_FINGERPRINT = hashlib.sha1(ARTICLE_ANALYSIS_PROMPT.encode('utf-8')).hexdigest()[:8]
+
+ANALYSIS_REQUIRED_FIELDS = ["title_translated", "one_sentence_summary", "summary", "domain"]
+
+# 摘要末尾的"阅读全文"类链接文字，出现在正文最后 30 个字符内即视为截断
+TRUNCATION_MARKERS = ["read more", "continue reading", "阅读全文", "阅读更多", "查看全文"]
+# 省略号只有出现在正文最末尾时才可能是截断: WordPress 的 [&hellip;] 摘要标记总是截断，
+# 单独的省略号只在正文不足 min_chars 两倍时才算 (完整文章以省略号结尾并不罕见)
+BRACKETED_ELLIPSES = ("[…]", "[...]")
+ELLIPSES = ("…", "...")
+
+FEED_CONTENT_POLICIES = ("auto", "always", "never")
+
+
+class DigestSettings:
+    """
+    一次日报运行的全部配置 (由 config.json 结构的字典构造)。
+    相对路径相对于 base_dir 解析。
+    """
+
+    def __init__(self, config=None, base_dir=DEFAULT_BASE_DIR):
+        config = config or {}
+
+        # API Key 配置
+        self.api_key = config.get("deepseek_api_key", "")
+        self.base_url = config.get("deepseek_base_url", "https://api.deepseek.com")
+        self.model = config.get("deepseek_model", "deepseek-chat")
+        self.time_window_hours = config.get("time_window_hours", 24)
+        self.limit_testing = config.get("limit_testing", False)
+
+        # 多供应商路由: 主供应商超过耗时分位数未返回时对冲到备用供应商，失败时自动回退
+        self.dashscope_api_key = config.get("dashscope_api_key", "")
+        routing_config = config.get("llm_routing", {})
+        self.llm_routing_enabled = routing_config.get("enabled", True)
+        self.llm_providers = routing_config.get("providers", ["deepseek", "qwen"])
+        self.qwen_model = routing_config.get("qwen_model", "qwen-turbo")
+        self.router_stats_file = os.path.join(base_dir, routing_config.get("stats_file", os.path.join("daily_reports", "llm_router.json")))
+        self.router_options = {
+            "hedge_percentile": routing_config.get("hedge_percentile", 90),
+            "min_samples": routing_config.get("min_samples", 20),
+            "default_hedge_seconds": routing_config.get("default_hedge_seconds", 20),
+            "min_hedge_seconds": routing_config.get("min_hedge_seconds", 2),
+            "failure_threshold": routing_config.get("failure_threshold", 3),
+            "cooldown_minutes": routing_config.get("cooldown_minutes", 10),
+        }
+        # 前缀缓存预热: 每次运行的第一个文章分析请求单独发出，完成后其余请求再并发，以命中其建立的缓存
+        self.cache_warmup = routing_config.get("cache_warmup", True)
+
+        # 流水线并发: 同时进行的抓取 / 分析请求数
+        pipeline_config = config.get("pipeline", {})
+        self.concurrency = max(1, int(pipeline_config.get("concurrency", 4)))
+
+        # 短文批量分析配置
+        batch_config = config.get("batch_analysis", {})
+        self.batch_enabled = batch_config.get("enabled", True)
+        self.batch_short_article_chars = batch_config.get("short_article_chars", 3000)
+        self.batch_max_tokens = batch_config.get("max_batch_tokens", 6000)
+        self.batch_max_items = batch_config.get("max_batch_items", 4)
+        self.batch_max_output_tokens = batch_config.get("max_output_tokens", 8000)
+
+        # Feed 全文配置: 当 RSS 条目已携带完整正文时直接使用，省去抓取原网页
+        feed_content_config = config.get("feed_content", {})
+        self.feed_content_enabled = feed_content_config.get("enabled", True)
+        self.feed_content_min_chars = feed_content_config.get("min_chars", 1500)
+        self.feed_content_min_paragraphs = feed_content_config.get("min_paragraphs", 3)
+        # 按 rss_url 或源名称覆盖策略: "auto" (启发式判断) / "always" (总是使用 Feed 正文) / "never" (总是抓取原网页)
+        self.feed_content_overrides = feed_content_config.get("overrides", {})
+        for key, policy in self.feed_content_overrides.items():
+            if policy not in FEED_CONTENT_POLICIES and not isinstance(policy, bool):
+                raise ValueError(f"feed_content.overrides[{key!r}] 不支持 {policy!r}，可选: {', '.join(FEED_CONTENT_POLICIES)}")
+
+        # 下载大小上限 (字节): 网页超出时截断，Feed 超出时放弃
+        http_config = config.get("http", {})
+        self.max_page_bytes = http_config.get("max_page_bytes", 5 * 1024 * 1024)
+        self.max_feed_bytes = http_config.get("max_feed_bytes", 10 * 1024 * 1024)
+
+        # 文件路径配置
+        files_config = config.get("files", {})
+        self.rss_map_file = os.path.join(base_dir, files_config.get("rss_map_file", "known_rss_map.json"))
+        self.source_file = os.path.join(base_dir, files_config.get("source_file", "channels_from_excel.json"))
+        self.podcast_opml_file = os.path.join(base_dir, files_config.get("podcast_opml_file", "BestBlogs_RSS_Podcasts_copy.opml"))
+        self.finder_file = os.path.join(base_dir, files_config.get("rss_finder_file", "rss_finder_results.json"))
+        self.source_index_file = os.path.join(base_dir, files_config.get("source_index_file", os.path.join("daily_reports", "source_index.json")))
+        # 映射表 / 探测结果中不在 source_file 里的站点是否也作为订阅源
+        self.include_unlisted_sites = files_config.get("include_unlisted_sites", False)
+        self.output_dir = os.path.join(base_dir, files_config.get("output_dir", "daily_reports"))
+
+        # 历史归档配置
+        archive_config = config.get("archive", {})
+        self.archive_enabled = archive_config.get("enabled", True)
+        self.archive_db_file = os.path.join(base_dir, archive_config.get("db_file", os.path.join("daily_reports", "archive.db")))
+
+        # 日报渲染配置
+        report_config = config.get("report", {})
+        self.report_template = report_config.get("template", "score")
+        self.report_formats = report_config.get("formats", ["markdown"])
+
+        # 订阅者 (见 subscriber_profiles.py)；为空时使用全局的来源、模板和钉钉配置
+        self.subscribers = config.get("subscribers", [])
+
+        # 本地预筛选配置: 预测评分低于阈值的文章只保留标题行，不调用 LLM
+        prefilter_config = config.get("prefilter", {})
+        self.prefilter_enabled = prefilter_config.get("enabled", True)
+        self.prefilter_model_file = os.path.join(base_dir, prefilter_config.get("model_file", os.path.join("daily_reports", "ranker_model.json")))
+        self.prefilter_threshold = prefilter_config.get("threshold", 60)
+        self.prefilter_high_value_score = prefilter_config.get("high_value_score", 80)
+        self.prefilter_min_samples = prefilter_config.get("min_training_samples", 200)
+        self.prefilter_min_recall = prefilter_config.get("min_recall", 0.9)
+        self.prefilter_retrain_days = prefilter_config.get("retrain_days", 7)
+        # 探索比例: 低于阈值的文章中按此比例仍交给 LLM 分析并入库，使重训与留出集评估能看到被拦下的一侧
+        self.prefilter_explore_rate = prefilter_config.get("explore_rate", 0.05)
+
+        # 用量账本与预算配置
+        usage_config = config.get("usage", {})
+        self.ledger_file = os.path.join(base_dir, usage_config.get("ledger_file", os.path.join("daily_reports", "usage_ledger.db")))
+        self.pricing = usage_config.get("pricing")
+        self.budgets = usage_config.get("budgets")
+
+        # 订阅源健康度 / 熔断配置
+        health_config = config.get("feed_health", {})
+        self.health_enabled = health_config.get("enabled", True)
+        self.health_file = os.path.join(base_dir, health_config.get("file", os.path.join("daily_reports", "feed_health.json")))
+        self.health_options = {
+            "failure_threshold": health_config.get("failure_threshold", 3),
+            "base_probe_hours": health_config.get("base_probe_hours", 12),
+            "max_probe_hours": health_config.get("max_probe_hours", 24 * 14),
+            "default_timeout": health_config.get("default_timeout", 15),
+            "slow_host_seconds": health_config.get("slow_host_seconds", 5),
+            "slow_timeout": health_config.get("slow_timeout", 8),
+            "failing_timeout": health_config.get("failing_timeout", 5),
+        }
+
+        # 持续运行模式 (daily_digest.py --watch，见 realtime_watcher.py)
+        realtime_config = config.get("realtime", {})
+        self.alert_min_score = realtime_config.get("alert_min_score", 85)
+        self.latency_file = os.path.join(base_dir, realtime_config.get("latency_file", os.path.join("daily_reports", "realtime_latency.jsonl")))
+        self.realtime_options = {
+            "poll_minutes": realtime_config.get("poll_interval_minutes", 10),
+            "callback_url": realtime_config.get("callback_url", ""),
+            "listen_host": realtime_config.get("listen_host", "0.0.0.0"),
+            "listen_port": realtime_config.get("listen_port", 8080),
+            "lease_seconds": realtime_config.get("lease_seconds", 86400),
+            "push_poll_hours": realtime_config.get("push_poll_hours", 6),
+            "alert_max_age_hours": realtime_config.get("alert_max_age_hours", 6),
+            "digest_time": realtime_config.get("digest_time", "08:00"),
+        }
+
+        # 播客预筛 (见 podcast_analyzer.screen_episode): 预告片 / 重播 / 超长节目的处理方式
+        # analyze / brief (只列标题) / defer (延后到本次运行最后再转写) / skip (忽略)
+        podcast_config = config.get("podcast", {})
+        self.podcast_policy = {
+            "trailer": podcast_config.get("trailer", "brief"),
+            "rerun": podcast_config.get("rerun", "brief"),
+            "oversized": podcast_config.get("oversized", "defer"),
+            "min_minutes": podcast_config.get("min_minutes", 2),
+            "max_minutes": podcast_config.get("max_minutes", 180),
+            "assumed_bitrate_kbps": podcast_config.get("assumed_bitrate_kbps", 128),
+            "rerun_patterns": podcast_config.get("rerun_patterns", DEFAULT_SCREEN_POLICY["rerun_patterns"]),
+            "trailer_patterns": podcast_config.get("trailer_patterns", DEFAULT_SCREEN_POLICY["trailer_patterns"]),
+        }
+        for kind in ("trailer", "rerun", "oversized"):
+            if self.podcast_policy[kind] not in SCREEN_ACTIONS:
+                raise ValueError(f"podcast.{kind} 不支持 {self.podcast_policy[kind]!r}，可选: {', '.join(SCREEN_ACTIONS)}")
+        # 转写状态轮询: 处理速度 (音频秒数 / 实际秒数，账本中有历史转写时以实测为准) 与最大查询间隔
+        self.asr_poll_options = {
+            "speed": podcast_config.get("asr_speed", 20),
+            "max_interval": podcast_config.get("max_poll_seconds", 60),
+        }
+
+        # DingTalk 配置
+        dingtalk_config = config.get("dingtalk", {})
+        self.dingtalk_webhook = dingtalk_config.get("webhook_url", "")
+        self.dingtalk_secret = dingtalk_config.get("secret", "")
+
+
+def replay_settings(settings):
+    """
+    回放模式下隔离所有持久化状态: 日报写入 output_dir/replay，账本使用独立文件，
+    不读写健康记录和路由统计、不写历史归档、不重训预筛选模型，保证回放结果只取决于 cassette。
+    回放按录制顺序串行执行且不发出对冲请求 (对冲与否取决于实时耗时，会导致请求序列与录制时不一致)，
+    保证日报中同分文章的顺序一致；录制时落败的主请求若未完成，回放时按失败处理并回退到下一个供应商。
+    """
+    replay = copy.copy(settings)
+    replay.output_dir = os.path.join(settings.output_dir, "replay")
+    if not os.path.exists(replay.output_dir):
+        os.makedirs(replay.output_dir)
+    replay.health_enabled = False
+    replay.archive_enabled = False
+    replay.prefilter_retrain_days = float("inf")
+    replay.concurrency = 1
+    replay.router_options = dict(settings.router_options, hedging=False)
+    replay.router_stats_file = None
+    replay.ledger_file = os.path.join(replay.output_dir, "usage_ledger.db")
+    if os.path.exists(replay.ledger_file):
+        os.remove(replay.ledger_file)
+    return replay
+
+
+# ==========================================
+# 工具函数
+# ==========================================
+
+def html_to_markdown(html_content):
+    """HTML 转 Markdown (支持 bytes 或 str)"""
+    if not html_content:
+        return ""
+
+    if isinstance(html_content, str):
+        html_text = html_content
+    else:
+        try:
+            html_text = html_content.decode('utf-8')
+        except:
+            try:
+                html_text = html_content.decode('gbk')
+            except:
+                html_text = html_content.decode('utf-8', errors='ignore')
+
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    h.ignore_images = True
+    h.body_width = 0
+    return h.handle(html_text)
+
+def get_feed_content_policy(feed, settings):
+    """获取某个源的 Feed 全文策略 (auto / always / never)"""
+    if not settings.feed_content_enabled:
+        return "never"
+    policy = feed.get("full_content")
+    if policy is None:
+        overrides = settings.feed_content_overrides
+        policy = overrides.get(feed['rss_url'], overrides.get(feed['name'], "auto"))
+    if policy is True:
+        return "always"
+    if policy is False:
+        return "never"
+    if policy not in FEED_CONTENT_POLICIES:
+        raise ValueError(f"{feed['name']} 的 full_content 不支持 {policy!r}，可选: {', '.join(FEED_CONTENT_POLICIES)}")
+    return policy
+
+def extract_feed_full_text(entry, policy="auto", min_chars=1500, min_paragraphs=3):
+    """
+    如果 RSS 条目 (content:encoded / Atom content) 已包含完整正文，返回其 HTML；否则返回 None。
+    auto 模式下按长度、段落数和末尾的截断标记 ("阅读全文" 链接、[…]、短文末尾的省略号) 判断是否为全文。
+    """
+    if policy == "never":
+        return None
+
+    html = ""
+    for content in entry.get('content', []) or []:
+        value = content.get('value', '')
+        if len(value) > len(html):
+            html = value
+    if not html and policy == "always":
+        html = entry.get('summary', '')
+    if not html:
+        return None
+    if policy == "always":
+        return html
+
+    text = re.sub(r'<[^>]+>', ' ', html)
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) < min_chars:
+        return None
+    paragraphs = len(re.findall(r'<(?:p|br|li|h[1-6])[\s>/]', html, re.IGNORECASE))
+    if paragraphs < min_paragraphs:
+        return None
+    tail = text[-30:].lower()
+    if any(marker in tail for marker in TRUNCATION_MARKERS):
+        return None
+    if text.endswith(BRACKETED_ELLIPSES):
+        return None
+    if text.endswith(ELLIPSES) and len(text) < min_chars * 2:
+        return None
+    return html
+
+def brief_analysis(title, score=0, domain=None):
+    """未经 LLM 分析、只在日报中保留标题行的简要条目"""
+    return {"title_translated": title, "score": score, "domain": domain or "未知"}
+
+def load_prefilter_ranker(settings, log=print):
+    """加载预筛选模型；样本不足或留出集召回率不达标时不启用"""
+    if not settings.prefilter_enabled:
+        return None
+    try:
+        ranker = PrefilterRanker.load(settings.prefilter_model_file)
+    except Exception as e:
+        log(f"[-] 预筛选模型加载失败: {e}")
+        return None
+    if ranker is None:
+        return None
+    metrics = ranker.metrics
+    if metrics.get("train_samples", 0) < settings.prefilter_min_samples:
+        log(f"[*] 预筛选模型样本不足 ({metrics.get('train_samples', 0)} < {settings.prefilter_min_samples})，暂不启用")
+        return None
+    if metrics.get("recall") is None:
+        log(f"[*] 预筛选模型留出集评估不可用 ({metrics.get('unavailable', '缺少评估指标')})，暂不启用")
+        return None
+    if metrics["recall"] < settings.prefilter_min_recall:
+        log(f"[*] 预筛选模型留出集召回率 {metrics.get('recall')} 低于 {settings.prefilter_min_recall}，暂不启用")
+        return None
+    log(f"[*] 预筛选已启用: 阈值 {settings.prefilter_threshold}，留出集 precision={metrics.get('precision')} recall={metrics.get('recall')}")
+    return ranker
+
+def maybe_retrain_prefilter(settings, log=print):
+    """模型不存在或超过 retrain_days 天未更新时，从历史归档重新训练"""
+    if not (settings.prefilter_enabled and settings.archive_enabled):
+        return
+    if os.path.exists(settings.prefilter_model_file):
+        age_days = (time.time() - os.path.getmtime(settings.prefilter_model_file)) / 86400
+        if age_days < settings.prefilter_retrain_days:
+            return
+    try:
+        train_from_archive(settings.archive_db_file, settings.prefilter_model_file,
+                           settings.prefilter_threshold, settings.prefilter_high_value_score, log=log)
+    except Exception as e:
+        log(f"[-] 预筛选模型训练失败: {e}")
+
+def estimate_tokens(text):
+    """粗略估算 token 数: 中日韩字符约 1 token/字，其余约 4 字符/token"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if '\u3000' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af')
+    return cjk + (len(text) - cjk) // 4 + 1
+
+def validate_analysis(item):
+    """
+    校验并规范化单篇分析结果。
+    缺少必要字段或评分无法解析时返回 None。
+    """
+    if not isinstance(item, dict):
+        return None
+    for field in ANALYSIS_REQUIRED_FIELDS:
+        value = item.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return None
+    try:
+        score = int(float(item.get("score")))
+    except (TypeError, ValueError):
+        return None
+    item["score"] = max(0, min(100, score))
+    takeaways = item.get("key_takeaways")
+    if isinstance(takeaways, str):
+        takeaways = [takeaways]
+    elif not isinstance(takeaways, list):
+        takeaways = []
+    item["key_takeaways"] = [str(t) for t in takeaways if t]
+    item.setdefault("reason", "")
+    return item
+
+def parse_batch_response(text):
+    """从批量响应中提取 JSON 数组 (容忍代码块标记和外层对象包装)"""
+    text = text.replace('```json', '').replace('```', '').strip()
+    if '[' in text and ']' in text:
+        candidate = text[text.find('['):text.rfind(']') + 1]
+        try:
+            data = json.loads(candidate)
+            if isinstance(data, list):
+                return data
+        except ValueError:
+            pass
+    data = json.loads(text)
+    if isinstance(data, dict):
+        for value in data.values():
+            if isinstance(value, list):
+                return value
+    return data if isinstance(data, list) else []
+
+def pack_batches(pending, max_tokens=6000, max_items=4):
+    """
+    按 token 预算把待分析短文打包成批次。
+    pending: [(id, title, content, feed), ...]
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for item in pending:
+        tokens = estimate_tokens(item[1]) + estimate_tokens(item[2])
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+# ==========================================
+# 默认阶段实现
+# ==========================================
+
+class HttpFetcher:
+    """
+    默认抓取阶段: 有界流式下载 (返回 bytes)。
+    按主机健康度选择超时，熔断中的主机 (或 Feed) 直接跳过；
+    非 HTML / 非 Feed 类型的响应 (PDF、视频等) 在读取响应体前中止。
+    """
+
+    def __init__(self, health=None, max_page_bytes=5 * 1024 * 1024, max_feed_bytes=10 * 1024 * 1024, log=print):
+        self.health = health
+        self.max_page_bytes = max_page_bytes
+        self.max_feed_bytes = max_feed_bytes
+        self.log = log
+
+    def fetch(self, url, is_feed=False, validators=None):
+        health = self.health
+        if health:
+            if not health.allow(url, is_feed=is_feed):
+                self.log(f"[-] 熔断中，跳过请求 {url}")
+                return None
+            timeout = health.timeout_for(url)
+        else:
+            timeout = 15
+
+        start = time.time()
+        try:
+            if is_feed:
+                content = stream_download(url, timeout=timeout, max_bytes=self.max_feed_bytes, allowed_types=FEED_CONTENT_TYPES,
+                                          validators=validators, log=self.log)
+            else:
+                content = stream_download(url, timeout=timeout, max_bytes=self.max_page_bytes, allowed_types=HTML_CONTENT_TYPES, truncate=True,
+                                          log=self.log)
+            if health:
+                health.record_host(url, True, time.time() - start)
+            return content
+        except NotModified:
+            if health:
+                health.record_host(url, True, time.time() - start)
+            raise
+        except (requests.exceptions.HTTPError, FetchAborted) as e:
+            # 对端有响应即视为主机可达，HTTP 错误只计入 Feed 级健康度
+            if health:
+                health.record_host(url, True, time.time() - start)
+            self.log(f"[-] 请求失败 {url}: {e}")
+            return None
+        except Exception as e:
+            if health:
+                health.record_host(url, False, time.time() - start, e)
+            self.log(f"[-] 请求失败 {url}: {e}")
+            return None
+
+
+def parse_analysis_response(text):
+    """解析单篇分析响应，返回通过校验的分析结果 (不合法时返回 None)"""
+    # 清理可能的 markdown 标记
+    text = text.replace('```json', '').replace('```', '').strip()
+    return validate_analysis(json.loads(text))
+
+def parse_batch_analysis_response(text):
+    """解析批量分析响应，空数组视为不合法"""
+    return parse_batch_response(text) or None
+
+def build_router(settings, log=print):
+    """按配置构造 LLM 路由: DeepSeek 为主，配置了 DashScope Key 时 Qwen 作为对冲 / 回退供应商"""
+    available = {"deepseek": DeepSeekProvider(settings.api_key, settings.base_url, settings.model)}
+    if settings.dashscope_api_key:
+        available["qwen"] = QwenProvider(settings.dashscope_api_key, settings.qwen_model)
+    providers = [available[name] for name in settings.llm_providers if name in available]
+    if not settings.llm_routing_enabled:
+        providers = providers[:1]
+    # 每个并发的分析请求最多同时占用两个线程 (主请求 + 对冲)，另为后台完成的落败请求预留 concurrency 个
+    return LLMRouter(providers or [available["deepseek"]], settings.router_stats_file, log=log,
+                     max_workers=3 * settings.concurrency, max_abandoned=settings.concurrency, **settings.router_options)
+
+
+class LLMAnalyzer:
+    """
+    默认分析阶段: 文章经 LLMRouter 分析 (主供应商慢或失败时对冲 / 回退到备用供应商)，
+    播客由 DashScope 转写并分析。用量按实际响应的供应商和来源记入账本。
+    """
+
+    def __init__(self, router, ledger=None, max_output_tokens=8000, asr_poll=None, dashscope_api_key="", log=print):
+        self.router = router
+        self.ledger = ledger
+        self.max_output_tokens = max_output_tokens
+        self.asr_poll = asr_poll
+        self.dashscope_api_key = dashscope_api_key
+        self.log = log
+
+    def _budget_exceeded(self, feed=None):
+        return self.ledger is not None and self.ledger.budget_exceeded("llm", feed)
+
+    def analyze(self, content, feed=None):
+        """分析单篇文章 (预算用尽或所有供应商都失败时返回 None)"""
+        if self._budget_exceeded(feed):
+            return None
+
+        if len(content) > 10000:
+            content = content[:10000] + "...(truncated)"
+
+        def on_usage(provider, usage, latency, ok):
+            if self.ledger:
+                self.ledger.record_openai_usage(usage, "article", provider.ledger_provider, provider.model, feed,
+                                                latency=latency, ok=ok)
+
+        analysis, _ = self.router.complete([
+            {"role": "system", "content": ARTICLE_ANALYSIS_PROMPT},
+            {"role": "user", "content": content}
+        ], parse_analysis_response, timeout=60, on_usage=on_usage)
+        return analysis
+
+    def analyze_batch(self, items):
+        """
+        一次请求分析多篇短文。
+        items: [(id, title, content, feed), ...]
+        返回 {id: analysis}，只包含通过校验的条目。批量用量按各篇长度拆分记入各自来源。
+        所属来源预算已用尽的条目不发送，同样不出现在结果中。
+        """
+        items = [item for item in items if not self._budget_exceeded(item[3])]
+        if not items:
+            return {}
+
+        blocks = []
+        for item_id, title, content, _ in items:
+            blocks.append(f"=== 文章 id={item_id} ===\n标题: {title}\n\n{content}")
+        user_content = "\n\n".join(blocks)
+        feeds_weights = [(feed, estimate_tokens(content)) for _, _, content, feed in items]
+
+        def on_usage(provider, usage, latency, ok):
+            if self.ledger:
+                self.ledger.record_split(usage, feeds_weights, "article_batch", provider.ledger_provider, provider.model,
+                                         latency=latency, ok=ok)
+
+        parsed, _ = self.router.complete([
+            {"role": "system", "content": ARTICLE_ANALYSIS_PROMPT + ARTICLE_BATCH_INSTRUCTIONS},
+            {"role": "user", "content": user_content}
+        ], parse_batch_analysis_response, timeout=120, max_tokens=self.max_output_tokens, on_usage=on_usage, kind="batch")
+        if not parsed:
+            return {}
+
+        valid_ids = {item[0] for item in items}
+        analyses = {}
+        for entry in parsed:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                item_id = int(entry.pop("id"))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if item_id not in valid_ids or item_id in analyses:
+                continue
+            analysis = validate_analysis(entry)
+            if analysis:
+                analyses[item_id] = analysis
+        return analyses
+
+    def analyze_podcast(self, audio_url, feed=None, expected_seconds=None):
+        """DashScope 转写 + Qwen 摘要 (expected_seconds 为预计音频时长，用于调整轮询节奏)"""
+        return analyze_podcast_audio(audio_url, ledger=self.ledger, feed=feed, expected_seconds=expected_seconds,
+                                     poll_options=self.asr_poll, api_key=self.dashscope_api_key or None, log=self.log)
+
+
+class DingTalkNotifier:
+    """默认通知阶段: 钉钉机器人 Markdown 消息 (支持加签与长文本分段)"""
+
+    def __init__(self, webhook, secret="", log=print):
+        self.webhook = webhook
+        self.secret = secret
+        self.log = log
+
+    def send(self, title, chunks):
+        """逐段发送钉钉 Markdown 消息 (chunks 可以是生成器，边渲染边发送)"""
+        if not self.webhook:
+            self.log("[-] 未配置钉钉 Webhook，跳过发送。")
+            return
+
+        # 强制添加关键字前缀，确保触发钉钉安全设置
+        if "【RSS】" not in title:
+            title = f"【RSS】{title}"
+
+        webhook_url = self.webhook
+
+        # 如果配置了加签 (Secret)
+        if self.secret:
+            timestamp = str(round(time.time() * 1000))
+            secret_enc = self.secret.encode('utf-8')
+            string_to_sign = '{}\n{}'.format(timestamp, self.secret)
+            string_to_sign_enc = string_to_sign.encode('utf-8')
+            hmac_code = hmac.new(secret_enc, string_to_sign_enc, digestmod=hashlib.sha256).digest()
+            sign = urllib.parse.quote_plus(base64.b64encode(hmac_code))
+            webhook_url = f"{self.webhook}&timestamp={timestamp}&sign={sign}"
+
+        for i, chunk in enumerate(chunks):
+            # 钉钉 Markdown 消息
+            chunk_title = title if i == 0 else f"{title} (Part {i+1})"
+            data = {
+                "msgtype": "markdown",
+                "markdown": {
+                    "title": chunk_title,
+                    "text": chunk
+                }
+            }
+
+            try:
+                resp = requests.post(webhook_url, json=data)
+                if resp.json().get("errcode") == 0:
+                    self.log(f"[+] 钉钉通知 (Part {i+1}) 发送成功")
+                else:
+                    self.log(f"[-] 钉钉通知 (Part {i+1}) 发送失败: {resp.text}")
+
+                # 稍微延时避免触发频率限制
+                cassette.sleep(1)
+
+            except Exception as e:
+                self.log(f"[-] 发送钉钉请求异常: {e}")
+
+
+# ==========================================
+# 流水线
+# ==========================================
+
+_DONE = object()
+
+
+class DigestPipeline:
+    """
+    可嵌入的日报流水线。未显式传入的阶段与状态组件按 settings 构造默认实现。
+    同一实例同一时间只应执行一个 run()。
+    """
+
+    def __init__(self, settings=None, fetcher=None, analyzer=None, notifier=None,
+                 ledger=None, health=None, ranker=None, router=None, log=print):
+        self.settings = settings or DigestSettings()
+        settings = self.settings
+        self.log = log
+        if health is None and settings.health_enabled:
+            health = FeedHealthTracker(settings.health_file, log=log, **settings.health_options)
+        self.health = health
+        if ledger is None:
+            ledger = UsageLedger(settings.ledger_file, pricing=settings.pricing, budgets=settings.budgets,
+                                 clock=cassette.now, log=log)
+        self.ledger = ledger
+        self.fetcher = fetcher or HttpFetcher(health, settings.max_page_bytes, settings.max_feed_bytes, log=log)
+        if analyzer is None:
+            router = router or build_router(settings, log)
+            analyzer = LLMAnalyzer(router, ledger, settings.batch_max_output_tokens, settings.asr_poll_options,
+                                   settings.dashscope_api_key, log=log)
+        self.analyzer = analyzer
+        self.router = router
+        self.notifier = notifier or DingTalkNotifier(settings.dingtalk_webhook, settings.dingtalk_secret, log=log)
+        self.ranker = ranker if ranker is not None else load_prefilter_ranker(settings, log)
+        self._reset_stats()
+        # 本次运行中每个条目链接 (规范化) 出现过的所有订阅源名称，重复条目只分析一次
+        self.link_feeds = {}
+        self._semaphore = None
+        self._prefix_warm = None
+
+    def _reset_stats(self):
+        self.stats = {"feed_content": 0, "page_fetch": 0, "prefilter_passed": 0, "prefilter_skipped": 0,
+                      "prefilter_explored": 0,
+                      "podcast_transcribed": 0, "podcast_expected_seconds": 0.0, "podcast_unknown_duration": 0,
+                      "podcast_brief": 0, "podcast_deferred": 0, "podcast_skipped": 0}
+
+    # ---------- 阶段调用 ----------
+
+    async def _call(self, func, *args):
+        """调用阶段方法: 协程函数直接等待，普通函数放到线程池执行"""
+        if asyncio.iscoroutinefunction(func):
+            return await func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    async def _limited(self, func, *args):
+        """受并发上限约束的阶段调用"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.settings.concurrency)
+        async with self._semaphore:
+            return await self._call(func, *args)
+
+    async def _analyze(self, func, *args):
+        """
+        文章分析调用 (单篇与批量共享 ARTICLE_ANALYSIS_PROMPT 前缀)。
+        启用 cache_warmup 时，第一个请求单独发出，其余请求等它完成后再并发，
+        避免并发的首批请求同时未命中前缀缓存。
+        """
+        if self.settings.cache_warmup:
+            if self._prefix_warm is None:
+                self._prefix_warm = asyncio.Event()
+                try:
+                    return await self._limited(func, *args)
+                finally:
+                    self._prefix_warm.set()
+            await self._prefix_warm.wait()
+        return await self._limited(func, *args)
+
+    def _budget_exceeded(self, kind, feed=None):
+        return self.ledger is not None and self.ledger.budget_exceeded(kind, feed)
+
+    async def _stream(self, jobs):
+        """并发执行 jobs (接收 emit 回调的协程函数)，按完成顺序产出 emit 的结果"""
+        queue = asyncio.Queue()
+
+        async def runner(job):
+            try:
+                await job(queue.put_nowait)
+            except Exception as e:
+                self.log(f"[-] 流水线任务失败: {e}")
+            finally:
+                queue.put_nowait(_DONE)
+
+        tasks = [asyncio.ensure_future(runner(job)) for job in jobs]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await queue.get()
+                if item is _DONE:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # ---------- 运行 ----------
+
+    async def run(self, feeds, window=None):
+        """
+        处理一组订阅源，按完成顺序逐条产出文章字典 (含 analysis)。
+        window: 时间窗口 (datetime.timedelta 或小时数)，默认使用 settings.time_window_hours。
+        短文在所有订阅源处理完后合并为批量请求，其结果随后产出；按策略延后的超长播客最后依次转写。
+        规范化地址相同的订阅源只抓取一次，多个源中链接相同的条目只分析一次。
+        """
+        settings = self.settings
+        if window is None:
+            window = settings.time_window_hours
+        if not isinstance(window, datetime.timedelta):
+            window = datetime.timedelta(hours=window)
+
+        self._semaphore = asyncio.Semaphore(settings.concurrency)
+        self._prefix_warm = None
+        self._reset_stats()
+        # 回放时以录制时刻为准
+        now = cassette.now()
+        pending = []
+        self.link_feeds = {}
+
+        unique_feeds = dedup_feeds(feeds)
+        if len(unique_feeds) < len(feeds):
+            self.log(f"[*] 跳过 {len(feeds) - len(unique_feeds)} 个重复订阅源")
+
+        def feed_job(index, feed):
+            async def job(emit):
+                await self._process_feed(feed, index, now, window, emit, pending)
+            return job
+
+        async for article in self._stream([feed_job(i, feed) for i, feed in enumerate(unique_feeds)]):
+            yield article
+
+        self.log(f"[*] 正文来源: Feed 全文 {self.stats['feed_content']} 篇 (节省网页请求)，网页抓取 {self.stats['page_fetch']} 篇")
+        if self.ranker:
+            self.log(f"[*] 预筛选: 通过 {self.stats['prefilter_passed']} 篇，跳过 LLM {self.stats['prefilter_skipped']} 篇，"
+                     f"探索样本 {self.stats['prefilter_explored']} 篇")
+
+        # 按订阅源与条目顺序排列，保证批次划分与并发完成顺序无关
+        pending.sort(key=lambda a: a.pop('_order'))
+        deferred = [a for a in pending if '_podcast' in a]
+        async for article in self._analyze_pending([a for a in pending if '_podcast' not in a]):
+            yield article
+        async for article in self._analyze_deferred_podcasts(deferred):
+            yield article
+        self._log_podcast_stats()
+
+    def sources_of(self, article):
+        """本次运行中包含该文章的所有订阅源名称 (跨源去重后文章只署名第一个源)"""
+        return self.link_feeds.get(canonical_url(article.get('link', ''))) or {article.get('author')}
+
+    def seed_links(self, articles):
+        """把已处理过的文章登记为已见链接 (持续运行模式重启或换日后，不再重复分析仍留在 Feed 中的条目)"""
+        for article in articles:
+            link_key = canonical_url(article.get('link', ''))
+            if link_key:
+                self.link_feeds.setdefault(link_key, set()).add(article.get('author'))
+
+    async def process_update(self, feed, parsed, window=None):
+        """
+        持续运行模式: 分析一次 Feed 更新 (轮询结果或 WebSub 推送) 中的新条目，逐条产出文章字典。
+        短文不等待批量合并、超长播客不延后，立即分析；链接在多次调用之间去重 (跨源同样生效)。
+        产出的文章附带 _published_ts (条目发布时间的 UTC 时间戳，供延迟统计)，写入存储前应移除。
+        """
+        if window is None:
+            window = self.settings.time_window_hours
+        if not isinstance(window, datetime.timedelta):
+            window = datetime.timedelta(hours=window)
+        for _, entry, published_time in self._new_entries(feed, parsed, cassette.now(), window):
+            article = await self._process_entry_or_forget(feed, entry, published_time, defer=False)
+            if article is None:
+                continue
+            parsed_time = entry.get('published_parsed') or entry.get('updated_parsed')
+            article['_published_ts'] = calendar.timegm(parsed_time)
+            yield article
+
+    async def notify(self, title, chunks, notifier=None):
+        """通过通知阶段发送分段消息 (notifier 默认为流水线的通知阶段)"""
+        notifier = notifier or self.notifier
+        await self._call(notifier.send, title, chunks)
+
+    async def notify_report(self, store, date_str, template=None, notifier=None, title=None):
+        """从分析结果存储 (或其筛选视图) 流式渲染 Markdown 并推送"""
+        title = title or f"RSS Daily Digest {date_str}"
+        if not len(store):
+            # 发送无更新通知，确保用户知道程序运行正常
+            await self.notify(title, iter_dingtalk_chunks(["今天没有发现更新内容。"], max_length=4000), notifier)
+            return
+        template = template or self.settings.report_template
+        chunks = iter_dingtalk_chunks(iter_markdown_lines(store, date_str, template), max_length=4000)
+        await self.notify(title, chunks, notifier)
+
+    # ---------- 单个订阅源 ----------
+
+    async def _process_feed(self, feed, feed_index, now, window, emit, pending):
+        """
+        处理单个 RSS Feed。
+        分析完成的条目立即通过 emit 产出；暂缓批量分析的短文和延后转写的播客追加到 pending。
+        """
+        self.log(f"[*] 正在检查: {feed['name']} ({feed['rss_url']})")
+
+        if self.health and not self.health.allow(feed['rss_url']):
+            self.log(f"[-] 熔断中，跳过: {feed['name']}")
+            return
+
+        try:
+            d = await self.fetch_feed(feed)
+            if d is None:
+                return
+
+            for entry_index, entry, published_time in self._new_entries(feed, d, now, window):
+                article = await self._process_entry_or_forget(feed, entry, published_time)
+                if article is None:
+                    continue
+                if 'content_md' in article or '_podcast' in article:
+                    article['_order'] = (feed_index, entry_index)
+                    pending.append(article)
+                else:
+                    emit(article)
+
+        except Exception as e:
+            self.log(f"[-] 处理 Feed 失败 {feed['rss_url']}: {e}")
+
+    async def fetch_feed(self, feed, validators=None):
+        """
+        抓取并解析 Feed，同时记录健康度；抓取失败时返回 None。
+        validators: 条件请求的 ETag / Last-Modified (原地更新)，内容未变化时抛出 NotModified。
+        """
+        health = self.health
+        # 先以受控超时抓取 Feed，再交给 feedparser 解析 (feedparser 自身的网络请求没有超时)
+        args = (feed['rss_url'], True) if validators is None else (feed['rss_url'], True, validators)
+        start = time.time()
+        try:
+            feed_content = await self._limited(self.fetcher.fetch, *args)
+        except NotModified:
+            if health:
+                health.record_feed(feed['rss_url'], True, time.time() - start, name=feed['name'])
+            raise
+        latency = time.time() - start
+        # Feed 大小受 max_feed_bytes 限制，下载结果直接交给 feedparser
+        d = await self._limited(feedparser.parse, feed_content) if feed_content else None
+        if health:
+            if d is None:
+                health.record_feed(feed['rss_url'], False, latency, "抓取失败", feed['name'])
+            elif d.bozo and not d.entries:
+                health.record_feed(feed['rss_url'], False, latency, f"解析失败: {d.get('bozo_exception')}", feed['name'])
+            else:
+                health.record_feed(feed['rss_url'], True, latency, name=feed['name'])
+        return d
+
+    def _new_entries(self, feed, d, now, window):
+        """筛选时间窗口内、尚未处理过的条目，产出 (条目序号, 条目, 发布时间)"""
+        for entry_index, entry in enumerate(d.entries):
+            # 获取发布时间
+            published_time = None
+            if hasattr(entry, 'published_parsed'):
+                published_time = datetime.datetime.fromtimestamp(time.mktime(entry.published_parsed))
+            elif hasattr(entry, 'updated_parsed'):
+                published_time = datetime.datetime.fromtimestamp(time.mktime(entry.updated_parsed))
+
+            if not published_time or now - published_time >= window:
+                if published_time:
+                    self.log(f"  [-] 跳过旧内容: {entry.title} ({published_time})")
+                else:
+                    self.log(f"  [-] 跳过无时间戳内容: {entry.title}")
+                continue
+
+            # 同一篇文章可能同时出现在多个源 (镜像、聚合源)。
+            # 分析开始前即登记，同时处理的其他源据此跳过；分析失败时由 _forget_link 撤销
+            link_key = canonical_url(entry.get('link', ''))
+            if link_key:
+                feeds_seen = self.link_feeds.setdefault(link_key, set())
+                duplicate = bool(feeds_seen)
+                feeds_seen.add(feed['name'])
+                if duplicate:
+                    self.log(f"  [=] 跳过重复条目: {entry.title}")
+                    continue
+
+            yield entry_index, entry, published_time
+
+    def _forget_link(self, link):
+        """撤销条目链接的登记: 分析失败的条目不算已处理，其他源或下一次更新中出现时仍会重试"""
+        self.link_feeds.pop(canonical_url(link or ''), None)
+
+    async def _process_entry_or_forget(self, feed, entry, published_time, defer=True):
+        """_process_entry，无结果或出错时撤销链接登记"""
+        try:
+            article = await self._process_entry(feed, entry, published_time, defer)
+        except Exception:
+            self._forget_link(entry.get('link'))
+            raise
+        if article is None:
+            self._forget_link(entry.get('link'))
+        return article
+
+    async def _process_entry(self, feed, entry, published_time, defer=True):
+        """
+        分析单个新条目，返回文章字典 (暂缓批量分析的短文带 content_md，延后转写的播客带 _podcast)；
+        无结果时返回 None。defer=False 时短文立即单篇分析，超长播客也立即转写。
+        """
+        settings = self.settings
+        self.log(f"  [+] 发现新内容: {entry.title}")
+        link = entry.link
+        analysis = None
+        is_podcast_entry = False
+        content_md = None
+        excerpt = None
+        prefiltered = False
+        prefilter_weight = None
+
+        podcast = None
+
+        # 检查是否为播客 (Audio Enclosure)
+        enclosure = find_audio_enclosure(entry)
+
+        # 如果是播客源或者是音频内容: 先按 Feed 元数据预筛，估算转写时长与费用
+        if enclosure:
+            is_podcast_entry = True
+            audio_url = enclosure['href']
+            action, reason, expected = screen_episode(entry, enclosure, settings.podcast_policy)
+            estimate = ""
+            if expected:
+                estimate = f" (预计 {expected / 60:.0f} 分钟"
+                if self.ledger is not None:
+                    estimate += f"，转写约 {self.ledger.estimate_cost(ASR_MODEL, asr_seconds=expected):.2f} 元"
+                estimate += ")"
+            self.log(f"   [🎙️] 识别为播客音频: {audio_url}{estimate}")
+            if action == "defer" and not defer:
+                action = "analyze"
+            if action == "skip":
+                self.stats["podcast_skipped"] += 1
+                self.log(f"   [-] {reason}，跳过")
+                return None
+            if action == "brief":
+                self.stats["podcast_brief"] += 1
+                self.log(f"   [↓] {reason}，仅保留标题")
+                analysis = brief_analysis(entry.title)
+                prefiltered = True
+            elif action == "defer":
+                self.stats["podcast_deferred"] += 1
+                self.log(f"   [~] {reason}，延后到本次运行最后转写")
+                podcast = {"audio_url": audio_url, "expected": expected}
+            else:
+                analysis, prefiltered = await self._analyze_podcast(feed['name'], entry.title, audio_url, expected)
+        else:
+            # 普通文章: 优先使用 Feed 自带的全文，否则抓取原网页
+            content_html = extract_feed_full_text(entry, get_feed_content_policy(feed, settings),
+                                                  settings.feed_content_min_chars, settings.feed_content_min_paragraphs)
+            if content_html:
+                self.stats["feed_content"] += 1
+                self.log(f"   [=] 使用 Feed 自带全文，跳过网页抓取")
+            else:
+                self.stats["page_fetch"] += 1
+                content_html = await self._limited(self.fetcher.fetch, link)
+            content_md = html_to_markdown(content_html)
+            if content_md:
+                excerpt = content_md[:PREFILTER_TEXT_CHARS]
+                brief, prefilter_weight = self._prefilter(entry.title, content_md, feed['name'], link)
+                if not brief and self._budget_exceeded("llm", feed['name']):
+                    # 预算用尽: 同样只保留标题行
+                    brief = brief_analysis(entry.title)
+                if brief:
+                    analysis = brief
+                    prefiltered = True
+                    content_md = None
+                elif defer and settings.batch_enabled and len(content_md) <= settings.batch_short_article_chars:
+                    # 短文暂缓，稍后与其他短文合并为批量请求
+                    self.log(f"   [~] 短文 ({len(content_md)} 字符)，加入批量分析队列")
+                else:
+                    analysis = await self._analyze(self.analyzer.analyze, content_md, feed['name'])
+                    content_md = None
+
+        if not (analysis or content_md or podcast):
+            return None
+        article = {
+            "original_title": entry.title,
+            "link": link,
+            "author": feed['name'],
+            "published": published_time.strftime("%Y-%m-%d %H:%M"),
+            "analysis": analysis,
+            "is_podcast": is_podcast_entry
+        }
+        if excerpt:
+            article["excerpt"] = excerpt
+        if prefiltered:
+            article["prefiltered"] = True
+        elif prefilter_weight is not None:
+            article["prefilter_weight"] = prefilter_weight
+        if content_md:
+            article["content_md"] = content_md
+        if podcast:
+            article["_podcast"] = podcast
+        return article
+
+    def _prefilter(self, title, content, source, link):
+        """
+        本地预测文章评分，返回 (简要分析, 评估权重)。
+        低于阈值时返回仅含标题和预测值的简要分析；否则简要分析为 None，文章照常交给 LLM。
+        评估权重是文章入选 LLM 分析的概率的倒数 (逆倾向权重)，随文章入库供留出集评估使用:
+        通过阈值为 1，探索样本为 1 / explore_rate；未开启探索时通过阈值的文章有偏，记为 0 (不参与评估)。
+        未启用预筛选时权重为 None。
+        """
+        if self.ranker is None:
+            return None, None
+        threshold = self.settings.prefilter_threshold
+        explore_rate = self.settings.prefilter_explore_rate
+        score, domain = self.ranker.predict(title, content, source)
+        if score >= threshold:
+            self.stats["prefilter_passed"] += 1
+            return None, 1.0 if explore_rate > 0 else 0.0
+        # 按链接哈希抽样而不是随机数: 同一篇文章每次得到相同结果，回放时请求序列不变
+        if int(hashlib.sha1(link.encode('utf-8')).hexdigest()[:8], 16) / 0xFFFFFFFF < explore_rate:
+            self.stats["prefilter_explored"] += 1
+            self.log(f"   [?] 预测评分 {score:.0f} 低于阈值 {threshold}，抽中为探索样本，仍交给 LLM 分析")
+            return None, round(1.0 / explore_rate, 3)
+        self.stats["prefilter_skipped"] += 1
+        self.log(f"   [↓] 预测评分 {score:.0f} 低于阈值 {threshold}，仅保留标题")
+        return brief_analysis(title, round(score), domain), None
+
+    # ---------- 播客 ----------
+
+    async def _analyze_podcast(self, feed_name, title, audio_url, expected):
+        """转写并分析播客，返回 (分析结果, 是否仅保留标题)；预算用尽时只保留标题行"""
+        if self._budget_exceeded("asr") or self._budget_exceeded("llm", feed_name):
+            return brief_analysis(title), True
+        self.stats["podcast_transcribed"] += 1
+        if expected:
+            self.stats["podcast_expected_seconds"] += expected
+        else:
+            self.stats["podcast_unknown_duration"] += 1
+        args = (audio_url, feed_name) if expected is None else (audio_url, feed_name, expected)
+        return await self._limited(self.analyzer.analyze_podcast, *args), False
+
+    async def _analyze_deferred_podcasts(self, articles):
+        """
+        其余工作完成后，按预计时长从短到长依次转写延后的播客。
+        逐集串行执行，每集开始前检查预算，避免超长节目挤占短内容的预算。
+        """
+        if not articles:
+            return
+        self.log(f"[*] 转写延后的播客 {len(articles)} 集")
+        articles.sort(key=lambda a: a['_podcast']['expected'] or 0)
+        for article in articles:
+            podcast = article.pop('_podcast')
+            self.log(f"  [🎙️] {article['original_title']}")
+            analysis, prefiltered = await self._analyze_podcast(article['author'], article['original_title'],
+                                                                podcast['audio_url'], podcast['expected'])
+            if not analysis:
+                self._forget_link(article['link'])
+                continue
+            article['analysis'] = analysis
+            if prefiltered:
+                article['prefiltered'] = True
+            yield article
+
+    def _log_podcast_stats(self):
+        stats = self.stats
+        if not (stats["podcast_transcribed"] or stats["podcast_brief"] or stats["podcast_skipped"]):
+            return
+        minutes = stats["podcast_expected_seconds"] / 60
+        estimate = f"预计 {minutes:.0f} 分钟"
+        if self.ledger is not None:
+            estimate += f"，约 {self.ledger.estimate_cost(ASR_MODEL, asr_seconds=stats['podcast_expected_seconds']):.2f} 元"
+        if stats["podcast_unknown_duration"]:
+            estimate += f"，另有 {stats['podcast_unknown_duration']} 集时长未知"
+        self.log(f"[*] 播客预筛: 转写 {stats['podcast_transcribed']} 集 ({estimate})，"
+                 f"仅保留标题 {stats['podcast_brief']} 集，延后 {stats['podcast_deferred']} 集，跳过 {stats['podcast_skipped']} 集")
+
+    # ---------- 短文批量分析 ----------
+
+    async def _analyze_pending(self, articles):
+        """
+        对暂缓的短文进行批量分析，按完成顺序产出。
+        批量响应中缺失或不合法的条目回退为单篇请求；仍失败的条目被丢弃。
+        """
+        if not articles:
+            return
+        settings = self.settings
+        pending = [(i, a['original_title'], a['content_md'], a['author']) for i, a in enumerate(articles)]
+        batches = pack_batches(pending, settings.batch_max_tokens, settings.batch_max_items)
+        self.log(f"[*] 批量分析 {len(pending)} 篇短文，共 {len(batches)} 个请求")
+        fallback = []
+
+        def batch_job(batch):
+            async def job(emit):
+                results = await self._analyze(self.analyzer.analyze_batch, batch) if len(batch) > 1 else {}
+                for item_id, _, content, feed in batch:
+                    analysis = results.get(item_id)
+                    if analysis is None:
+                        fallback.append(item_id)
+                        analysis = await self._analyze(self.analyzer.analyze, content, feed)
+                    article = articles[item_id]
+                    article.pop('content_md', None)
+                    if analysis:
+                        article['analysis'] = analysis
+                        emit(article)
+                    elif self._budget_exceeded("llm", feed):
+                        # 预算用尽: 只保留标题行
+                        article['analysis'] = brief_analysis(article['original_title'])
+                        article['prefiltered'] = True
+                        emit(article)
+                    else:
+                        self._forget_link(article['link'])
+            return job
+
+        async for article in self._stream([batch_job(batch) for batch in batches]):
+            yield article
+
+        if fallback:
+            self.log(f"[*] {len(fallback)} 篇短文回退为单篇分析")
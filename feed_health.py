@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import datetime
+from urllib.parse import urlparse
+
+# ==========================================
+# 订阅源健康度追踪与熔断
+# ==========================================
+# 按 Feed (rss_url) 和主机 (host) 两个维度记录:
+#   - latency_ewma: 请求耗时的指数加权移动平均 (秒)
+#   - consecutive_failures: 连续失败次数
+#   - last_success / last_failure: 最近一次成功 / 失败时间
+# 连续失败达到阈值后熔断，按指数退避的间隔重新探测；慢主机使用更紧的超时。
+
+DEFAULT_HEALTH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_reports", "feed_health.json")
+
+
+def get_host(url):
+    return urlparse(url).netloc.lower()
+
+
+class FeedHealthTracker:
+    """Feed / 主机健康记录 + 熔断器，持久化为 JSON 文件"""
+
+    def __init__(self, path=DEFAULT_HEALTH_FILE, failure_threshold=3, base_probe_hours=12,
+                 max_probe_hours=24 * 14, default_timeout=15, slow_host_seconds=5,
+                 slow_timeout=8, failing_timeout=5, ewma_alpha=0.3, log=print):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.base_probe_seconds = base_probe_hours * 3600
+        self.max_probe_seconds = max_probe_hours * 3600
+        self.default_timeout = default_timeout
+        self.slow_host_seconds = slow_host_seconds
+        self.slow_timeout = slow_timeout
+        self.failing_timeout = failing_timeout
+        self.ewma_alpha = ewma_alpha
+        self.log = log
+        self.data = {"feeds": {}, "hosts": {}}
+        self.run_skipped = []
+        # 流水线会在线程池中并发记录，读改写由锁串行化
+        self._lock = threading.RLock()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+                self.data.setdefault("feeds", {})
+                self.data.setdefault("hosts", {})
+            except Exception as e:
+                self.log(f"[-] 健康记录加载失败，将重新记录: {e}")
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = self.path + ".tmp"
+        with self._lock, open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # ---------- 记录 ----------
+
+    @staticmethod
+    def _new_record():
+        return {"latency_ewma": None, "consecutive_failures": 0, "last_success": None,
+                "last_failure": None, "last_error": "", "next_probe": None,
+                "total_success": 0, "total_failure": 0}
+
+    def _record(self, kind, key, name=None):
+        record = self.data[kind].setdefault(key, self._new_record())
+        if name:
+            record["name"] = name
+        return record
+
+    def _update_latency(self, record, latency):
+        if latency is None:
+            return
+        if record["latency_ewma"] is None:
+            record["latency_ewma"] = round(latency, 3)
+        else:
+            record["latency_ewma"] = round(self.ewma_alpha * latency + (1 - self.ewma_alpha) * record["latency_ewma"], 3)
+
+    def _mark_success(self, record, latency):
+        self._update_latency(record, latency)
+        record["consecutive_failures"] = 0
+        record["last_success"] = time.time()
+        record["next_probe"] = None
+        record["total_success"] += 1
+
+    def _mark_failure(self, record, error, latency):
+        self._update_latency(record, latency)
+        record["consecutive_failures"] += 1
+        record["last_failure"] = time.time()
+        record["last_error"] = str(error)[:200]
+        record["total_failure"] += 1
+        excess = record["consecutive_failures"] - self.failure_threshold
+        if excess >= 0:
+            # 熔断: 重新探测间隔按 2^n 指数增长
+            interval = min(self.base_probe_seconds * (2 ** excess), self.max_probe_seconds)
+            record["next_probe"] = record["last_failure"] + interval
+
+    def record_host(self, url, ok, latency=None, error=None):
+        """记录一次主机级请求结果 (仅网络层失败，如超时、连接错误，才应计为失败)"""
+        with self._lock:
+            record = self._record("hosts", get_host(url))
+            if ok:
+                self._mark_success(record, latency)
+            else:
+                self._mark_failure(record, error, latency)
+
+    def record_feed(self, url, ok, latency=None, error=None, name=None):
+        """记录一次 Feed 级结果 (抓取失败、HTTP 错误、无法解析均计为失败)"""
+        with self._lock:
+            record = self._record("feeds", url, name)
+            if ok:
+                self._mark_success(record, latency)
+            else:
+                self._mark_failure(record, error, latency)
+
+    # ---------- 决策 ----------
+
+    def _is_open(self, record):
+        return bool(record and record.get("next_probe") and time.time() < record["next_probe"])
+
+    def allow(self, url, is_feed=True):
+        """熔断打开 (且未到重新探测时间) 时返回 False"""
+        records = [self.data["hosts"].get(get_host(url))]
+        if is_feed:
+            records.append(self.data["feeds"].get(url))
+        if any(self._is_open(r) for r in records):
+            self.run_skipped.append(url)
+            return False
+        return True
+
+    def timeout_for(self, url):
+        """按主机历史表现给出请求超时: 失败中的主机和慢主机使用更紧的超时"""
+        record = self.data["hosts"].get(get_host(url))
+        if not record:
+            return self.default_timeout
+        if record["consecutive_failures"] > 0:
+            return self.failing_timeout
+        if record["latency_ewma"] is not None and record["latency_ewma"] > self.slow_host_seconds:
+            return self.slow_timeout
+        return self.default_timeout
+
+    # ---------- 报告 ----------
+
+    def attention_list(self, slow_seconds=None):
+        """需要关注的源: 熔断中、连续失败、或明显偏慢"""
+        slow_seconds = slow_seconds or self.slow_host_seconds
+        items = []
+        for kind in ("feeds", "hosts"):
+            for key, r in self.data[kind].items():
+                reasons = []
+                if self._is_open(r):
+                    reasons.append("熔断中")
+                if r["consecutive_failures"]:
+                    reasons.append(f"连续失败 {r['consecutive_failures']} 次")
+                if r["latency_ewma"] is not None and r["latency_ewma"] > slow_seconds:
+                    reasons.append(f"平均耗时 {r['latency_ewma']:.1f}s")
+                if reasons:
+                    items.append((kind, key, r, reasons))
+        items.sort(key=lambda x: (-x[2]["consecutive_failures"], x[0], x[1]))
+        return items
+
+
+def _format_ts(ts):
+    if not ts:
+        return "-"
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+
+def format_health_report(tracker):
+    """生成健康报告文本"""
+    items = tracker.attention_list()
+    lines = [f"# 🩺 订阅源健康报告 ({len(items)} 项需要关注)\n"]
+    for kind, key, r, reasons in items:
+        label = "Feed" if kind == "feeds" else "Host"
+        name = f"{r['name']} " if r.get("name") else ""
+        lines.append(f"- [{label}] {name}{key}")
+        lines.append(f"    {'; '.join(reasons)} | 最近成功: {_format_ts(r['last_success'])} | "
+                     f"下次探测: {_format_ts(r['next_probe'])} | 错误: {r['last_error']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看订阅源健康报告")
+    parser.add_argument("--file", default=DEFAULT_HEALTH_FILE, help="健康记录文件")
+    parser.add_argument("--reset", metavar="URL", help="清除某个 Feed / 主机的熔断状态")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"[-] 健康记录不存在: {args.file}")
+        sys.exit(1)
+
+    tracker = FeedHealthTracker(args.file)
+    if args.reset:
+        for kind, key in (("feeds", args.reset), ("hosts", get_host(args.reset) or args.reset)):
+            if key in tracker.data[kind]:
+                tracker.data[kind][key].update(consecutive_failures=0, next_probe=None)
+                print(f"[+] 已重置 {kind}: {key}")
+        tracker.save()
+    else:
+        print(format_health_report(tracker))
@@ -0,0 +1,88 @@
+import requests
+from urllib3.util import make_headers
+
+# ==========================================
+# 有界流式下载
+# ==========================================
+# 以流式方式读取响应体，限制最大字节数，并在响应头显示为非 HTML / 非 Feed 内容
+# (PDF、视频、压缩包等) 时立即中止，保证单次抓取的内存峰值可预测。
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# 网页正文允许的 Content-Type
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+# Feed 允许的 Content-Type (子串匹配，各家服务器返回的类型五花八门: application/rss+xml、
+# application/atom+xml、application/feed+json 等)。text/html 不在其中，避免把网页当作 Feed 下载。
+FEED_CONTENT_TYPES = ("xml", "rss", "atom", "json", "text/xml", "text/plain")
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# urllib3 会按已安装的解码器生成 Accept-Encoding (安装 brotli 后包含 br)
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+
+class FetchAborted(Exception):
+    """响应类型不符或超出大小上限而主动中止的下载"""
+
+
+class NotModified(Exception):
+    """条件请求返回 304: 内容自上次抓取以来没有变化"""
+
+
+def _type_allowed(content_type, allowed_types):
+    if not allowed_types or not content_type:
+        return True
+    content_type = content_type.split(';')[0].strip().lower()
+    return any(t in content_type for t in allowed_types)
+
+
+def stream_download(url, timeout=15, max_bytes=DEFAULT_MAX_BYTES, allowed_types=HTML_CONTENT_TYPES,
+                    truncate=False, headers=None, validators=None, log=print):
+    """
+    流式下载 URL，返回 bytes (网页直接 decode，Feed 直接交给 feedparser)。
+    - 响应头 Content-Type 不在 allowed_types 中时，不读取响应体直接中止。
+    - 解压后的数据超过 max_bytes 时: truncate=True 返回已读取的部分，否则中止。
+    - validators: 条件请求字典 ({"etag", "last_modified"})，按其发送 If-None-Match / If-Modified-Since，
+      下载成功后用响应中的新值原地更新；服务器返回 304 时抛出 NotModified。
+    HTTP 错误以 requests.exceptions.HTTPError 抛出，主动中止以 FetchAborted 抛出。
+    log: 截断提示的输出函数。
+    """
+    request_headers = {'User-Agent': DEFAULT_USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING}
+    if headers:
+        request_headers.update(headers)
+    if validators:
+        if validators.get("etag"):
+            request_headers['If-None-Match'] = validators["etag"]
+        if validators.get("last_modified"):
+            request_headers['If-Modified-Since'] = validators["last_modified"]
+
+    with requests.get(url, headers=request_headers, timeout=timeout, stream=True) as resp:
+        if resp.status_code == 304:
+            raise NotModified(url)
+        resp.raise_for_status()
+
+        content_type = resp.headers.get('Content-Type', '')
+        if not _type_allowed(content_type, allowed_types):
+            raise FetchAborted(f"非预期的内容类型: {content_type}")
+
+        # Content-Length 是压缩后的长度，只能作为提前判断的下限
+        content_length = resp.headers.get('Content-Length')
+        if not truncate and content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise FetchAborted(f"内容过大: {content_length} 字节 (上限 {max_bytes})")
+
+        chunks, size = [], 0
+        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+            remaining = max_bytes - size
+            if len(chunk) > remaining:
+                if not truncate:
+                    raise FetchAborted(f"内容超过上限 {max_bytes} 字节")
+                chunks.append(chunk[:remaining])
+                log(f"[*] 内容超过 {max_bytes} 字节，已截断: {url}")
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        if validators is not None:
+            validators["etag"] = resp.headers.get('ETag')
+            validators["last_modified"] = resp.headers.get('Last-Modified')
+        return b"".join(chunks)
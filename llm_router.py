@@ -0,0 +1,445 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+
+# ==========================================
+# LLM 多供应商路由 (对冲请求 + 自动回退)
+# ==========================================
+# 按配置顺序选择供应商 (默认 DeepSeek 为主、Qwen 为备):
+#   - 主供应商在学习到的耗时分位数 (默认 p90) 内未返回时，向下一个供应商发出对冲请求，
+#     采用先返回的合法结果；主供应商失败或结果不合法时立即回退。
+#   - 连续失败达到阈值的供应商熔断一段时间，期间路由到其他供应商。
+#   - 记录每个供应商的耗时样本、请求 / 失败 / 胜出 / 对冲次数，持久化为 JSON 文件。
+# 落败的请求无法中止，会在后台线程中继续完成 (受各自的请求超时约束)，其用量和耗时照常记录；
+# 后台未完成的落败请求达到 max_abandoned 个时暂停对冲，避免线程池被占满、新请求排队
+# (发出对冲时即在锁内预占一个名额，并发请求不会同时越过上限；落败请求完成后释放)。
+# 耗时样本按请求类型 (kind，如单篇 article / 批量 batch) 分开记录，对冲延迟只参考同类请求。
+# 线程池大小应不小于 2 × 并发数 + max_abandoned (见 digest_pipeline.build_router)。
+#
+# 前缀缓存: DeepSeek 对与近期请求相同的 prompt 前缀按缓存价计费且响应更快，响应 usage 中的
+# prompt_cache_hit_tokens / prompt_cache_miss_tokens 给出命中情况。PromptCacheStats 按供应商统计
+# 本期 (一次运行，或持续运行模式下两期日报之间) 的命中率，以及命中 / 未命中请求的耗时。
+
+DEFAULT_STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_reports", "llm_router.json")
+
+
+class ProviderError(Exception):
+    """供应商返回错误 (非 200、响应格式异常等)"""
+
+
+class DeepSeekProvider:
+    """DeepSeek (OpenAI 兼容接口)"""
+
+    ledger_provider = "deepseek"
+
+    def __init__(self, api_key, base_url="https://api.deepseek.com", model="deepseek-chat", name="deepseek"):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+
+    def complete(self, messages, timeout=60, max_tokens=None):
+        """返回 (文本, OpenAI 格式 usage)"""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.5,
+            "stream": False
+        }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        resp = requests.post(f"{self.base_url}/chat/completions", json=payload, headers=headers, timeout=timeout)
+        if resp.status_code != 200:
+            raise ProviderError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+        data = resp.json()
+        return data['choices'][0]['message']['content'], data.get('usage') or {}
+
+
+class QwenProvider:
+    """通义千问 (DashScope SDK)"""
+
+    ledger_provider = "dashscope"
+
+    def __init__(self, api_key=None, model="qwen-turbo", name="qwen"):
+        self.name = name
+        self.api_key = api_key
+        self.model = model
+
+    def complete(self, messages, timeout=60, max_tokens=None):
+        from dashscope import Generation
+
+        kwargs = {"model": self.model, "messages": messages, "result_format": "message", "temperature": 0.5,
+                  "request_timeout": timeout}
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        if self.api_key:
+            kwargs["api_key"] = self.api_key
+        response = Generation.call(**kwargs)
+        if response.status_code != 200:
+            raise ProviderError(f"{response.status_code}: {response.message}")
+        usage = getattr(response, 'usage', None) or {}
+        return response.output.choices[0].message.content, {
+            "prompt_tokens": usage.get('input_tokens', 0),
+            "completion_tokens": usage.get('output_tokens', 0),
+        }
+
+
+def percentile(samples, pct):
+    """最近邻分位数 (pct 取 0-100)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+
+class PromptCacheStats:
+    """按供应商统计前缀缓存命中 tokens 与命中 / 未命中请求的耗时 (只统计成功的请求)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.providers = {}
+
+    def record(self, provider, usage, latency):
+        usage = usage or {}
+        with self._lock:
+            record = self.providers.setdefault(provider, {"requests": 0, "reported": False, "hit_tokens": 0,
+                                                          "miss_tokens": 0, "cached": [], "uncached": []})
+            record["requests"] += 1
+            hit = usage.get("prompt_cache_hit_tokens")
+            if hit is None:
+                # 供应商未返回缓存字段 (如 Qwen)，不计入命中率
+                return
+            record["reported"] = True
+            record["hit_tokens"] += hit or 0
+            record["miss_tokens"] += usage.get("prompt_cache_miss_tokens") or 0
+            (record["cached"] if hit else record["uncached"]).append(latency)
+
+    def report(self):
+        rows = []
+        with self._lock:
+            for name, record in self.providers.items():
+                prompt_tokens = record["hit_tokens"] + record["miss_tokens"]
+                rows.append({
+                    "provider": name,
+                    "requests": record["requests"],
+                    "reported": record["reported"],
+                    "hit_rate": record["hit_tokens"] / prompt_tokens if prompt_tokens else None,
+                    "hit_tokens": record["hit_tokens"],
+                    "miss_tokens": record["miss_tokens"],
+                    "cached_requests": len(record["cached"]),
+                    "cached_p50": percentile(record["cached"], 50),
+                    "uncached_requests": len(record["uncached"]),
+                    "uncached_p50": percentile(record["uncached"], 50),
+                })
+        return rows
+
+
+class LLMRouter:
+    """按健康度与耗时分位数在多个 LLM 供应商之间路由、对冲和回退"""
+
+    def __init__(self, providers, stats_file=DEFAULT_STATS_FILE, hedge_percentile=90, min_samples=20,
+                 default_hedge_seconds=20, min_hedge_seconds=2, failure_threshold=3, cooldown_minutes=10,
+                 max_samples=200, max_workers=8, max_abandoned=4, hedging=True, log=print):
+        self.providers = list(providers)
+        self.stats_file = stats_file
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.default_hedge_seconds = default_hedge_seconds
+        self.min_hedge_seconds = min_hedge_seconds
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_minutes * 60
+        self.max_samples = max_samples
+        self.max_abandoned = max_abandoned
+        self.hedging = hedging
+        self.abandoned = 0
+        self.log = log
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.cache_stats = PromptCacheStats()
+        self._lock = threading.Lock()
+        self.stats = {}
+        saved = {}
+        if stats_file and os.path.exists(stats_file):
+            try:
+                with open(stats_file, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+            except Exception as e:
+                self.log(f"[-] 路由统计加载失败，将重新记录: {e}")
+        for provider in self.providers:
+            record = self._new_record()
+            record.update(saved.get(provider.name, {}))
+            if isinstance(record["latencies"], list):
+                # 旧版统计不区分请求类型，样本都来自单篇分析
+                record["latencies"] = {"article": record["latencies"]}
+            record["latencies"] = {kind: deque(samples, maxlen=max_samples)
+                                   for kind, samples in record["latencies"].items()}
+            self.stats[provider.name] = record
+
+    @staticmethod
+    def _new_record():
+        return {"latencies": {}, "requests": 0, "failures": 0, "wins": 0, "hedges": 0,
+                "consecutive_failures": 0, "open_until": None, "last_error": ""}
+
+    def _samples(self, provider, kind):
+        """某个供应商某类请求的耗时样本 (不存在时创建)"""
+        latencies = self.stats[provider.name]["latencies"]
+        if kind not in latencies:
+            latencies[kind] = deque(maxlen=self.max_samples)
+        return latencies[kind]
+
+    def save(self):
+        if not self.stats_file:
+            return
+        directory = os.path.dirname(self.stats_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._lock:
+            data = {name: dict(record, latencies={kind: list(samples) for kind, samples in record["latencies"].items()})
+                    for name, record in self.stats.items()}
+        tmp_path = self.stats_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.stats_file)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    # ---------- 决策 ----------
+
+    def _route(self):
+        """健康的供应商按配置顺序在前，熔断中的排在最后 (全部熔断时仍会尝试)"""
+        now = time.time()
+        healthy, tripped = [], []
+        for provider in self.providers:
+            open_until = self.stats[provider.name]["open_until"]
+            (tripped if open_until and now < open_until else healthy).append(provider)
+        return healthy + tripped
+
+    def hedge_delay(self, provider, kind="article"):
+        """发出对冲请求前等待的时间: 同类请求的样本足够时取耗时分位数，否则使用默认值"""
+        samples = self.stats[provider.name]["latencies"].get(kind, ())
+        if len(samples) < self.min_samples:
+            return self.default_hedge_seconds
+        return max(self.min_hedge_seconds, percentile(samples, self.hedge_percentile))
+
+    # ---------- 记录 ----------
+
+    def _record_result(self, provider, kind, ok, latency, error=None):
+        with self._lock:
+            record = self.stats[provider.name]
+            record["requests"] += 1
+            if ok:
+                self._samples(provider, kind).append(round(latency, 3))
+                record["consecutive_failures"] = 0
+                record["open_until"] = None
+                return
+            record["failures"] += 1
+            record["consecutive_failures"] += 1
+            record["last_error"] = str(error)[:200]
+            if record["consecutive_failures"] >= self.failure_threshold:
+                record["open_until"] = time.time() + self.cooldown_seconds
+                self.log(f"[!] LLM 供应商 {provider.name} 连续失败 {record['consecutive_failures']} 次，"
+                         f"熔断 {self.cooldown_seconds // 60} 分钟")
+
+    def _attempt(self, provider, kind, messages, parse, timeout, max_tokens, on_usage, clock):
+        """
+        执行一次请求，返回解析后的结果 (失败或不合法时返回 None，不抛出异常)。
+        clock: {"at", "started"}，在线程池中实际开始执行时记录时间并设置 started (对冲计时从此刻开始)。
+        """
+        start = time.time()
+        clock["at"] = start
+        clock["started"].set()
+        usage, error, result = {}, None, None
+        try:
+            text, usage = provider.complete(messages, timeout=timeout, max_tokens=max_tokens)
+            result = parse(text)
+            if result is None:
+                error = "响应不是合法的 JSON 结果"
+        except Exception as e:
+            error = e
+        latency = time.time() - start
+        ok = error is None
+        self._record_result(provider, kind, ok, latency, error)
+        if ok:
+            self.cache_stats.record(provider.name, usage, latency)
+        if on_usage:
+            try:
+                on_usage(provider, usage, latency, ok)
+            except Exception as e:
+                self.log(f"[-] 用量记录失败: {e}")
+        if not ok:
+            self.log(f"[-] {provider.name} 请求失败 ({latency:.1f}s): {error}")
+        return result
+
+    def _release_abandoned(self, _):
+        with self._lock:
+            self.abandoned -= 1
+
+    # ---------- 请求 ----------
+
+    def complete(self, messages, parse, timeout=60, max_tokens=None, on_usage=None, kind="article"):
+        """
+        发送请求并返回 (解析结果, 供应商名)；全部失败时返回 (None, None)。
+        parse(text) 返回解析后的结果，不合法时返回 None 或抛出异常。
+        on_usage(provider, usage, latency, ok) 在每次请求 (包括落败的对冲请求) 完成后调用。
+        kind: 请求类型，耗时样本与对冲延迟按类型分开 (批量请求远比单篇慢，不应共用分位数)。
+        """
+        order = deque(self._route())
+        futures = {}
+        hedged = False
+        clock = None
+        # 本次调用发出对冲时预占的 abandoned 名额
+        reserved = 0
+
+        def launch():
+            nonlocal clock
+            provider = order.popleft()
+            clock = {"at": None, "started": threading.Event()}
+            futures[self.executor.submit(self._attempt, provider, kind, messages, parse, timeout, max_tokens,
+                                         on_usage, clock)] = provider
+
+        launch()
+        try:
+            while futures:
+                with self._lock:
+                    hedge_allowed = self.abandoned < self.max_abandoned
+                wait_timeout = None
+                # 对冲计时从主请求实际开始执行时算起，不计入等待线程的排队时间；
+                # 排队超过请求超时仍未开始时不再对冲 (线程池已饱和，对冲请求同样需要排队)
+                if (self.hedging and not hedged and order and len(futures) == 1 and hedge_allowed
+                        and clock["started"].wait(timeout)):
+                    primary = next(iter(futures.values()))
+                    wait_timeout = max(0, clock["at"] + self.hedge_delay(primary, kind) - time.time())
+                done, _ = wait(list(futures), timeout=wait_timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    slow = next(iter(futures.values()))
+                    hedged = True
+                    with self._lock:
+                        # 预占名额与检查在同一把锁内，并发的请求不会同时越过上限
+                        if self.abandoned >= self.max_abandoned:
+                            continue
+                        self.abandoned += 1
+                        reserved += 1
+                        self.stats[slow.name]["hedges"] += 1
+                    # 超过耗时分位数仍未返回: 向下一个供应商发出对冲请求，两者取先返回的合法结果
+                    self.log(f"[~] {slow.name} 超过 {self.hedge_delay(slow, kind):.1f}s 未返回，对冲请求 {order[0].name}")
+                    launch()
+                    continue
+                for future in done:
+                    provider = futures.pop(future)
+                    result = future.result()
+                    if result is not None:
+                        with self._lock:
+                            self.stats[provider.name]["wins"] += 1
+                        return result, provider.name
+                # 进行中的请求全部失败: 立即回退到下一个供应商
+                if not futures and order:
+                    hedged = False
+                    launch()
+            return None, None
+        finally:
+            # 落败的请求在后台继续完成，期间占用 abandoned 名额 (优先使用对冲时预占的名额)，
+            # 多余的预占名额 (落败请求已经结束) 立即归还
+            with self._lock:
+                for _ in futures:
+                    if reserved:
+                        reserved -= 1
+                    else:
+                        self.abandoned += 1
+                self.abandoned -= reserved
+            for future in futures:
+                future.add_done_callback(self._release_abandoned)
+
+    # ---------- 报告 ----------
+
+    def report(self):
+        rows = []
+        now = time.time()
+        with self._lock:
+            for provider in self.providers:
+                record = self.stats[provider.name]
+                latency = {}
+                for kind, samples in sorted(record["latencies"].items()):
+                    samples = list(samples)
+                    latency[kind] = {"p50": percentile(samples, 50), "p90": percentile(samples, 90),
+                                     "p99": percentile(samples, 99)}
+                rows.append({
+                    "provider": provider.name,
+                    "requests": record["requests"],
+                    "failures": record["failures"],
+                    "wins": record["wins"],
+                    "hedges": record["hedges"],
+                    "latency": latency,
+                    "open": bool(record["open_until"] and now < record["open_until"]),
+                })
+        return rows
+
+
+def format_router_report(rows):
+    """供应商胜出率与各类请求的耗时分位数"""
+    def seconds(value):
+        return f"{value:.1f}s" if value is not None else "-"
+
+    lines = [f"{'供应商':<12} {'请求':>6} {'失败':>6} {'胜出率':>7} {'对冲':>6}  状态    {'类型':<8} {'p50':>7} {'p90':>7} {'p99':>7}"]
+    for r in rows:
+        win_rate = f"{r['wins'] / r['requests']:.0%}" if r['requests'] else "-"
+        head = (f"{r['provider']:<12} {r['requests']:>6} {r['failures']:>6} {win_rate:>7} {r['hedges']:>6}  "
+                f"{'熔断中' if r['open'] else '正常':<6}")
+        kinds = list(r["latency"].items()) or [("-", {"p50": None, "p90": None, "p99": None})]
+        for i, (kind, p) in enumerate(kinds):
+            prefix = head if i == 0 else " " * len(head)
+            lines.append(f"{prefix}  {kind:<8} {seconds(p['p50']):>7} {seconds(p['p90']):>7} {seconds(p['p99']):>7}")
+    return "\n".join(lines)
+
+
+def format_cache_report(rows):
+    """前缀缓存命中率与命中 / 未命中请求的耗时中位数"""
+    def seconds(value):
+        return f"{value:.1f}s" if value is not None else "-"
+
+    lines = [f"{'供应商':<12} {'请求':>6} {'命中率':>7} {'命中tokens':>11} {'未命中tokens':>12} "
+             f"{'命中请求':>8} {'p50':>7} {'未命中请求':>10} {'p50':>7}"]
+    for r in rows:
+        if not r["reported"]:
+            lines.append(f"{r['provider']:<12} {r['requests']:>6}  (未返回缓存统计)")
+            continue
+        hit_rate = f"{r['hit_rate']:.0%}" if r["hit_rate"] is not None else "-"
+        lines.append(f"{r['provider']:<12} {r['requests']:>6} {hit_rate:>7} {r['hit_tokens']:>11} {r['miss_tokens']:>12} "
+                     f"{r['cached_requests']:>8} {seconds(r['cached_p50']):>7} {r['uncached_requests']:>10} {seconds(r['uncached_p50']):>7}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看 LLM 供应商路由统计 (耗时分位数、胜出率、熔断状态)")
+    parser.add_argument("--stats", default=DEFAULT_STATS_FILE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.stats):
+        print(f"[-] 路由统计不存在: {args.stats}")
+        sys.exit(1)
+
+    with open(args.stats, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    class _Named:
+        def __init__(self, name):
+            self.name = name
+
+    router = LLMRouter([_Named(name) for name in data], stats_file=args.stats, max_workers=1)
+    print(format_router_report(router.report()))
+    router.close()
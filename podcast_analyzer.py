@@ -1,45 +1,178 @@
 import json
-import os
+import re
 import time
 import requests
+import cassette
 from dashscope.audio.asr import Transcription
 from dashscope import Generation
-import dashscope
-
-# 加载配置
-CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
-try:
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        config = json.load(f)
-except Exception as e:
-    print(f"[-] 配置文件加载失败: {e}")
-    config = {}
-
-DASHSCOPE_API_KEY = os.environ.get("DASHSCOPE_API_KEY", config.get("dashscope_api_key", ""))
-dashscope.api_key = DASHSCOPE_API_KEY
-
-def transcribe_audio(audio_url):
-    print(f"[*] 提交音频转写任务: {audio_url}")
+
+# DashScope API Key 由调用方 (DigestSettings.dashscope_api_key) 逐次传入，不读取配置文件、
+# 也不设置 SDK 的全局 Key；未传入时 SDK 回退到环境变量 DASHSCOPE_API_KEY。
+
+ASR_MODEL = 'paraformer-v1'
+SUMMARY_MODEL = 'qwen-turbo'
+
+# ==========================================
+# 播客预筛 (根据 Feed 元数据估算转写时长与费用)
+# ==========================================
+# 提交转写前读取 itunes:duration、附件大小和类型，按策略处理预告片、重播和超长节目:
+#   analyze - 正常转写分析
+#   brief   - 只在日报中列出标题
+#   defer   - 延后到本次运行的最后 (其余工作完成、预算仍有余量时) 再转写，短节目优先
+#   skip    - 完全忽略
+DEFAULT_SCREEN_POLICY = {
+    "trailer": "brief",
+    "rerun": "brief",
+    "oversized": "defer",
+    "min_minutes": 2,
+    "max_minutes": 180,
+    "assumed_bitrate_kbps": 128,
+    "rerun_patterns": [r"\b(re-?run|rebroadcast|encore|replay)\b", r"重播|重温|经典重放"],
+    "trailer_patterns": [r"\btrailer\b", r"预告"],
+}
+SCREEN_ACTIONS = ("analyze", "brief", "defer", "skip")
+
+# 缺少 type 属性的附件按扩展名识别
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".aac", ".wav", ".ogg", ".opus", ".flac")
+
+# 转写状态轮询: 首次查询在预计处理时间的一半时进行，之后从预计时间的 10% 起按倍数退避
+DEFAULT_ASR_POLL = {
+    "speed": 20,          # 无历史数据时假定的处理速度 (音频秒数 / 实际秒数)
+    "min_interval": 2,
+    "max_interval": 60,
+    "max_first_wait": 600,
+    "backoff": 1.5,
+    "default_wait": 10,   # 预计时长未知时的首次等待 (与原固定间隔一致)
+}
+
+
+def parse_itunes_duration(value):
+    """解析 itunes:duration ("HH:MM:SS" / "MM:SS" / 秒数)，返回秒数；无法解析时返回 None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        seconds = 0.0
+        for part in value.split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds if seconds > 0 else None
+    except ValueError:
+        return None
+
+
+def find_audio_enclosure(entry):
+    """条目中的第一个音频附件 (type 为 audio/*，或缺少 type 但扩展名为音频)"""
+    for enclosure in entry.get('enclosures', []):
+        href = enclosure.get('href')
+        if not href:
+            continue
+        enclosure_type = (enclosure.get('type') or '').lower()
+        if enclosure_type.startswith('audio/'):
+            return enclosure
+        if not enclosure_type and href.split('?')[0].lower().endswith(AUDIO_EXTENSIONS):
+            return enclosure
+    return None
+
+
+def estimate_duration(entry, enclosure, bitrate_kbps=128):
+    """预计音频时长 (秒)：优先使用 itunes:duration，其次按附件字节数和假定码率估算；都没有时返回 None"""
+    duration = parse_itunes_duration(entry.get('itunes_duration'))
+    if duration:
+        return duration
+    try:
+        length = int(enclosure.get('length') or 0)
+    except (TypeError, ValueError):
+        length = 0
+    # 部分 Feed 用 0 或 1 作为占位值
+    if length > 1024 and bitrate_kbps:
+        return length * 8 / (bitrate_kbps * 1000)
+    return None
+
+
+def screen_episode(entry, enclosure, policy=None):
+    """
+    按策略预筛播客条目，返回 (处理方式, 原因, 预计时长秒数)。
+    处理方式为 analyze / brief / defer / skip 之一。
+    """
+    policy = dict(DEFAULT_SCREEN_POLICY, **(policy or {}))
+    title = entry.get('title', '')
+    expected = estimate_duration(entry, enclosure, policy["assumed_bitrate_kbps"])
+
+    episode_type = (entry.get('itunes_episodetype') or '').lower()
+    if episode_type == "trailer" or any(re.search(p, title, re.I) for p in policy["trailer_patterns"]):
+        return policy["trailer"], "预告片", expected
+    if expected is not None and expected < policy["min_minutes"] * 60:
+        return policy["trailer"], f"时长仅 {expected / 60:.1f} 分钟", expected
+    if any(re.search(p, title, re.I) for p in policy["rerun_patterns"]):
+        return policy["rerun"], "重播", expected
+    if expected is not None and policy["max_minutes"] and expected > policy["max_minutes"] * 60:
+        return policy["oversized"], f"时长 {expected / 60:.0f} 分钟超过 {policy['max_minutes']} 分钟", expected
+    return "analyze", "", expected
+
+
+def poll_delays(expected_seconds=None, speed=None, min_interval=2, max_interval=60, max_first_wait=600,
+                backoff=1.5, default_wait=10):
+    """
+    转写状态查询的等待时间序列。
+    预计时长已知时，首次查询在预计处理时间 (时长 / 处理速度) 的一半时进行，之后从预计处理时间的 10% 起
+    按 backoff 倍数递增 (上限 max_interval)：短节目更快拿到结果，长节目少做无谓的状态查询。
+    """
+    speed = speed or DEFAULT_ASR_POLL["speed"]
+    if expected_seconds:
+        expected_processing = expected_seconds / speed
+        yield min(max(expected_processing / 2, min_interval), max_first_wait)
+        delay = min(max(expected_processing / 10, min_interval), max_interval)
+    else:
+        yield default_wait
+        delay = min(default_wait, max_interval)
+    while True:
+        yield delay
+        delay = min(delay * backoff, max_interval)
+
+
+def transcribe_audio(audio_url, ledger=None, feed=None, expected_seconds=None, poll_options=None, api_key=None,
+                     log=print):
+    """
+    提交转写任务并轮询等待结果。
+    expected_seconds: 预计音频时长 (来自 Feed 元数据)，用于决定轮询节奏；
+    处理速度优先取账本中最近转写的实际速度，否则使用 poll_options["speed"]。
+    """
+    log(f"[*] 提交音频转写任务: {audio_url}")
+    start = time.time()
     try:
         task_response = Transcription.async_call(
-            model='paraformer-v1',
-            file_urls=[audio_url]
+            model=ASR_MODEL,
+            file_urls=[audio_url],
+            api_key=api_key
         )
         
         if task_response.status_code != 200:
-            print(f"[-] 转写提交失败: {task_response.message}")
+            if ledger:
+                ledger.record("podcast_asr", "dashscope", ASR_MODEL, feed, latency=time.time() - start, ok=False)
+            log(f"[-] 转写提交失败: {task_response.message}")
             return None
             
         task_id = task_response.output.task_id
-        print(f"[*] 转写任务ID: {task_id}，等待完成...")
+        options = dict(DEFAULT_ASR_POLL, **(poll_options or {}))
+        observed_speed = ledger.recent_asr_speed() if ledger else None
+        if observed_speed:
+            options["speed"] = observed_speed
+        delays = poll_delays(expected_seconds, **options)
+        first_wait = next(delays)
+        expected_note = f"预计音频 {expected_seconds / 60:.0f} 分钟，" if expected_seconds else ""
+        log(f"[*] 转写任务ID: {task_id}，{expected_note}{first_wait:.0f} 秒后首次查询状态...")
         
-        # 轮询等待
+        # 轮询等待 (按预计时长调整间隔，并指数退避)
         status = 'PENDING'
+        polls = 0
+        wait = first_wait
         while status in ['PENDING', 'RUNNING']:
-            time.sleep(10) # 每10秒检查一次
-            response = Transcription.fetch(task=task_id)
+            cassette.sleep(wait)
+            wait = next(delays)
+            polls += 1
+            response = Transcription.fetch(task=task_id, api_key=api_key)
             if response.status_code != 200:
-                print(f"[-] 获取转写状态失败: {response.message}")
+                log(f"[-] 获取转写状态失败: {response.message}")
                 return None
             
             status = response.output.task_status
@@ -49,11 +182,21 @@ def transcribe_audio(audio_url):
                 if results and len(results) > 0:
                     transcription_url = results[0].get('transcription_url')
                     if transcription_url:
-                        print(f"[*] 获取到转写结果URL，正在下载...")
+                        log(f"[*] 转写完成 (耗时 {time.time() - start:.0f}s，状态查询 {polls} 次)，正在下载结果...")
                         r = requests.get(transcription_url)
                         r.encoding = 'utf-8'
                         trans_data = r.json()
                         
+                        if ledger:
+                            # 音频时长优先取转写结果中的原始时长，其次取接口返回的 usage
+                            duration_ms = trans_data.get('properties', {}).get('original_duration_in_milliseconds')
+                            if duration_ms is not None:
+                                asr_seconds = duration_ms / 1000
+                            else:
+                                asr_seconds = (getattr(response, 'usage', None) or {}).get('duration', 0)
+                            ledger.record("podcast_asr", "dashscope", ASR_MODEL, feed,
+                                          asr_seconds=asr_seconds, latency=time.time() - start)
+                        
                         full_text = ""
                         # paraformer-v1 JSON structure usually has 'transcripts' list
                         if 'transcripts' in trans_data:
@@ -61,25 +204,39 @@ def transcribe_audio(audio_url):
                                 full_text += t.get('text', '') + "\n"
                         return full_text
                     else:
-                         print(f"[-] 未找到转写结果URL: {results}")
+                         log(f"[-] 未找到转写结果URL: {results}")
                          return None
             elif status == 'FAILED':
-                print(f"[-] 转写失败: {response.output}")
+                if ledger:
+                    ledger.record("podcast_asr", "dashscope", ASR_MODEL, feed, latency=time.time() - start, ok=False)
+                log(f"[-] 转写失败: {response.output}")
                 return None
                 
     except Exception as e:
-        print(f"[-] 转写异常: {e}")
+        log(f"[-] 转写异常: {e}")
         return None
 
-def analyze_podcast_audio(audio_url):
+def analyze_podcast_audio(audio_url, ledger=None, feed=None, expected_seconds=None, poll_options=None, api_key=None,
+                          log=print):
+    """
+    转写并分析播客音频。
+    传入 ledger (usage_ledger.UsageLedger) 时记录 ASR 时长和 Qwen tokens 用量，并按来源 feed 打标签。
+    expected_seconds / poll_options 用于调整转写状态的轮询节奏 (见 poll_delays)。
+    api_key: DashScope API Key，用于转写与摘要请求。
+    log: 进度与错误信息的输出函数。
+    """
     # 1. Transcribe
-    text = transcribe_audio(audio_url)
+    text = transcribe_audio(audio_url, ledger, feed, expected_seconds, poll_options, api_key, log)
     if not text:
         return None
         
-    print(f"[*] 音频转写完成，字数: {len(text)}，开始生成摘要...")
+    log(f"[*] 音频转写完成，字数: {len(text)}，开始生成摘要...")
     
     # 2. Summarize using Qwen-Turbo (Text)
+    return summarize_transcript(text, ledger, feed, api_key, log)
+
+def summarize_transcript(text, ledger=None, feed=None, api_key=None, log=print):
+    """用 Qwen 根据逐字稿生成深度解析报告 (JSON)，失败时返回 None"""
     prompt = """
     你是一位专业的播客内容分析师，擅长从冗长的音频转录稿中提炼深度价值。
     请仔细阅读以下播客的全文逐字稿，生成一份**深度解析报告**。
@@ -124,12 +281,21 @@ def analyze_podcast_audio(audio_url):
             {'role': 'user', 'content': f"{prompt}\n\n播客内容:\n{text}"}
         ]
         
+        start = time.time()
         response = Generation.call(
-            model='qwen-turbo',
+            model=SUMMARY_MODEL,
             messages=messages,
-            result_format='message'
+            result_format='message',
+            api_key=api_key
         )
         
+        if ledger:
+            usage = getattr(response, 'usage', None) or {}
+            ledger.record("podcast_summary", "dashscope", SUMMARY_MODEL, feed,
+                          prompt_tokens=usage.get('input_tokens', 0),
+                          completion_tokens=usage.get('output_tokens', 0),
+                          latency=time.time() - start, ok=response.status_code == 200)
+        
         if response.status_code == 200:
             content = response.output.choices[0].message.content
             # 清理 Markdown
@@ -142,9 +308,9 @@ def analyze_podcast_audio(audio_url):
             
             return json.loads(content)
         else:
-            print(f"[-] Qwen 摘要生成失败: {response.message}")
+            log(f"[-] Qwen 摘要生成失败: {response.message}")
             return None
             
     except Exception as e:
-        print(f"[-] 摘要生成异常: {e}")
+        log(f"[-] 摘要生成异常: {e}")
         return None
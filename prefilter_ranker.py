@@ -0,0 +1,307 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import zlib
+from collections import Counter, defaultdict
+from digest_archive import DigestArchive, DEFAULT_DB_FILE
+
+# ==========================================
+# 本地预筛选打分器
+# ==========================================
+# 在调用 DeepSeek 之前，用历史分析结果 (归档库中的 score / domain) 训练一个轻量模型:
+#   - 特征: 标题 + 正文片段的哈希 TF-IDF (中文按字二元组，英文按单词) + 来源
+#   - 评分: 线性回归 (岭回归，SGD 训练)
+#   - 领域: 最近质心分类 (余弦相似度)
+# 纯 Python 实现，不引入 numpy / sklearn；单篇预测耗时为毫秒级。
+# 预测分数低于阈值的文章只在日报中保留标题行，不再调用 LLM。
+
+DEFAULT_MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_reports", "ranker_model.json")
+
+HASH_BUCKETS = 1 << 18
+TEXT_CHARS = 2000
+TITLE_WEIGHT = 2.0
+
+_WORD_RE = re.compile(r"[a-z][a-z0-9+#.\-]{1,30}")
+_CJK_RE = re.compile(r"[一-鿿]+")
+
+
+def tokenize(text):
+    """英文取小写单词，中文取字二元组"""
+    text = (text or "").lower()
+    tokens = _WORD_RE.findall(text)
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _bucket(feature):
+    return zlib.crc32(feature.encode('utf-8')) % HASH_BUCKETS
+
+
+def raw_features(title, text, source=None):
+    """返回 {bucket: 词频} (标题词频加权)"""
+    counts = Counter()
+    for token in tokenize(title):
+        counts[_bucket("t:" + token)] += TITLE_WEIGHT
+        counts[_bucket("w:" + token)] += 1.0
+    for token in tokenize((text or "")[:TEXT_CHARS]):
+        counts[_bucket("w:" + token)] += 1.0
+    if source:
+        counts[_bucket("src:" + source)] += 1.0
+    return counts
+
+
+class PrefilterRanker:
+    """哈希 TF-IDF + 线性回归打分器"""
+
+    def __init__(self, idf=None, weights=None, bias=0.0, centroids=None, metrics=None, trained_at=None):
+        self.idf = idf or {}
+        self.weights = weights or {}
+        self.bias = bias
+        self.centroids = centroids or {}
+        self.metrics = metrics or {}
+        self.trained_at = trained_at
+
+    # ---------- 特征 ----------
+
+    def vectorize(self, title, text, source=None):
+        """TF-IDF 向量 (L2 归一化的稀疏字典)"""
+        counts = raw_features(title, text, source)
+        default_idf = self.idf.get("default", 1.0)
+        vec = {}
+        for bucket, tf in counts.items():
+            vec[bucket] = (1.0 + math.log(tf)) * self.idf.get(bucket, default_idf)
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {k: v / norm for k, v in vec.items()}
+
+    # ---------- 训练 ----------
+
+    @classmethod
+    def train(cls, samples, epochs=15, learning_rate=0.5, l2=1e-4, seed=42):
+        """
+        samples: [{"title", "text", "source", "score", "domain"}, ...]
+        """
+        doc_freq = Counter()
+        for s in samples:
+            doc_freq.update(raw_features(s['title'], s['text'], s.get('source')).keys())
+
+        n = len(samples)
+        idf = {b: math.log((1 + n) / (1 + df)) + 1.0 for b, df in doc_freq.items() if df >= 2}
+        idf["default"] = math.log(1 + n) + 1.0
+        model = cls(idf=idf)
+
+        vectors = [model.vectorize(s['title'], s['text'], s.get('source')) for s in samples]
+        targets = [float(s['score']) for s in samples]
+        mean = sum(targets) / n if n else 0.0
+        model.bias = mean
+
+        weights = defaultdict(float)
+        order = list(range(n))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            lr = learning_rate / (1 + epoch)
+            for i in order:
+                vec = vectors[i]
+                pred = model.bias + sum(weights[k] * v for k, v in vec.items())
+                err = pred - targets[i]
+                for k, v in vec.items():
+                    weights[k] -= lr * (err * v + l2 * weights[k])
+                model.bias -= lr * err
+        model.weights = {k: round(w, 5) for k, w in weights.items() if abs(w) > 1e-4}
+
+        # 领域质心
+        sums = defaultdict(lambda: defaultdict(float))
+        for vec, s in zip(vectors, samples):
+            for k, v in vec.items():
+                sums[s.get('domain') or '未知'][k] += v
+        for domain, vec in sums.items():
+            norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+            top = sorted(vec.items(), key=lambda kv: -abs(kv[1]))[:2000]
+            model.centroids[domain] = {k: round(v / norm, 5) for k, v in top}
+
+        model.trained_at = time.time()
+        return model
+
+    # ---------- 预测 ----------
+
+    def predict(self, title, text, source=None):
+        """返回 (预测评分, 预测领域)"""
+        vec = self.vectorize(title, text, source)
+        score = self.bias + sum(self.weights.get(k, 0.0) * v for k, v in vec.items())
+        best_domain, best_sim = None, 0.0
+        for domain, centroid in self.centroids.items():
+            sim = sum(centroid.get(k, 0.0) * v for k, v in vec.items())
+            if sim > best_sim:
+                best_domain, best_sim = domain, sim
+        return max(0.0, min(100.0, score)), best_domain
+
+    # ---------- 持久化 ----------
+
+    def save(self, path=DEFAULT_MODEL_FILE):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"idf": {str(k): round(v, 4) for k, v in self.idf.items()},
+                       "weights": self.weights, "bias": self.bias,
+                       "centroids": self.centroids, "metrics": self.metrics,
+                       "trained_at": self.trained_at}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_FILE):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # JSON 键都是字符串，这里统一转回哈希桶编号
+        data["idf"] = {(k if k == "default" else int(k)): v for k, v in data["idf"].items()}
+        data["weights"] = {int(k): v for k, v in data["weights"].items()}
+        data["centroids"] = {d: {int(k): v for k, v in c.items()} for d, c in data["centroids"].items()}
+        return cls(**data)
+
+
+# ==========================================
+# 训练数据与评估
+# ==========================================
+
+def load_samples_from_archive(db_file):
+    """从历史归档读取训练样本 (按日期升序)"""
+    archive = DigestArchive(db_file)
+    rows = archive.conn.execute(
+        "SELECT digest_date, original_title, title, excerpt, summary, source, score, domain, prefilter_weight "
+        "FROM articles ORDER BY digest_date, id"
+    ).fetchall()
+    archive.close()
+    samples = []
+    for r in rows:
+        samples.append({
+            "date": r['digest_date'],
+            "title": r['original_title'] or r['title'] or "",
+            # 新数据有正文片段，旧数据退回用摘要代替
+            "text": r['excerpt'] or r['summary'] or "",
+            "source": r['source'],
+            "score": r['score'] or 0,
+            "domain": r['domain'],
+            # 未启用预筛选时入库的文章是无偏样本，权重为 1
+            "weight": 1.0 if r['prefilter_weight'] is None else r['prefilter_weight'],
+        })
+    return samples
+
+
+def evaluate(model, samples, threshold, high_value_score):
+    """
+    在留出集上评估预筛选效果:
+    - recall: 高价值文章 (实际评分 >= high_value_score) 中通过预筛选的比例
+    - precision: 通过预筛选的文章中真正高价值的比例
+    - skip_rate: 被预筛选拦下 (节省 LLM 调用) 的比例
+    留出集中没有高价值文章时 recall 无法评估，记为 None。
+    各指标按样本的 weight (逆倾向权重，默认 1) 加权，探索样本代表被预筛选拦下、未入库的同类文章。
+    """
+    tp = fp = fn = skipped = total = 0.0
+    high_count = 0
+    abs_err = 0.0
+    for s in samples:
+        weight = s.get('weight', 1.0)
+        pred, _ = model.predict(s['title'], s['text'], s.get('source'))
+        abs_err += weight * abs(pred - s['score'])
+        total += weight
+        passed = pred >= threshold
+        high = s['score'] >= high_value_score
+        if high:
+            high_count += 1
+        if passed and high:
+            tp += weight
+        elif passed:
+            fp += weight
+        elif high:
+            fn += weight
+        if not passed:
+            skipped += weight
+    n = total or 1
+    return {
+        "samples": len(samples),
+        "threshold": threshold,
+        "high_value_score": high_value_score,
+        "high_value_samples": high_count,
+        "precision": round(tp / (tp + fp), 3) if tp + fp else 0.0,
+        "recall": round(tp / (tp + fn), 3) if tp + fn else None,
+        "skip_rate": round(skipped / n, 3),
+        "mae": round(abs_err / n, 2),
+    }
+
+
+def train_from_archive(db_file, model_file, threshold, high_value_score, holdout_ratio=0.2, log=print):
+    """
+    按日期切分训练集 / 留出集，训练并评估，然后用全部数据重训保存。
+    留出集必须与训练集日期不重叠且包含高价值文章，否则评估指标记为不可用 (recall 为 None)，
+    load_prefilter_ranker 不会启用该模型。
+    预筛选启用后入库的文章只代表模型放行的一侧: 留出集只使用权重大于 0 的样本
+    (未启用预筛选时入库、或开启探索时入库)，并按权重加权，避免召回率虚高。
+    """
+    samples = load_samples_from_archive(db_file)
+    if len(samples) < 10:
+        log(f"[-] 历史样本不足 ({len(samples)} 条)，无法训练预筛选模型")
+        return None
+
+    start = time.time()
+    dates = sorted({s['date'] for s in samples})
+    if len(dates) < 2:
+        metrics = {"samples": 0, "threshold": threshold, "high_value_score": high_value_score,
+                   "high_value_samples": 0, "precision": None, "recall": None, "skip_rate": None, "mae": None,
+                   "unavailable": f"历史数据只有 {len(dates)} 天，无法划分留出集"}
+    else:
+        # 最近 holdout_ratio 的日期作为留出集，至少保留一天用于训练
+        cut = dates[max(1, int(len(dates) * (1 - holdout_ratio)))]
+        train_set = [s for s in samples if s['date'] < cut]
+        holdout = [s for s in samples if s['date'] >= cut and s['weight'] > 0]
+        model = PrefilterRanker.train(train_set)
+        metrics = evaluate(model, holdout, threshold, high_value_score)
+        if not holdout:
+            metrics["unavailable"] = f"{cut} 之后入库的文章都只来自预筛选放行的一侧 (未开启探索)，无法无偏评估"
+        elif metrics["recall"] is None:
+            metrics["unavailable"] = f"留出集 ({cut} 之后 {len(holdout)} 篇) 中没有评分 >= {high_value_score} 的文章"
+        else:
+            log(f"[*] 留出集评估 ({cut} 之后 {len(holdout)} 篇): precision={metrics['precision']} "
+                  f"recall={metrics['recall']} skip_rate={metrics['skip_rate']} MAE={metrics['mae']}")
+    if metrics.get("unavailable"):
+        log(f"[-] 留出集评估不可用: {metrics['unavailable']}，模型不会被启用")
+
+    model = PrefilterRanker.train(samples)
+    model.metrics = dict(metrics, train_samples=len(samples), train_seconds=round(time.time() - start, 2))
+    model.save(model_file)
+    log(f"[+] 预筛选模型已保存: {model_file} (样本 {len(samples)} 条)")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="训练 / 评估本地预筛选打分器")
+    parser.add_argument("command", choices=["train", "evaluate", "predict"])
+    parser.add_argument("--db", default=DEFAULT_DB_FILE)
+    parser.add_argument("--model", default=DEFAULT_MODEL_FILE)
+    parser.add_argument("--threshold", type=float, default=60)
+    parser.add_argument("--high-value-score", type=int, default=80)
+    parser.add_argument("--title", help="predict 时使用的标题")
+    parser.add_argument("--text", default="", help="predict 时使用的正文")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train_from_archive(args.db, args.model, args.threshold, args.high_value_score)
+    else:
+        ranker = PrefilterRanker.load(args.model)
+        if ranker is None:
+            print(f"[-] 模型不存在: {args.model}")
+            sys.exit(1)
+        if args.command == "evaluate":
+            print(json.dumps(evaluate(ranker, load_samples_from_archive(args.db), args.threshold,
+                                      args.high_value_score), ensure_ascii=False, indent=2))
+        else:
+            score, domain = ranker.predict(args.title or "", args.text)
+            print(f"预测评分: {score:.1f}  预测领域: {domain}")
@@ -5,6 +5,7 @@ import html2text
 import time
 import xml.etree.ElementTree as ET
 from urllib.parse import urlparse
+from http_fetch import stream_download, HTML_CONTENT_TYPES, FEED_CONTENT_TYPES
 
 # ==========================================
 # 配置区域
@@ -49,17 +50,18 @@ ARTICLE_ANALYSIS_PROMPT = """
 # 工具函数
 # ==========================================
 
-def fetch_url_content(url):
+# 下载大小上限 (字节)
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+MAX_FEED_BYTES = 10 * 1024 * 1024
+
+def fetch_url_content(url, is_feed=False):
     """
-    通用 URL 获取函数
+    通用 URL 获取函数 (有界流式下载，非 HTML / 非 Feed 内容直接中止)
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        resp = requests.get(url, headers=headers, timeout=15)
-        resp.raise_for_status()
-        return resp.content
+        if is_feed:
+            return stream_download(url, timeout=15, max_bytes=MAX_FEED_BYTES, allowed_types=FEED_CONTENT_TYPES)
+        return stream_download(url, timeout=15, max_bytes=MAX_PAGE_BYTES, allowed_types=HTML_CONTENT_TYPES, truncate=True)
     except Exception as e:
         print(f"[-] 请求失败 {url}: {e}")
         return None
@@ -153,7 +155,7 @@ def get_articles_from_rss(feed_url):
     简单的 RSS 解析器，获取最新的文章链接
     """
     print(f"[*] 正在获取 RSS: {feed_url}")
-    content = fetch_url_content(feed_url)
+    content = fetch_url_content(feed_url, is_feed=True)
     if not content:
         return []
 
@@ -0,0 +1,193 @@
+import os
+import sys
+import html
+import argparse
+import datetime
+from analysis_store import AnalysisStore, get_store_path, article_domain
+
+# ==========================================
+# 日报渲染 (Markdown / HTML / 钉钉分段)
+# ==========================================
+# 所有渲染均流式读取 AnalysisStore，不需要重新运行分析即可切换模板重新生成。
+#
+# 模板:
+#   score  - 按评分降序排列 (默认)
+#   domain - 按领域分组，组内按评分降序
+
+TEMPLATES = ["score", "domain"]
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_reports")
+
+
+def _brief_note(store):
+    brief_count = len(store) - store.full_count()
+    return f"（其中 {brief_count} 篇仅列标题）" if brief_count else ""
+
+
+def _ordered_articles(store, template):
+    entries = store.sorted_index(group_by_domain=(template == "domain"))
+    return store.iter_articles(entries)
+
+
+def _iter_article_markdown(article, heading_prefix=""):
+    """单篇文章的 Markdown 段落 (标题、元信息、摘要、洞察)"""
+    analysis = article['analysis']
+    title_prefix = "[🎙️ 播客] " if article.get('is_podcast') else ""
+    yield f"## {heading_prefix}{title_prefix}{analysis.get('title_translated', article['original_title'])}\n"
+    yield "\n"
+    yield f"- **来源**: {article['author']}\n"
+    yield f"- **发布时间**: {article['published']}\n"
+    yield f"- **原文链接**: [点击阅读]({article['link']})\n"
+    yield f"- **领域**: `{article_domain(analysis)}`\n"
+    yield f"- **评分**: {analysis.get('score', 0)} / 100\n"
+    yield "\n"
+
+    yield "### 📝 核心摘要\n"
+    yield f"> **{analysis.get('one_sentence_summary', '')}**\n"
+    yield "\n"
+    for line in f"{analysis.get('summary', '')}\n".splitlines(True):
+        yield line
+    yield "\n"
+
+    yield "### 💡 关键洞察\n"
+    for point in analysis.get('key_takeaways', []):
+        yield f"- {point}\n"
+
+    yield "\n"
+    yield f"> *评分理由: {analysis.get('reason', '')}*\n"
+    yield "\n"
+
+
+def iter_alert_lines(article):
+    """持续运行模式的单篇高分速递 (Markdown)"""
+    yield "# ⚡ 【RSS】高分速递\n"
+    yield "\n"
+    yield from _iter_article_markdown(article)
+
+
+def iter_markdown_lines(store, date_str, template="score"):
+    """逐行生成 Markdown 日报"""
+    yield f"# 📅 【RSS】Daily RSS Digest - {date_str}\n"
+    yield "\n"
+    yield f"> 今日共更新 {len(store)} 篇文章{_brief_note(store)}\n"
+    yield "\n"
+    yield "---\n"
+    yield "\n"
+
+    current_domain = None
+    for i, article in enumerate(_ordered_articles(store, template), 1):
+        analysis = article['analysis']
+        domain = article_domain(analysis)
+        if template == "domain" and domain != current_domain:
+            current_domain = domain
+            yield f"# 🗂️ {domain}\n"
+            yield "\n"
+
+        yield from _iter_article_markdown(article, f"{i}. ")
+        yield "---\n"
+        yield "\n"
+
+    brief = store.brief_index()
+    if brief:
+        yield f"## 📎 其他更新 ({len(brief)} 篇，未深度分析)\n"
+        yield "\n"
+        for article in store.iter_articles(brief):
+            yield f"- [{article['original_title']}]({article['link']}) - {article['author']}\n"
+        yield "\n"
+
+
+def iter_html_lines(store, date_str, template="score"):
+    """逐行生成 HTML 日报"""
+    esc = html.escape
+    yield "<!DOCTYPE html>\n"
+    yield f"<html lang=\"zh-CN\"><head><meta charset=\"utf-8\"><title>Daily RSS Digest - {date_str}</title></head>\n"
+    yield "<body>\n"
+    yield f"<h1>📅 【RSS】Daily RSS Digest - {date_str}</h1>\n"
+    yield f"<p>今日共更新 {len(store)} 篇文章{esc(_brief_note(store))}</p>\n"
+
+    current_domain = None
+    for i, article in enumerate(_ordered_articles(store, template), 1):
+        analysis = article['analysis']
+        domain = article_domain(analysis)
+        if template == "domain" and domain != current_domain:
+            current_domain = domain
+            yield f"<h1>🗂️ {esc(domain)}</h1>\n"
+
+        title_prefix = "[🎙️ 播客] " if article.get('is_podcast') else ""
+        title = analysis.get('title_translated', article['original_title'])
+        yield "<article>\n"
+        yield f"<h2>{i}. {esc(title_prefix + title)}</h2>\n"
+        yield "<ul>\n"
+        yield f"<li><b>来源</b>: {esc(article['author'] or '')}</li>\n"
+        yield f"<li><b>发布时间</b>: {esc(article['published'])}</li>\n"
+        yield f"<li><b>原文链接</b>: <a href=\"{esc(article['link'])}\">点击阅读</a></li>\n"
+        yield f"<li><b>领域</b>: <code>{esc(domain)}</code></li>\n"
+        yield f"<li><b>评分</b>: {esc(str(analysis.get('score', 0)))} / 100</li>\n"
+        yield "</ul>\n"
+        yield "<h3>📝 核心摘要</h3>\n"
+        yield f"<blockquote><b>{esc(analysis.get('one_sentence_summary', ''))}</b></blockquote>\n"
+        for paragraph in analysis.get('summary', '').split('\n'):
+            if paragraph.strip():
+                yield f"<p>{esc(paragraph)}</p>\n"
+        yield "<h3>💡 关键洞察</h3>\n"
+        yield "<ul>\n"
+        for point in analysis.get('key_takeaways', []):
+            yield f"<li>{esc(str(point))}</li>\n"
+        yield "</ul>\n"
+        yield f"<p><i>评分理由: {esc(analysis.get('reason', ''))}</i></p>\n"
+        yield "</article>\n<hr>\n"
+
+    brief = store.brief_index()
+    if brief:
+        yield f"<h2>📎 其他更新 ({len(brief)} 篇，未深度分析)</h2>\n"
+        yield "<ul>\n"
+        for article in store.iter_articles(brief):
+            yield (f"<li><a href=\"{esc(article['link'])}\">{esc(article['original_title'])}</a>"
+                   f" - {esc(article['author'] or '')}</li>\n")
+        yield "</ul>\n"
+
+    yield "</body></html>\n"
+
+
+def iter_dingtalk_chunks(lines, max_length=4000):
+    """把逐行输出按长度切分为钉钉消息分段 (按行切分，避免截断 Markdown 格式)"""
+    current_chunk = ""
+    for line in lines:
+        if current_chunk and len(current_chunk) + len(line) > max_length:
+            yield current_chunk
+            current_chunk = ""
+        current_chunk += line
+    if current_chunk:
+        yield current_chunk
+
+
+RENDERERS = {
+    "markdown": (iter_markdown_lines, "md"),
+    "html": (iter_html_lines, "html"),
+}
+
+
+def render_report(store, output_dir, date_str, fmt="markdown", template="score"):
+    """渲染日报到文件，返回文件路径"""
+    renderer, ext = RENDERERS[fmt]
+    filepath = os.path.join(output_dir, f"Daily_Digest_{date_str}.{ext}")
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.writelines(renderer(store, date_str, template))
+    return filepath
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从已存储的分析结果重新渲染日报 (不会重新调用 LLM)")
+    parser.add_argument("date", nargs="?", default=datetime.datetime.now().strftime("%Y-%m-%d"), help="日期 YYYY-MM-DD")
+    parser.add_argument("--format", choices=sorted(RENDERERS), default="markdown")
+    parser.add_argument("--template", choices=TEMPLATES, default="score")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    store_path = get_store_path(args.output_dir, args.date)
+    if not os.path.exists(store_path):
+        print(f"[-] 未找到分析结果存储: {store_path}")
+        sys.exit(1)
+
+    store = AnalysisStore(store_path)
+    path = render_report(store, args.output_dir, args.date, args.format, args.template)
+    print(f"[√] 已渲染 {len(store)} 篇文章: {path}")
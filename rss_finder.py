@@ -120,8 +120,14 @@ def batch_find_rss(url_list):
 
 import json
 import os
+import argparse
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量探测 channels_from_excel.json 中网站的 RSS 地址")
+    parser.add_argument("--output", help="把探测结果 {网址: [RSS...]} 写入 JSON 文件 (供订阅源注册表合并)，"
+                                         "默认 rss_finder_results.json")
+    args = parser.parse_args()
+
     # ==========================================
     # 从 JSON 文件读取网站列表
     # ==========================================
@@ -170,6 +176,11 @@ if __name__ == "__main__":
             print(f"\n[网站]: {site}")
             for feed in feeds:
                 print(f"  - {feed}")
+
+        output_path = args.output or os.path.join(current_dir, "rss_finder_results.json")
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({site: sorted(feeds) for site, feeds in found.items()}, f, ensure_ascii=False, indent=2)
+        print(f"\n[+] 探测结果已写入: {output_path}")
                 
     except Exception as e:
         print(f"[-] 发生错误: {e}")
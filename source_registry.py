@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import xml.etree.ElementTree as ET
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# ==========================================
+# 订阅源注册表
+# ==========================================
+# 合并所有订阅源输入，规范化 Feed 地址并跨来源去重，编译成紧凑的缓存索引:
+#   - channels_from_excel.json: 博客源元数据 (姓名、网址)
+#   - known_rss_map.json: 主页 -> RSS 映射
+#   - rss_finder 输出 (rss_finder.py --output): 主页 -> [候选 RSS]
+#   - 播客 OPML
+# 索引记录每个输入文件的 mtime / 大小 / sha1，只有输入变化时才重新解析。
+
+DEFAULT_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_reports", "source_index.json")
+INDEX_VERSION = 1
+
+# 不影响 Feed 内容的跟踪参数
+TRACKING_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "ref", "from"}
+
+
+def canonical_url(url):
+    """
+    规范化 URL 作为去重键: 忽略协议、大小写主机名、www. 前缀、默认端口、末尾斜杠、
+    片段和跟踪参数，查询参数按名称排序。
+    """
+    url = (url or "").strip().replace('\\/', '/')
+    if not url:
+        return ""
+    if "://" not in url:
+        url = "http://" + url
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/')
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_"))
+    return urlunsplit(("", host, path, urlencode(query), "")).lstrip('/')
+
+
+def _file_signature(path, previous=None):
+    """输入文件签名；mtime 与大小未变时沿用上次的 sha1，避免重复读取文件"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if previous and previous.get("mtime") == stat.st_mtime and previous.get("size") == stat.st_size:
+        return previous
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return {"mtime": stat.st_mtime, "size": stat.st_size, "sha1": digest}
+
+
+def _pick_finder_feed(candidates):
+    """从 rss_finder 找到的多个候选中选择一个 (排除评论 Feed，结果稳定)"""
+    candidates = sorted(candidates or [])
+    for url in candidates:
+        if "comment" not in url.lower():
+            return url
+    return candidates[0] if candidates else None
+
+
+class SourceRegistry:
+    """博客 / 播客订阅源注册表，带按输入文件失效的缓存索引"""
+
+    def __init__(self, index_file=DEFAULT_INDEX_FILE, source_file=None, rss_map_file=None,
+                 finder_file=None, podcast_opml_file=None, include_unlisted=False):
+        """
+        映射表 / 探测结果只用于给源文件中的站点查找 RSS 地址；
+        include_unlisted=True 时，其中不在源文件里的站点也作为订阅源纳入 (名称使用域名)。
+        """
+        self.index_file = index_file
+        self.include_unlisted = include_unlisted
+        self.inputs = {
+            "source_file": source_file,
+            "rss_map_file": rss_map_file,
+            "finder_file": finder_file,
+            "podcast_opml_file": podcast_opml_file,
+        }
+        self.duplicates = []
+
+    # ---------- 索引 ----------
+
+    def _read_index(self):
+        if not os.path.exists(self.index_file):
+            return None
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except Exception:
+            return None
+        if index.get("version") != INDEX_VERSION:
+            return None
+        return index
+
+    def _signatures(self, previous=None):
+        previous = previous or {}
+        return {name: _file_signature(path, previous.get(name)) if path else None
+                for name, path in self.inputs.items()}
+
+    def _is_fresh(self, index, signatures):
+        if index.get("paths") != self.inputs or index.get("include_unlisted") != self.include_unlisted:
+            return False
+        for name, signature in signatures.items():
+            cached = index["signatures"].get(name)
+            if (signature is None) != (cached is None):
+                return False
+            if signature and signature["sha1"] != cached["sha1"]:
+                return False
+        return True
+
+    def load(self, rebuild=False):
+        """返回去重后的订阅源列表；输入未变化时直接读取缓存索引"""
+        index = None if rebuild else self._read_index()
+        signatures = self._signatures(index["signatures"] if index else None)
+        if index and self._is_fresh(index, signatures):
+            self.duplicates = index.get("duplicates", [])
+            if index["signatures"] != signatures:
+                # 内容未变但 mtime 变了: 只更新签名，下次无需再计算哈希
+                index["signatures"] = signatures
+                self._write_index(index)
+            return index["feeds"]
+
+        feeds = self.build()
+        self._write_index({"version": INDEX_VERSION, "paths": self.inputs, "include_unlisted": self.include_unlisted,
+                           "signatures": signatures, "feeds": feeds, "duplicates": self.duplicates})
+        print(f"[*] 订阅源索引已重建: {len(feeds)} 个源，合并重复 {len(self.duplicates)} 个")
+        return feeds
+
+    def _write_index(self, index):
+        directory = os.path.dirname(self.index_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = self.index_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.index_file)
+
+    # ---------- 解析输入 ----------
+
+    @staticmethod
+    def _load_json(path, default):
+        if not path or not os.path.exists(path):
+            return default
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[-] 解析失败 {path}: {e}")
+            return default
+
+    def _load_opml(self):
+        path = self.inputs["podcast_opml_file"]
+        feeds = []
+        if not path or not os.path.exists(path):
+            if path:
+                print(f"[-] OPML 文件不存在: {path}")
+            return feeds
+        try:
+            root = ET.parse(path).getroot()
+            # 查找所有 type="rss" 的 outline
+            for outline in root.findall(".//outline[@type='rss']"):
+                title = outline.get("text") or outline.get("title")
+                xml_url = outline.get("xmlUrl")
+                if title and xml_url:
+                    feeds.append({"name": title, "homepage": xml_url, "rss_url": xml_url, "is_podcast": True})
+        except Exception as e:
+            print(f"[-] 解析 OPML 失败: {e}")
+        return feeds
+
+    def build(self):
+        """解析全部输入并按规范化 Feed 地址去重 (先出现的条目优先)"""
+        # 规范化主页 -> (原始主页, RSS 地址)
+        rss_map = {canonical_url(home): (home, rss) for home, rss in self._load_json(self.inputs["rss_map_file"], {}).items()}
+        finder = {canonical_url(home): (home, _pick_finder_feed(found))
+                  for home, found in self._load_json(self.inputs["finder_file"], {}).items()}
+
+        candidates = []
+        mapped_homes = set()
+        for item in self._load_json(self.inputs["source_file"], []):
+            url = (item.get("网址") or "").strip()
+            name = item.get("姓名")
+            if not url:
+                continue
+            home = canonical_url(url)
+            rss_url = (rss_map.get(home) or finder.get(home) or (None, None))[1]
+            # 如果 URL 本身看起来像 RSS (虽然源文件里大部分是主页)
+            if not rss_url and (url.endswith('.xml') or url.endswith('/feed')):
+                rss_url = url
+            if rss_url:
+                mapped_homes.add(home)
+                candidates.append({"name": name, "homepage": url, "rss_url": rss_url})
+
+        # 映射表 / 探测结果中不在源文件里的站点 (需显式开启)，名称使用域名
+        for mapping in (rss_map, finder) if self.include_unlisted else ():
+            for home, (homepage, rss_url) in mapping.items():
+                if rss_url and home not in mapped_homes:
+                    mapped_homes.add(home)
+                    candidates.append({"name": urlsplit("http://" + home).hostname, "homepage": homepage, "rss_url": rss_url})
+
+        candidates.extend(self._load_opml())
+
+        feeds = []
+        by_key = {}
+        self.duplicates = []
+        for feed in candidates:
+            key = canonical_url(feed["rss_url"])
+            existing = by_key.get(key)
+            if existing is None:
+                feed["key"] = key
+                by_key[key] = feed
+                feeds.append(feed)
+                continue
+            self.duplicates.append({"key": key, "kept": existing["name"], "dropped": feed["name"]})
+            if feed.get("is_podcast"):
+                existing["is_podcast"] = True
+        return feeds
+
+
+def dedup_feeds(feeds):
+    """按规范化 Feed 地址去重 (保留首次出现的条目)，保证同一次运行不会重复抓取"""
+    seen = set()
+    unique = []
+    for feed in feeds:
+        key = feed.get("key") or canonical_url(feed["rss_url"])
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(feed)
+    return unique
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="查看 / 重建订阅源索引")
+    parser.add_argument("--index", default=DEFAULT_INDEX_FILE)
+    parser.add_argument("--source-file", default=os.path.join(base_dir, "channels_from_excel.json"))
+    parser.add_argument("--rss-map-file", default=os.path.join(base_dir, "known_rss_map.json"))
+    parser.add_argument("--finder-file", default=os.path.join(base_dir, "rss_finder_results.json"))
+    parser.add_argument("--opml", default=os.path.join(base_dir, "BestBlogs_RSS_Podcasts_copy.opml"))
+    parser.add_argument("--include-unlisted", action="store_true", help="纳入映射表 / 探测结果中不在源文件里的站点")
+    parser.add_argument("--rebuild", action="store_true", help="忽略缓存强制重建")
+    parser.add_argument("--list", action="store_true", help="列出全部订阅源")
+    args = parser.parse_args()
+
+    registry = SourceRegistry(args.index, args.source_file, args.rss_map_file, args.finder_file, args.opml,
+                              include_unlisted=args.include_unlisted)
+    feeds = registry.load(rebuild=args.rebuild)
+    podcasts = sum(1 for f in feeds if f.get("is_podcast"))
+    print(f"[*] 共 {len(feeds)} 个订阅源 (博客 {len(feeds) - podcasts}，播客 {podcasts})")
+    for dup in registry.duplicates:
+        print(f"  [=] 重复: {dup['dropped']} -> 保留 {dup['kept']} ({dup['key']})")
+    if args.list:
+        for feed in feeds:
+            print(f"  {'🎙️' if feed.get('is_podcast') else '📝'} {feed['name']}: {feed['rss_url']}")
+    if not feeds:
+        sys.exit(1)
@@ -0,0 +1,208 @@
+import os
+import time
+import pstats
+import cProfile
+import datetime
+import functools
+import threading
+import tracemalloc
+from collections import defaultdict
+
+# ==========================================
+# 分阶段性能剖析 (--profile)
+# ==========================================
+# 只在 --profile 模式下安装: 把热点函数 (Feed 解析、HTML 转 Markdown、LLM 响应 JSON 清理、日报写入等)
+# 替换为带 cProfile 与 tracemalloc 采集的包装函数；未安装时不替换任何函数，没有额外开销。
+# 每个阶段的结果写入 <output_dir>/profile/<时间戳>/:
+#   <stage>.pstats     - cProfile 统计 (python -m pstats / snakeviz 查看)
+#   <stage>.collapsed  - 折叠调用栈，单位微秒 (flamegraph.pl / speedscope 生成火焰图)
+#   <stage>.alloc.txt  - 分配内存最多的代码位置 (前 snapshot_calls 次调用的 tracemalloc 快照差异之和)
+#   summary.txt        - 各阶段调用次数、墙钟 / CPU 时间、单次调用峰值内存与最耗时函数
+# 剖析时流水线应串行执行 (concurrency=1)，保证内存峰值和调用栈能归属到单个阶段。
+
+
+def _label(func):
+    filename, lineno, name = func
+    if filename == "~":
+        return name
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def collapsed_stacks(stats, max_depth=64, min_seconds=1e-6):
+    """
+    从 pstats 的调用关系推算折叠调用栈 {"a;b;c": 自身耗时秒数}。
+    cProfile 只记录调用者 -> 被调用者的累计时间而不记录完整调用栈，
+    同一函数在多处被调用时按各调用边的累计时间比例分摊，结果为近似值。
+    """
+    entries = stats.stats  # func -> (cc, nc, tt, ct, callers)
+    children = defaultdict(list)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+    stacks = defaultdict(float)
+
+    def walk(func, path, on_path, share):
+        _, _, tt, ct, _ = entries[func]
+        path = path + [_label(func)]
+        if tt * share >= min_seconds:
+            stacks[";".join(path)] += tt * share
+        if len(path) >= max_depth:
+            return
+        on_path.add(func)
+        for child, edge_ct in children.get(func, []):
+            child_ct = entries[child][3]
+            # 递归调用只计入第一层；按本路径上的份额分摊子函数的耗时
+            if child in on_path or child_ct <= 0 or edge_ct * share < min_seconds:
+                continue
+            walk(child, path, on_path, share * edge_ct / child_ct)
+        on_path.discard(func)
+
+    for func, value in entries.items():
+        # 调用者为空的是被剖析函数本身 (以及剖析器自身的 disable 调用)
+        if not value[4] and "_lsprof" not in func[2]:
+            walk(func, [], set(), 1.0)
+    return stacks
+
+
+class StageProfiler:
+    """按阶段聚合的 cProfile + tracemalloc 采集器"""
+
+    def __init__(self, output_dir, snapshot_calls=5, top_sites=25, traceback_frames=1):
+        self.output_dir = os.path.join(output_dir, "profile", datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self.snapshot_calls = snapshot_calls
+        self.top_sites = top_sites
+        self.traceback_frames = traceback_frames
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patches = []
+        self._started_tracemalloc = False
+
+    # ---------- 安装 / 卸载 ----------
+
+    def install(self, targets):
+        """targets: [(模块, 函数名, 阶段名), ...]，同一阶段可以包含多个函数"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.traceback_frames)
+            self._started_tracemalloc = True
+        for module, name, stage in targets:
+            original = getattr(module, name)
+            setattr(module, name, self.wrap(original, stage))
+            self._patches.append((module, name, original))
+        print(f"[*] 性能剖析已启用: {', '.join(sorted({stage for _, _, stage in targets}))}")
+        return self
+
+    def uninstall(self):
+        for module, name, original in reversed(self._patches):
+            setattr(module, name, original)
+        self._patches = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # ---------- 采集 ----------
+
+    def _stage(self, name):
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak": 0, "net": 0,
+                                          "stats": None, "alloc": defaultdict(lambda: [0, 0]), "snapshots": 0}
+        return record
+
+    def wrap(self, func, stage):
+        profiler = self
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            local = profiler._local
+            if getattr(local, "active", False):
+                # 嵌套的被剖析函数计入外层阶段
+                return func(*args, **kwargs)
+            local.active = True
+            with profiler._lock:
+                record = profiler._stage(stage)
+                take_snapshot = record["snapshots"] < profiler.snapshot_calls
+                if take_snapshot:
+                    record["snapshots"] += 1
+            before = tracemalloc.take_snapshot() if take_snapshot else None
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+            prof = cProfile.Profile()
+            wall, cpu = time.perf_counter(), time.thread_time()
+            prof.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                prof.disable()
+                wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+                current, peak = tracemalloc.get_traced_memory()
+                diffs = tracemalloc.take_snapshot().compare_to(before, "lineno") if take_snapshot else []
+                local.active = False
+                profiler._collect(stage, prof, wall, cpu, peak - start_memory, current - start_memory, diffs)
+
+        return wrapper
+
+    def _collect(self, stage, prof, wall, cpu, peak, net, diffs):
+        with self._lock:
+            record = self._stage(stage)
+            record["calls"] += 1
+            record["wall"] += wall
+            record["cpu"] += cpu
+            record["peak"] = max(record["peak"], peak)
+            record["net"] += net
+            if record["stats"] is None:
+                record["stats"] = pstats.Stats(prof)
+            else:
+                record["stats"].add(prof)
+            for diff in diffs:
+                if diff.size_diff <= 0:
+                    continue
+                frame = diff.traceback[0]
+                if frame.filename == tracemalloc.__file__:
+                    continue
+                site = record["alloc"][f"{frame.filename}:{frame.lineno}"]
+                site[0] += diff.size_diff
+                site[1] += diff.count_diff
+
+    # ---------- 输出 ----------
+
+    def save(self):
+        """写出各阶段的 pstats / 折叠调用栈 / 分配位置和汇总，返回汇总文本"""
+        if not self.stages:
+            print("[*] 性能剖析: 没有采集到任何阶段")
+            return ""
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        lines = [f"{'阶段':<20} {'调用':>6} {'墙钟(s)':>9} {'CPU(s)':>8} {'单次峰值内存':>12} {'净增内存':>10}"]
+        details = []
+        for name, record in sorted(self.stages.items(), key=lambda item: -item[1]["wall"]):
+            stats = record["stats"]
+            if stats is not None:
+                stats.dump_stats(os.path.join(self.output_dir, f"{name}.pstats"))
+                with open(os.path.join(self.output_dir, f"{name}.collapsed"), 'w', encoding='utf-8') as f:
+                    for stack, seconds in sorted(collapsed_stacks(stats).items()):
+                        micros = round(seconds * 1e6)
+                        if micros:
+                            f.write(f"{stack} {micros}\n")
+            sites = sorted(record["alloc"].items(), key=lambda item: -item[1][0])[:self.top_sites]
+            with open(os.path.join(self.output_dir, f"{name}.alloc.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"# {name}: 前 {record['snapshots']} 次调用中新增内存最多的代码位置\n")
+                for site, (size, count) in sites:
+                    f.write(f"{size / 1024:>10.1f} KiB {count:>8} 块  {site}\n")
+
+            lines.append(f"{name:<20} {record['calls']:>6} {record['wall']:>9.3f} {record['cpu']:>8.3f} "
+                         f"{record['peak'] / 1024 / 1024:>10.2f}MB {record['net'] / 1024 / 1024:>8.2f}MB")
+            if stats is not None:
+                details.append(f"\n[{name}] 自身耗时最多的函数:")
+                top = sorted((item for item in stats.stats.items() if "_lsprof" not in item[0][2]),
+                             key=lambda item: -item[1][2])[:5]
+                for func, (_, nc, tt, _, _) in top:
+                    details.append(f"  {tt * 1000:>9.1f}ms {nc:>8} 次  {_label(func)}")
+
+        summary = "\n".join(lines + details)
+        with open(os.path.join(self.output_dir, "summary.txt"), 'w', encoding='utf-8') as f:
+            f.write(summary + "\n")
+        print(summary)
+        print(f"[√] 性能剖析结果已写入: {self.output_dir}")
+        return summary
@@ -0,0 +1,124 @@
+import os
+import re
+from source_registry import canonical_url, dedup_feeds
+from analysis_store import article_domain
+
+# ==========================================
+# 订阅者配置 (多团队共享一次抓取与分析)
+# ==========================================
+# 每个订阅者有自己的来源、评分阈值、领域、钉钉 Webhook 和日报模板。
+# 一次运行只抓取和分析所有订阅者来源的并集，之后按订阅者筛选存储、分别渲染和推送，
+# 新增订阅者只增加渲染与发送的开销。
+#
+# config.json 中的 subscribers 项:
+#   sources: 源名称 / Feed 地址列表 (匹配订阅源注册表)，也可以是 {"name", "rss_url"} 形式的额外源；
+#            省略或包含 "*" 表示全部来源
+#   min_score / domains: 只保留评分不低于阈值、属于指定领域的文章
+#   dingtalk / template / formats: 推送与渲染设置，省略时沿用全局配置
+#   alert_min_score: 持续运行模式下单篇速递的评分阈值，省略时沿用 realtime.alert_min_score
+# 未配置 subscribers 时使用与全局配置一致的单个默认订阅者。
+
+DEFAULT_PROFILE = "default"
+
+
+class SubscriberProfile:
+    """一个订阅者 (团队) 的来源筛选与日报设置"""
+
+    def __init__(self, name, output_dir, sources=None, min_score=0, domains=None, webhook="", secret="",
+                 template="score", formats=None, alert_min_score=85):
+        self.name = name
+        self.output_dir = output_dir
+        self.all_sources = not sources or "*" in sources
+        self.source_keys = set()
+        self.extra_feeds = []
+        for source in sources or []:
+            if isinstance(source, dict):
+                self.extra_feeds.append({"name": source.get("name") or source["rss_url"], "homepage": source.get("homepage", ""),
+                                         "rss_url": source["rss_url"], "is_podcast": bool(source.get("is_podcast"))})
+            elif source != "*":
+                self.source_keys.add(source)
+                self.source_keys.add(canonical_url(source))
+        self.min_score = min_score or 0
+        self.domains = set(domains or [])
+        self.webhook = webhook
+        self.secret = secret
+        self.template = template
+        self.formats = formats or ["markdown"]
+        self.alert_min_score = alert_min_score
+        self.feed_names = set()
+
+    @property
+    def filters(self):
+        """是否需要筛选 (不筛选时直接使用完整存储)"""
+        return not self.all_sources or self.min_score > 0 or bool(self.domains)
+
+    def wants_feed(self, feed):
+        if self.all_sources:
+            return True
+        return (feed["name"] in self.source_keys
+                or canonical_url(feed["rss_url"]) in self.source_keys
+                or canonical_url(feed.get("homepage", "")) in self.source_keys)
+
+    def resolve(self, feeds):
+        """从全部订阅源中选出本订阅者的来源 (含额外源)，记录其名称用于筛选文章"""
+        extra_keys = {canonical_url(feed["rss_url"]) for feed in self.extra_feeds}
+        selected = [feed for feed in feeds if self.wants_feed(feed) or canonical_url(feed["rss_url"]) in extra_keys]
+        # 额外源与注册表中的源重复时，文章署名为注册表中的名称，两者都需要匹配
+        self.feed_names = {feed["name"] for feed in selected + self.extra_feeds}
+        return selected + self.extra_feeds
+
+    def accepts(self, article, sources=None):
+        """
+        文章是否属于本订阅者的日报 (仅列标题的条目不受评分阈值限制)。
+        sources: 包含该文章的所有订阅源名称 (跨源去重时传入)，默认只看文章署名的源。
+        """
+        if not self.all_sources and not (sources or {article.get("author")}) & self.feed_names:
+            return False
+        analysis = article.get("analysis") or {}
+        if self.domains and article_domain(analysis) not in self.domains:
+            return False
+        if not article.get("prefiltered"):
+            try:
+                score = int(analysis.get("score", 0))
+            except (TypeError, ValueError):
+                score = 0
+            if score < self.min_score:
+                return False
+        return True
+
+
+def load_profiles(settings):
+    """按配置构造订阅者列表；未配置时返回与全局配置一致的默认订阅者"""
+    if not settings.subscribers:
+        return [SubscriberProfile(DEFAULT_PROFILE, settings.output_dir, webhook=settings.dingtalk_webhook,
+                                  secret=settings.dingtalk_secret, template=settings.report_template,
+                                  formats=settings.report_formats, alert_min_score=settings.alert_min_score)]
+    profiles = []
+    for item in settings.subscribers:
+        name = item["name"]
+        dingtalk = item.get("dingtalk", {})
+        # Webhook 可由环境变量 DINGTALK_WEBHOOK_<NAME> / DINGTALK_SECRET_<NAME> 覆盖
+        env_suffix = re.sub(r'[^0-9A-Za-z]', '_', name).upper()
+        profiles.append(SubscriberProfile(
+            name,
+            os.path.join(settings.output_dir, name),
+            sources=item.get("sources"),
+            min_score=item.get("min_score", 0),
+            domains=item.get("domains"),
+            webhook=os.environ.get(f"DINGTALK_WEBHOOK_{env_suffix}", dingtalk.get("webhook_url", "")),
+            secret=os.environ.get(f"DINGTALK_SECRET_{env_suffix}", dingtalk.get("secret", "")),
+            template=item.get("template", settings.report_template),
+            formats=item.get("formats", settings.report_formats),
+            alert_min_score=item.get("alert_min_score", settings.alert_min_score),
+        ))
+    return profiles
+
+
+def select_feeds(feeds, profiles):
+    """所有订阅者来源的并集 (按规范化地址去重)，每个订阅源只抓取和分析一次"""
+    for profile in profiles:
+        profile.resolve(feeds)
+    # 保持注册表中的顺序，额外源排在最后
+    selected = [feed for feed in feeds if any(profile.wants_feed(feed) for profile in profiles)]
+    selected.extend(feed for profile in profiles for feed in profile.extra_feeds)
+    return dedup_feeds(selected)
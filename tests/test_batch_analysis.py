@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+from digest_pipeline import (LLMAnalyzer, pack_batches, parse_batch_response, parse_batch_analysis_response,
+                             validate_analysis, estimate_tokens)
+
+
+def analysis(item_id=None, score=80, **overrides):
+    item = {"title_translated": "标题", "one_sentence_summary": "一句话", "summary": "摘要", "domain": "AI",
+            "key_takeaways": ["要点"], "score": score, "reason": "理由"}
+    if item_id is not None:
+        item["id"] = item_id
+    item.update(overrides)
+    return item
+
+
+class FakeRouter:
+    """按预设文本响应，并像 LLMRouter 一样用调用方的 parse 解析"""
+
+    def __init__(self, text):
+        self.text = text
+        self.messages = None
+
+    def complete(self, messages, parse, timeout=60, max_tokens=None, on_usage=None, kind="article"):
+        self.messages = messages
+        self.kind = kind
+        try:
+            result = parse(self.text)
+        except ValueError:
+            result = None
+        return (result, "fake") if result is not None else (None, None)
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("中文字符") == 4 + 1
+    assert estimate_tokens("a" * 40) == 10 + 1
+
+
+def test_pack_batches_respects_token_budget_and_item_limit():
+    pending = [(i, "t", "a" * 400, "feed") for i in range(5)]  # 每篇约 102 tokens
+    batches = pack_batches(pending, max_tokens=250, max_items=4)
+    assert [[item[0] for item in batch] for batch in batches] == [[0, 1], [2, 3], [4]]
+    batches = pack_batches(pending, max_tokens=10000, max_items=4)
+    assert [len(batch) for batch in batches] == [4, 1]
+
+
+def test_pack_batches_keeps_oversized_item_alone():
+    pending = [(0, "t", "a" * 40000, "feed"), (1, "t", "short", "feed")]
+    assert [[item[0] for item in batch] for batch in pack_batches(pending, max_tokens=1000)] == [[0], [1]]
+    assert pack_batches([]) == []
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps([analysis(1)]),
+    "```json\n" + json.dumps([analysis(1)]) + "\n```",
+    "以下是结果:\n" + json.dumps([analysis(1)]) + "\n完毕",
+    json.dumps({"results": [analysis(1)]}),
+])
+def test_parse_batch_response_tolerates_wrappers(text):
+    assert [item["id"] for item in parse_batch_response(text)] == [1]
+
+
+def test_empty_or_invalid_batch_response_is_rejected():
+    assert parse_batch_analysis_response("[]") is None
+    assert parse_batch_analysis_response('{"error": "busy"}') is None
+    with pytest.raises(ValueError):
+        parse_batch_analysis_response("not json")
+
+
+def test_validate_analysis_normalises_fields():
+    item = validate_analysis(analysis(score="105.6", key_takeaways="单条要点", reason=None))
+    assert item["score"] == 100 and item["key_takeaways"] == ["单条要点"]
+    assert validate_analysis(analysis(score=-3))["score"] == 0
+    assert validate_analysis(analysis(domain=" ")) is None
+    assert validate_analysis(analysis(score="高")) is None
+    assert validate_analysis(["not", "a", "dict"]) is None
+
+
+def test_analyze_batch_maps_results_back_by_id():
+    items = [(1, "A", "正文 A", "Feed A"), (2, "B", "正文 B", "Feed B"), (3, "C", "正文 C", "Feed C")]
+    response = [analysis(2, score=70), analysis(1, score=90), analysis(1, score=10), analysis(7),
+                analysis(3, summary=""), {"score": 50}, "junk"]
+    router = FakeRouter(json.dumps(response))
+    result = LLMAnalyzer(router).analyze_batch(items)
+
+    # 重复 id 取第一条、未知 id 与不合法条目被丢弃，调用方对缺失的条目单独重试
+    assert sorted(result) == [1, 2]
+    assert result[1]["score"] == 90 and result[2]["score"] == 70
+    assert "id" not in result[1]
+    assert router.kind == "batch"
+    user_content = router.messages[1]["content"]
+    assert all(f"=== 文章 id={item_id} ===" in user_content for item_id, _, _, _ in items)
+
+
+def test_analyze_batch_returns_empty_when_router_fails():
+    assert LLMAnalyzer(FakeRouter("[]")).analyze_batch([(1, "A", "正文", "Feed")]) == {}
+
+
+class FeedBudgetLedger:
+    """只有 Feed B 的预算用尽"""
+
+    def budget_exceeded(self, kind, feed=None):
+        return "来源 Feed B 已达上限" if feed == "Feed B" else None
+
+    def record_split(self, *args, **kwargs):
+        pass
+
+
+def test_analyze_batch_skips_items_whose_feed_is_over_budget():
+    items = [(1, "A", "正文 A", "Feed A"), (2, "B", "正文 B", "Feed B")]
+    router = FakeRouter(json.dumps([analysis(1), analysis(2)]))
+    result = LLMAnalyzer(router, ledger=FeedBudgetLedger()).analyze_batch(items)
+    assert sorted(result) == [1]
+    assert "id=2" not in router.messages[1]["content"]
+
+    router = FakeRouter(json.dumps([analysis(2)]))
+    assert LLMAnalyzer(router, ledger=FeedBudgetLedger()).analyze_batch([items[1]]) == {}
+    assert router.messages is None
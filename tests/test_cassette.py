@@ -0,0 +1,79 @@
+import gzip
+import base64
+import json
+import time
+
+import pytest
+import requests
+
+import cassette
+from cassette import Cassette, CassetteMiss
+from digest_pipeline import DigestSettings, replay_settings
+
+
+def write_cassette(path, entries, recorded_at=None):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({"recorded_at": recorded_at or time.time(), "version": 1}) + "\n")
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+
+def http_entry(url, body, elapsed=0.0):
+    return {"key": f"HTTP GET {url} ", "status": 200, "reason": "OK", "headers": {}, "encoding": "utf-8",
+            "elapsed": elapsed, "body": base64.b64encode(body).decode("ascii")}
+
+
+@pytest.fixture
+def replay(tmp_path):
+    tapes = []
+
+    def install(entries, latency="zero"):
+        path = tmp_path / "run.cassette.gz"
+        write_cassette(path, entries)
+        tape = Cassette(str(path), mode="replay", latency=latency).install()
+        tapes.append(tape)
+        return tape
+
+    yield install
+    for tape in tapes:
+        tape.uninstall()
+
+
+def test_replays_repeated_requests_in_recorded_order(replay):
+    url = "http://example.invalid/status"
+    tape = replay([http_entry(url, b"PENDING"), http_entry(url, b"DONE")])
+    assert requests.get(url).text == "PENDING"
+    assert requests.get(url).text == "DONE"
+    with pytest.raises(CassetteMiss):
+        requests.get(url)
+    assert tape.misses == 1
+
+
+def test_zero_latency_replay_skips_sleeps(replay):
+    replay([http_entry("http://example.invalid/", b"ok", elapsed=5)])
+    start = time.time()
+    requests.get("http://example.invalid/")
+    cassette.sleep(30)
+    assert time.time() - start < 1
+
+
+def test_sleep_waits_outside_zero_latency_replay(replay):
+    start = time.time()
+    cassette.sleep(0.05)
+    assert time.time() - start >= 0.05
+    replay([], latency="original")
+    start = time.time()
+    cassette.sleep(0.05)
+    assert time.time() - start >= 0.05
+
+
+def test_replay_settings_disable_hedging(tmp_path):
+    settings = DigestSettings({}, str(tmp_path))
+    settings.output_dir = str(tmp_path / "reports")
+    replay = replay_settings(settings)
+    assert replay.concurrency == 1
+    assert replay.router_options["hedging"] is False
+    assert "hedging" not in settings.router_options
+    assert replay.output_dir == str(tmp_path / "reports" / "replay")
+    assert replay.ledger_file.startswith(replay.output_dir)
+    assert not replay.health_enabled and not replay.archive_enabled and replay.router_stats_file is None
@@ -0,0 +1,119 @@
+import sqlite3
+
+import pytest
+
+from digest_archive import DigestArchive, period_keys
+
+
+def make_article(link, score=80, domain="AI", source="Blog A", summary="模型定价调整", excerpt=None):
+    article = {"link": link, "author": source, "original_title": f"Title {link}", "published": "2025-01-15 08:00",
+               "analysis": {"title_translated": f"标题 {link}", "score": score, "domain": domain,
+                            "summary": summary, "one_sentence_summary": summary, "key_takeaways": ["要点"]}}
+    if excerpt:
+        article["excerpt"] = excerpt
+    return article
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = DigestArchive(str(tmp_path / "archive.db"))
+    yield archive
+    archive.close()
+
+
+def rollup_counts(archive, dimension, value):
+    return archive.conn.execute(
+        "SELECT period, article_count, score_sum FROM rollups WHERE dimension = ? AND value = ? ORDER BY period",
+        (dimension, value)).fetchall()
+
+
+def test_period_keys_use_iso_weeks():
+    assert period_keys("2025-01-01") == {"week": "2025-W01", "month": "2025-01"}
+    assert period_keys("2024-12-30") == {"week": "2025-W01", "month": "2024-12"}
+
+
+def test_search_matches_terms_only_in_excerpt(archive):
+    with archive.conn:
+        archive.add_article(make_article("http://a/1", excerpt="Our new pricing tiers for enterprise customers"),
+                            "2025-01-15")
+        archive.add_article(make_article("http://a/2"), "2025-01-15")
+    results = archive.search("pricing")
+    assert [r["link"] for r in results] == ["http://a/1"]
+
+
+@pytest.mark.parametrize("field, value", [
+    ("original_title", "Go 1.24 release notes"),
+    ("key_takeaways", ["迁移到 k8 集群"]),
+    ("excerpt", "An AI-first roadmap"),
+])
+def test_short_term_fallback_searches_indexed_columns(archive, field, value):
+    # trigram 分词器下不足 3 个字符的词走 LIKE，检索范围应与全文索引一致
+    archive.tokenizer = "trigram"
+    article = make_article("http://a/1")
+    if field == "key_takeaways":
+        article["analysis"][field] = value
+    else:
+        article[field] = value
+    with archive.conn:
+        archive.add_article(article, "2025-01-15")
+        archive.add_article(make_article("http://a/2"), "2025-01-15")
+    term = {"original_title": "Go", "key_takeaways": "k8", "excerpt": "AI"}[field]
+    assert [r["link"] for r in archive.search(term)] == ["http://a/1"]
+
+
+def test_rerun_reverts_previous_rollup_contribution(archive):
+    with archive.conn:
+        archive.add_article(make_article("http://a/1", score=80, domain="AI"), "2025-01-15")
+        archive.add_article(make_article("http://a/2", score=60, domain="AI"), "2025-01-15")
+    # 同一链接重跑后领域与评分变化: 旧领域计数减一，新领域计数加一
+    with archive.conn:
+        archive.add_article(make_article("http://a/1", score=90, domain="Infra"), "2025-01-15")
+    archive.conn.execute("DELETE FROM rollups WHERE article_count <= 0")
+
+    assert [tuple(r) for r in rollup_counts(archive, "domain", "AI")] == [("month", 1, 60), ("week", 1, 60)]
+    assert [tuple(r) for r in rollup_counts(archive, "domain", "Infra")] == [("month", 1, 90), ("week", 1, 90)]
+    assert [tuple(r) for r in rollup_counts(archive, "all", "*")] == [("month", 2, 150), ("week", 2, 150)]
+    assert archive.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0] == 2
+    assert [r["link"] for r in archive.search("标题")] == ["http://a/1", "http://a/2"]
+
+    week = archive.rollup("week", "2025-W03")
+    assert week["article_count"] == 2 and week["avg_score"] == 75.0
+    assert {d["name"] for d in week["domains"]} == {"AI", "Infra"}
+
+
+def test_rerun_on_another_day_moves_rollup_between_periods(archive):
+    with archive.conn:
+        archive.add_article(make_article("http://a/1"), "2025-01-31")
+        archive.add_article(make_article("http://a/1"), "2025-02-03")
+    archive.conn.execute("DELETE FROM rollups WHERE article_count <= 0")
+    keys = {tuple(r) for r in archive.conn.execute("SELECT period, period_key FROM rollups WHERE dimension = 'all'")}
+    assert keys == {("week", "2025-W06"), ("month", "2025-02")}
+
+
+def test_old_fts_index_is_rebuilt_with_excerpt(tmp_path):
+    db_file = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_file)
+    conn.executescript("""
+        CREATE TABLE articles (id INTEGER PRIMARY KEY, link TEXT UNIQUE NOT NULL, digest_date TEXT NOT NULL,
+            published TEXT, source TEXT, original_title TEXT, title TEXT, one_sentence_summary TEXT, summary TEXT,
+            key_takeaways TEXT, domain TEXT, score INTEGER, reason TEXT, is_podcast INTEGER DEFAULT 0);
+        CREATE VIRTUAL TABLE articles_fts USING fts5(title, original_title, one_sentence_summary, summary,
+            key_takeaways, content='articles', content_rowid='id', tokenize='unicode61');
+        CREATE TRIGGER articles_ai AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts(rowid, title, original_title, one_sentence_summary, summary, key_takeaways)
+            VALUES (new.id, new.title, new.original_title, new.one_sentence_summary, new.summary, new.key_takeaways);
+        END;
+        INSERT INTO articles (link, digest_date, title, summary, score) VALUES ('http://old/1', '2025-01-01', 'Old', 'kernel', 70);
+    """)
+    conn.commit()
+    conn.close()
+
+    archive = DigestArchive(db_file)
+    try:
+        assert archive.tokenizer == "unicode61"
+        assert [r["link"] for r in archive.search("kernel")] == ["http://old/1"]
+        with archive.conn:
+            archive.add_article(make_article("http://new/1", excerpt="benchmark results"), "2025-01-15")
+        assert [r["link"] for r in archive.search("benchmark")] == ["http://new/1"]
+    finally:
+        archive.close()
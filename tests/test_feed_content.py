@@ -0,0 +1,63 @@
+import pytest
+
+from digest_pipeline import DigestSettings, extract_feed_full_text, get_feed_content_policy
+
+FEED = {"name": "Blog", "rss_url": "http://blog.invalid/feed.xml"}
+PARAGRAPH = "<p>" + "Sentence about systems design and the tradeoffs involved. " * 10 + "</p>"
+
+
+def entry_with(html):
+    return {"content": [{"value": html}], "summary": "short summary"}
+
+
+def article(ending, paragraphs=6):
+    return PARAGRAPH * paragraphs + f"<p>{ending}</p>"
+
+
+@pytest.mark.parametrize("html, expected", [
+    (article("The end."), True),
+    # 完整长文以省略号结尾、正文中间出现省略号，都不算截断
+    (article("and so it goes..."), True),
+    (article("Wait… what? That is the whole story."), True),
+    # "阅读全文" 链接与 WordPress 摘要标记
+    (article('<a href="http://blog.invalid/post">Read more</a>'), False),
+    (article("继续阅读请点击 阅读全文"), False),
+    (article("the rest of the post […]"), False),
+    (article("the rest of the post [...]"), False),
+    # 较短的正文以省略号结尾，多半是摘要
+    (article("and then…", paragraphs=3), False),
+    # 长度或段落数不足
+    (PARAGRAPH, False),
+    ("<div>" + "word " * 600 + "</div>", False),
+])
+def test_auto_policy_heuristic(html, expected):
+    result = extract_feed_full_text(entry_with(html), "auto", min_chars=1500, min_paragraphs=3)
+    assert (result == html) is expected
+
+
+def test_always_and_never_policies():
+    entry = entry_with(PARAGRAPH)
+    assert extract_feed_full_text(entry, "always") == PARAGRAPH
+    assert extract_feed_full_text(entry, "never") is None
+    assert extract_feed_full_text({"summary": "only a summary"}, "always") == "only a summary"
+
+
+@pytest.mark.parametrize("feed_value, overrides, expected", [
+    (None, {}, "auto"),
+    (None, {"Blog": "always"}, "always"),
+    (None, {FEED["rss_url"]: "never", "Blog": "always"}, "never"),
+    (True, {"Blog": "never"}, "always"),
+    (False, {}, "never"),
+])
+def test_policy_resolution(tmp_path, feed_value, overrides, expected):
+    settings = DigestSettings({"feed_content": {"overrides": overrides}}, str(tmp_path))
+    feed = dict(FEED, full_content=feed_value) if feed_value is not None else FEED
+    assert get_feed_content_policy(feed, settings) == expected
+
+
+def test_unknown_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="feed_content.overrides"):
+        DigestSettings({"feed_content": {"overrides": {"Blog": "alwyas"}}}, str(tmp_path))
+    settings = DigestSettings({}, str(tmp_path))
+    with pytest.raises(ValueError, match="full_content"):
+        get_feed_content_policy(dict(FEED, full_content="full"), settings)
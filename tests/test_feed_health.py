@@ -0,0 +1,87 @@
+import pytest
+
+import feed_health
+from feed_health import FeedHealthTracker
+
+FEED = "https://blog.example.com/feed.xml"
+HOUR = 3600
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(feed_health.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def tracker(tmp_path, clock):
+    return FeedHealthTracker(str(tmp_path / "health.json"), failure_threshold=3, base_probe_hours=12,
+                             max_probe_hours=48)
+
+
+def test_breaker_opens_at_threshold_and_backs_off_exponentially(tracker, clock):
+    for _ in range(2):
+        tracker.record_feed(FEED, False, error="HTTP 500")
+    assert tracker.allow(FEED)
+
+    expected = [12, 24, 48, 48]  # 2^n 增长并封顶于 max_probe_hours
+    for hours in expected:
+        tracker.record_feed(FEED, False, error="HTTP 500")
+        record = tracker.data["feeds"][FEED]
+        assert record["next_probe"] - clock[0] == hours * HOUR
+        assert not tracker.allow(FEED)
+    assert tracker.run_skipped == [FEED] * len(expected)
+
+    # 到达重新探测时间后放行一次探测，成功即关闭熔断
+    clock[0] += 48 * HOUR
+    assert tracker.allow(FEED)
+    tracker.record_feed(FEED, True, latency=0.5)
+    record = tracker.data["feeds"][FEED]
+    assert record["consecutive_failures"] == 0 and record["next_probe"] is None
+    assert record["total_failure"] == 6 and record["total_success"] == 1
+
+
+def test_open_host_breaker_blocks_every_feed_on_the_host(tracker):
+    for _ in range(3):
+        tracker.record_host(FEED, False, error="timeout")
+    assert not tracker.allow("https://blog.example.com/other.xml")
+    assert not tracker.allow("https://blog.example.com/article", is_feed=False)
+    assert tracker.allow("https://elsewhere.example.com/feed.xml")
+
+
+def test_timeout_tightens_for_failing_and_slow_hosts(tracker):
+    assert tracker.timeout_for(FEED) == 15
+    tracker.record_host(FEED, True, latency=10)
+    assert tracker.timeout_for(FEED) == 8
+    tracker.record_host(FEED, False, error="timeout")
+    assert tracker.timeout_for(FEED) == 5
+    for _ in range(6):
+        tracker.record_host(FEED, True, latency=0.2)
+    assert tracker.timeout_for(FEED) == 15
+
+
+def test_latency_ewma(tracker):
+    tracker.record_feed(FEED, True, latency=10)
+    tracker.record_feed(FEED, True, latency=0)
+    tracker.record_feed(FEED, True)
+    assert tracker.data["feeds"][FEED]["latency_ewma"] == 7.0
+
+
+def test_state_survives_reload(tracker, tmp_path):
+    for _ in range(3):
+        tracker.record_feed(FEED, False, error="parse error", name="Example")
+    tracker.save()
+    reloaded = FeedHealthTracker(tracker.path)
+    assert not reloaded.allow(FEED)
+    kind, key, record, reasons = reloaded.attention_list()[0]
+    assert (kind, key, record["name"]) == ("feeds", FEED, "Example")
+    assert reasons[:2] == ["熔断中", "连续失败 3 次"]
+
+
+def test_corrupt_file_starts_fresh(tmp_path, capsys):
+    path = tmp_path / "health.json"
+    path.write_text("{broken", encoding="utf-8")
+    tracker = FeedHealthTracker(str(path))
+    assert tracker.data == {"feeds": {}, "hosts": {}}
+    assert "健康记录加载失败" in capsys.readouterr().out
@@ -0,0 +1,117 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from http_fetch import (stream_download, FetchAborted, NotModified, CHUNK_SIZE,
+                        HTML_CONTENT_TYPES, FEED_CONTENT_TYPES)
+
+# 路径 -> (Content-Type, 响应体, 是否发送 Content-Length)
+BODY = b"x" * (CHUNK_SIZE * 3)
+ROUTES = {
+    "/page": ("text/html; charset=utf-8", BODY, True),
+    "/chunked": ("text/html", BODY, False),
+    "/feed": ("application/rss+xml", b"<rss/>", True),
+    "/xml": ("text/xml", b"<rss/>", True),
+    "/pdf": ("application/pdf", BODY, True),
+    "/html-as-feed": ("text/html", b"<html/>", True),
+}
+
+
+class QuietServer(ThreadingHTTPServer):
+    # 客户端中止下载时服务端写入会被重置，这里不打印异常
+    def handle_error(self, request, client_address):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/cached":
+                if self.headers.get("If-None-Match") == '"v1"':
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("ETag", '"v1"')
+                self.send_header("Last-Modified", "Mon, 05 Jan 2026 00:00:00 GMT")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+                return
+            content_type, body, with_length = ROUTES[self.path]
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            if with_length:
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                # 分块传输: 没有 Content-Length，只能边读边计数
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(0, len(body), 4096):
+                    part = body[i:i + 4096]
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+                self.wfile.write(b"0\r\n\r\n")
+
+    httpd = QuietServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_returns_bytes_within_cap(server):
+    content = stream_download(server + "/page", max_bytes=len(BODY))
+    assert type(content) is bytes
+    assert content == BODY
+
+
+def test_content_length_over_cap_aborts_before_reading(server):
+    with pytest.raises(FetchAborted, match="内容过大"):
+        stream_download(server + "/page", max_bytes=1000)
+
+
+def test_streamed_body_over_cap_aborts(server):
+    with pytest.raises(FetchAborted, match="内容超过上限"):
+        stream_download(server + "/chunked", max_bytes=CHUNK_SIZE + 10)
+
+
+@pytest.mark.parametrize("path", ["/page", "/chunked"])
+def test_truncate_keeps_prefix(server, path):
+    messages = []
+    content = stream_download(server + path, max_bytes=CHUNK_SIZE + 10, truncate=True, log=messages.append)
+    assert content == BODY[:CHUNK_SIZE + 10]
+    assert len(messages) == 1 and "已截断" in messages[0]
+
+
+@pytest.mark.parametrize("path, allowed, ok", [
+    ("/pdf", HTML_CONTENT_TYPES, False),
+    ("/feed", FEED_CONTENT_TYPES, True),
+    ("/xml", FEED_CONTENT_TYPES, True),
+    ("/html-as-feed", FEED_CONTENT_TYPES, False),
+    ("/html-as-feed", HTML_CONTENT_TYPES, True),
+])
+def test_content_type_filter(server, path, allowed, ok):
+    if ok:
+        assert stream_download(server + path, allowed_types=allowed)
+    else:
+        with pytest.raises(FetchAborted, match="非预期的内容类型"):
+            stream_download(server + path, allowed_types=allowed)
+
+
+def test_validators_updated_and_304_raises(server):
+    validators = {}
+    assert stream_download(server + "/cached", validators=validators) == b"ok"
+    assert validators == {"etag": '"v1"', "last_modified": "Mon, 05 Jan 2026 00:00:00 GMT"}
+    with pytest.raises(NotModified):
+        stream_download(server + "/cached", validators=validators)
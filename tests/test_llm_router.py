@@ -0,0 +1,229 @@
+import json
+import time
+import threading
+
+import pytest
+
+from llm_router import LLMRouter, ProviderError, percentile, format_router_report
+
+
+class FakeProvider:
+    """可控的供应商: 等待 delay 秒 (或等待 release 事件) 后返回 text，fail 时抛出异常"""
+
+    ledger_provider = "fake"
+    model = "fake-model"
+
+    def __init__(self, name, text='{"ok": true}', delay=0.0, fail=False, release=None):
+        self.name = name
+        self.text = text
+        self.delay = delay
+        self.fail = fail
+        self.release = release
+        self.calls = 0
+
+    def complete(self, messages, timeout=60, max_tokens=None):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        elif self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise ProviderError("HTTP 500")
+        return self.text, {"prompt_tokens": 10, "completion_tokens": 5}
+
+
+def parse(text):
+    return json.loads(text) if text.startswith("{") else None
+
+
+@pytest.fixture
+def make_router():
+    routers = []
+
+    def make(providers, **kwargs):
+        kwargs.setdefault("stats_file", None)
+        kwargs.setdefault("log", lambda *_: None)
+        router = LLMRouter(providers, **kwargs)
+        routers.append(router)
+        return router
+
+    yield make
+    for router in routers:
+        router.close()
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 90) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(range(1, 11), 90) == 9
+    assert percentile([5], 99) == 5
+
+
+def test_fast_primary_wins_without_hedging(make_router):
+    primary, backup = FakeProvider("a"), FakeProvider("b")
+    router = make_router([primary, backup], default_hedge_seconds=1)
+    assert router.complete([], parse) == ({"ok": True}, "a")
+    assert backup.calls == 0
+    assert router.stats["a"]["wins"] == 1 and router.stats["a"]["hedges"] == 0
+
+
+def test_slow_primary_is_hedged_and_counted_as_abandoned(make_router):
+    release = threading.Event()
+    primary, backup = FakeProvider("a", release=release), FakeProvider("b")
+    router = make_router([primary, backup], default_hedge_seconds=0.05)
+    start = time.time()
+    assert router.complete([], parse) == ({"ok": True}, "b")
+    assert time.time() - start < 2
+    assert router.stats["a"]["hedges"] == 1 and router.stats["b"]["wins"] == 1
+    # 落败的主请求在后台完成前计入 abandoned，完成后释放并照常记录耗时
+    assert router.abandoned == 1
+    release.set()
+    wait_until(lambda: router.abandoned == 0)
+    wait_until(lambda: router.stats["a"]["requests"] == 1)
+    assert len(router.stats["a"]["latencies"]["article"]) == 1
+
+
+def test_failure_falls_back_immediately(make_router):
+    failing, backup = FakeProvider("a", fail=True), FakeProvider("b")
+    router = make_router([failing, backup], default_hedge_seconds=30)
+    start = time.time()
+    assert router.complete([], parse) == ({"ok": True}, "b")
+    assert time.time() - start < 2
+    assert router.stats["a"]["failures"] == 1 and router.stats["a"]["hedges"] == 0
+
+
+def test_invalid_result_falls_back_and_all_failures_return_none(make_router):
+    router = make_router([FakeProvider("a", text="not json"), FakeProvider("b", fail=True)])
+    assert router.complete([], parse) == (None, None)
+    assert router.stats["a"]["failures"] == 1 and router.stats["b"]["failures"] == 1
+    assert "合法的 JSON" in router.stats["a"]["last_error"]
+
+
+def test_breaker_routes_tripped_provider_last(make_router):
+    failing, backup = FakeProvider("a", fail=True), FakeProvider("b")
+    router = make_router([failing, backup], failure_threshold=2, cooldown_minutes=10)
+    for _ in range(2):
+        router.complete([], parse)
+    assert [p.name for p in router._route()] == ["b", "a"]
+    assert router.complete([], parse) == ({"ok": True}, "b")
+    assert failing.calls == 2
+    assert [r["open"] for r in router.report()] == [True, False]
+    assert "熔断中" in format_router_report(router.report())
+
+    # 冷却结束后恢复原有顺序，成功一次即关闭熔断
+    router.stats["a"]["open_until"] = time.time() - 1
+    failing.fail = False
+    assert router.complete([], parse) == ({"ok": True}, "a")
+    assert router.stats["a"]["open_until"] is None and router.stats["a"]["consecutive_failures"] == 0
+
+
+def test_hedging_pauses_at_abandoned_cap(make_router):
+    primary, backup = FakeProvider("a", delay=0.2), FakeProvider("b")
+    router = make_router([primary, backup], default_hedge_seconds=0.01, max_abandoned=1)
+    router.abandoned = 1
+    assert router.complete([], parse) == ({"ok": True}, "a")
+    assert backup.calls == 0 and router.stats["a"]["hedges"] == 0
+
+
+def test_hedging_can_be_disabled(make_router):
+    primary, backup = FakeProvider("a", delay=0.2), FakeProvider("b")
+    router = make_router([primary, backup], default_hedge_seconds=0.01, hedging=False)
+    assert router.complete([], parse) == ({"ok": True}, "a")
+    assert backup.calls == 0
+
+
+def test_hedge_clock_starts_when_primary_starts(make_router):
+    primary, backup = FakeProvider("a", delay=0.1), FakeProvider("b")
+    router = make_router([primary, backup], default_hedge_seconds=0.4, max_workers=1)
+    # 唯一的工作线程被占用 0.5s: 主请求排队时间超过对冲延迟，但不应因此触发对冲
+    router.executor.submit(time.sleep, 0.5)
+    assert router.complete([], parse) == ({"ok": True}, "a")
+    assert router.stats["a"]["hedges"] == 0 and backup.calls == 0
+
+
+def test_hedge_delay_uses_learned_percentile(make_router):
+    router = make_router([FakeProvider("a")], min_samples=5, default_hedge_seconds=20, min_hedge_seconds=2,
+                         hedge_percentile=90)
+    provider = router.providers[0]
+    router._samples(provider, "article").extend([1, 1, 1, 1])
+    assert router.hedge_delay(provider) == 20
+    router.stats["a"]["latencies"]["article"].extend([1, 1, 1, 1, 1, 1, 9])
+    assert router.hedge_delay(provider) == 2
+    router.stats["a"]["latencies"]["article"].extend([9, 9])
+    assert router.hedge_delay(provider) == 9
+
+
+def test_stats_persist_between_runs(make_router, tmp_path):
+    stats_file = str(tmp_path / "router.json")
+    router = make_router([FakeProvider("a"), FakeProvider("b")], stats_file=stats_file, max_samples=3)
+    for _ in range(5):
+        router.complete([], parse)
+    router.save()
+
+    reloaded = make_router([FakeProvider("a"), FakeProvider("b")], stats_file=stats_file, max_samples=3)
+    assert reloaded.stats["a"]["requests"] == 5 and reloaded.stats["a"]["wins"] == 5
+    assert len(reloaded.stats["a"]["latencies"]["article"]) == 3
+    assert reloaded.stats["b"]["requests"] == 0
+
+
+def test_abandoned_cap_holds_under_concurrent_hedges(make_router):
+    release = threading.Event()
+    primary, backup = FakeProvider("a", release=release), FakeProvider("b")
+    router = make_router([primary, backup], default_hedge_seconds=0.05, max_abandoned=1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(router.complete([], parse))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    # 三个请求同时超过对冲延迟，但只有一个能预占名额发出对冲
+    wait_until(lambda: len(results) == 1)
+    assert results == [({"ok": True}, "b")]
+    assert backup.calls == 1 and router.stats["a"]["hedges"] == 1 and router.abandoned == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(name for _, name in results) == ["a", "a", "b"]
+    wait_until(lambda: router.abandoned == 0)
+
+
+def test_reservation_is_returned_when_loser_already_finished(make_router):
+    primary, backup = FakeProvider("a", text="not json", delay=0.1), FakeProvider("b", delay=0.3)
+    router = make_router([primary, backup], default_hedge_seconds=0.02)
+    assert router.complete([], parse) == ({"ok": True}, "b")
+    assert router.stats["a"]["hedges"] == 1 and router.abandoned == 0
+
+
+def test_queued_primary_is_not_hedged_after_timeout(make_router):
+    primary, backup = FakeProvider("a", delay=0.1), FakeProvider("b")
+    router = make_router([primary, backup], default_hedge_seconds=0.01, max_workers=1)
+    # 主请求排队超过请求超时: 线程池已饱和，不再等待开始时刻也不发出对冲
+    router.executor.submit(time.sleep, 0.4)
+    assert router.complete([], parse, timeout=0.1) == ({"ok": True}, "a")
+    assert router.stats["a"]["hedges"] == 0 and backup.calls == 0
+
+
+def test_latency_samples_are_kept_per_kind(make_router, tmp_path):
+    router = make_router([FakeProvider("a", delay=0.05)], min_samples=2, default_hedge_seconds=20,
+                         min_hedge_seconds=0)
+    provider = router.providers[0]
+    for _ in range(2):
+        router.complete([], parse, kind="batch")
+    assert len(router.stats["a"]["latencies"]["batch"]) == 2
+    # 批量请求的耗时不影响单篇请求的对冲延迟
+    assert router.hedge_delay(provider, "article") == 20
+    assert router.hedge_delay(provider, "batch") < 1
+    rows = router.report()
+    assert set(rows[0]["latency"]) == {"batch"}
+    assert "batch" in format_router_report(rows)
+
+    # 旧版统计文件 (不区分类型) 按单篇请求加载
+    stats_file = tmp_path / "router.json"
+    stats_file.write_text(json.dumps({"a": {"latencies": [1, 2, 3], "requests": 3}}), encoding="utf-8")
+    reloaded = make_router([FakeProvider("a")], stats_file=str(stats_file))
+    assert list(reloaded.stats["a"]["latencies"]["article"]) == [1, 2, 3]
@@ -0,0 +1,106 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+import podcast_analyzer
+from podcast_analyzer import (parse_itunes_duration, find_audio_enclosure, estimate_duration, screen_episode,
+                              poll_delays)
+
+MP3 = {"href": "https://cdn.example/ep.mp3", "type": "audio/mpeg", "length": "0"}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1:02:03", 3723), ("45:30", 2730), ("1800", 1800), (" 90.5 ", 90.5),
+    ("0", None), ("", None), ("abc", None), (None, None),
+])
+def test_parse_itunes_duration(value, expected):
+    assert parse_itunes_duration(value) == expected
+
+
+def test_find_audio_enclosure_prefers_audio_types_and_extensions():
+    image = {"href": "https://cdn.example/cover.jpg", "type": "image/jpeg"}
+    untyped = {"href": "https://cdn.example/ep.M4A?token=1"}
+    assert find_audio_enclosure({"enclosures": [image, MP3]}) is MP3
+    assert find_audio_enclosure({"enclosures": [image, untyped]}) is untyped
+    assert find_audio_enclosure({"enclosures": [image, {"type": "audio/mpeg"}]}) is None
+    assert find_audio_enclosure({}) is None
+
+
+def test_estimate_duration_from_metadata_or_size():
+    assert estimate_duration({"itunes_duration": "30:00"}, dict(MP3, length="999999999")) == 1800
+    assert estimate_duration({}, dict(MP3, length="57600000")) == 3600  # 128 kbps
+    assert estimate_duration({}, dict(MP3, length="57600000"), bitrate_kbps=64) == 7200
+    assert estimate_duration({}, dict(MP3, length="1")) is None
+    assert estimate_duration({}, dict(MP3, length="n/a")) is None
+
+
+@pytest.mark.parametrize("entry, action, reason", [
+    ({"title": "Episode 12", "itunes_duration": "45:00"}, "analyze", ""),
+    ({"title": "Episode 12"}, "analyze", ""),
+    ({"title": "Season 3 Trailer", "itunes_duration": "45:00"}, "brief", "预告片"),
+    ({"title": "Coming soon", "itunes_episodetype": "Trailer"}, "brief", "预告片"),
+    ({"title": "新一季预告"}, "brief", "预告片"),
+    ({"title": "Quick note", "itunes_duration": "1:00"}, "brief", "时长仅 1.0 分钟"),
+    ({"title": "Encore: Our best interview", "itunes_duration": "45:00"}, "brief", "重播"),
+    ({"title": "经典重放 | 第 1 期"}, "brief", "重播"),
+    ({"title": "Marathon", "itunes_duration": "4:00:00"}, "defer", "时长 240 分钟超过 180 分钟"),
+])
+def test_screen_episode_default_policy(entry, action, reason):
+    assert screen_episode(entry, MP3)[:2] == (action, reason)
+
+
+def test_screen_episode_policy_overrides():
+    entry = {"title": "Marathon", "itunes_duration": "4:00:00"}
+    assert screen_episode(entry, MP3, {"oversized": "skip"}) == ("skip", "时长 240 分钟超过 180 分钟", 14400)
+    assert screen_episode(entry, MP3, {"max_minutes": 0})[0] == "analyze"
+    assert screen_episode({"title": "Replay week"}, MP3, {"rerun_patterns": []})[0] == "analyze"
+
+
+def test_poll_delays_scale_with_expected_duration():
+    # 60 分钟音频 / 20 倍速 = 预计处理 180 秒: 首次 90 秒，之后从 18 秒起按 1.5 倍退避，上限 60 秒
+    delays = list(itertools.islice(poll_delays(3600, speed=20), 6))
+    assert delays == [90, 18, 27, 40.5, 60, 60]
+    # 短节目使用最小间隔，超长节目的首次等待有上限
+    assert list(itertools.islice(poll_delays(30, speed=20), 2)) == [2, 2]
+    assert next(poll_delays(10 * 3600, speed=1)) == 600
+    # 时长未知时沿用固定的首次等待
+    assert list(itertools.islice(poll_delays(None), 3)) == [10, 10, 15]
+
+
+class FakeTranscription:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = []
+
+    def async_call(self, **kwargs):
+        self.calls.append(("async_call", kwargs))
+        return SimpleNamespace(status_code=200, output=SimpleNamespace(task_id="task-1"))
+
+    def fetch(self, **kwargs):
+        self.calls.append(("fetch", kwargs))
+        status = self.statuses.pop(0)
+        results = [{"transcription_url": "https://asr.example/result.json"}] if status == "SUCCEEDED" else None
+        return SimpleNamespace(status_code=200, output=SimpleNamespace(task_status=status, results=results))
+
+
+def test_transcribe_polls_on_schedule_and_passes_api_key(monkeypatch):
+    fake = FakeTranscription(["RUNNING", "RUNNING", "SUCCEEDED"])
+    waits = []
+    monkeypatch.setattr(podcast_analyzer, "Transcription", fake)
+    monkeypatch.setattr(podcast_analyzer.cassette, "sleep", waits.append)
+    monkeypatch.setattr(podcast_analyzer.requests, "get", lambda url: SimpleNamespace(
+        encoding=None, json=lambda: {"transcripts": [{"text": "第一段"}, {"text": "第二段"}]}))
+
+    text = podcast_analyzer.transcribe_audio("https://cdn.example/ep.mp3", expected_seconds=3600,
+                                             poll_options={"speed": 20}, api_key="sk-test")
+    assert text == "第一段\n第二段\n"
+    assert waits == [90, 18, 27]
+    assert all(kwargs["api_key"] == "sk-test" for _, kwargs in fake.calls)
+    assert [name for name, _ in fake.calls] == ["async_call", "fetch", "fetch", "fetch"]
+
+
+def test_transcribe_failure_returns_none(monkeypatch):
+    monkeypatch.setattr(podcast_analyzer, "Transcription", FakeTranscription(["FAILED"]))
+    monkeypatch.setattr(podcast_analyzer.cassette, "sleep", lambda seconds: None)
+    assert podcast_analyzer.transcribe_audio("https://cdn.example/ep.mp3") is None
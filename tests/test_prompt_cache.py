@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from digest_pipeline import DigestPipeline, DigestSettings
+from llm_router import PromptCacheStats, format_cache_report
+from usage_ledger import UsageLedger
+
+
+def test_cache_stats_hit_rate_and_latency_split():
+    stats = PromptCacheStats()
+    stats.record("deepseek", {"prompt_cache_hit_tokens": 0, "prompt_cache_miss_tokens": 1000}, 4.0)
+    stats.record("deepseek", {"prompt_cache_hit_tokens": 900, "prompt_cache_miss_tokens": 100}, 1.0)
+    stats.record("deepseek", {"prompt_cache_hit_tokens": 900, "prompt_cache_miss_tokens": 100}, 2.0)
+    stats.record("qwen", {"prompt_tokens": 500}, 3.0)
+
+    rows = {r["provider"]: r for r in stats.report()}
+    deepseek = rows["deepseek"]
+    assert deepseek["requests"] == 3 and deepseek["hit_rate"] == pytest.approx(0.6)
+    assert (deepseek["cached_requests"], deepseek["cached_p50"]) == (2, 1.0)
+    assert (deepseek["uncached_requests"], deepseek["uncached_p50"]) == (1, 4.0)
+    # 未返回缓存字段的供应商只计请求数
+    assert rows["qwen"]["requests"] == 1 and not rows["qwen"]["reported"] and rows["qwen"]["hit_rate"] is None
+
+    report = format_cache_report(stats.report())
+    assert "60%" in report and "(未返回缓存统计)" in report
+
+    stats.reset()
+    assert stats.report() == []
+
+
+class RecordingAnalyzer:
+    """记录每次分析调用的开始时刻与同时进行的请求数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active_during_first = None
+        self.calls = []
+
+    def analyze(self, content, feed=None):
+        with self.lock:
+            self.active += 1
+            self.calls.append(content)
+            first = len(self.calls) == 1
+        time.sleep(0.1)
+        with self.lock:
+            if first:
+                self.max_active_during_first = self.active
+            self.active -= 1
+        return {"score": 80}
+
+
+def run_concurrent_analyses(tmp_path, cache_warmup):
+    settings = DigestSettings({"prefilter": {"enabled": False}}, str(tmp_path))
+    settings.concurrency = 4
+    settings.cache_warmup = cache_warmup
+    settings.health_enabled = False
+    analyzer = RecordingAnalyzer()
+    ledger = UsageLedger(str(tmp_path / "ledger.db"))
+    pipeline = DigestPipeline(settings, analyzer=analyzer, notifier=object(), ledger=ledger, ranker=None,
+                              log=lambda *_: None)
+
+    async def scenario():
+        pipeline._semaphore = asyncio.Semaphore(settings.concurrency)
+        return await asyncio.gather(*(pipeline._analyze(analyzer.analyze, f"article {i}") for i in range(4)))
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        ledger.close()
+    assert results == [{"score": 80}] * 4
+    return analyzer
+
+
+def test_warmup_sends_first_request_alone(tmp_path):
+    analyzer = run_concurrent_analyses(tmp_path, cache_warmup=True)
+    assert analyzer.max_active_during_first == 1
+
+
+def test_without_warmup_requests_start_together(tmp_path):
+    analyzer = run_concurrent_analyses(tmp_path, cache_warmup=False)
+    assert analyzer.max_active_during_first > 1
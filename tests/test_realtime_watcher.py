@@ -0,0 +1,185 @@
+import time
+import hmac
+import asyncio
+import threading
+import types
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlencode
+
+import requests
+import feedparser
+
+from realtime_watcher import RealtimeWatcher
+from subscriber_profiles import SubscriberProfile
+
+FEED = {"name": "Hub Blog", "homepage": "", "rss_url": "http://blog.invalid/feed.xml"}
+
+
+class FakePipeline:
+    """process_update 每次产出预设的文章，notify 只记录调用"""
+
+    def __init__(self, articles=()):
+        self.settings = types.SimpleNamespace(max_feed_bytes=1024 * 1024, output_dir="")
+        self.health = None
+        self.articles = list(articles)
+        self.notified = []
+
+    async def process_update(self, feed, parsed, window=None):
+        for article in self.articles:
+            yield dict(article)
+
+    def sources_of(self, article):
+        return {article.get("author")}
+
+    async def notify(self, title, chunks, notifier=None):
+        self.notified.append(title)
+
+
+def make_watcher(tmp_path, pipeline, **kwargs):
+    profile = SubscriberProfile("team", str(tmp_path), webhook="http://dingtalk.invalid/robot", alert_min_score=85)
+    return RealtimeWatcher(pipeline, [FEED], [profile], on_digest=None,
+                           latency_file=str(tmp_path / "latency.jsonl"), log=lambda *_: None, **kwargs)
+
+
+class StandInHub:
+    """本地替身 Hub: 接受订阅请求后回调验证意图，并可向订阅者推送签名的内容"""
+
+    def __init__(self):
+        self.subscription = None
+        self.verification = None
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+                hub.subscription = {k: v[0] for k, v in parse_qs(body).items()}
+                self.send_response(202)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                threading.Thread(target=hub.verify, args=("subscribe",), daemon=True).start()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hub"
+
+    def verify(self, mode, topic=None, challenge="challenge-123"):
+        params = {"hub.mode": mode, "hub.topic": topic or self.subscription["hub.topic"],
+                  "hub.challenge": challenge, "hub.lease_seconds": "600"}
+        resp = requests.get(f"{self.subscription['hub.callback']}?{urlencode(params)}", timeout=5)
+        self.verification = (resp.status_code, resp.text)
+        return self.verification
+
+    def push(self, body, secret=None, method="sha256"):
+        headers = {"Content-Type": "application/rss+xml"}
+        if secret is not None:
+            digest = hmac.new(secret.encode("utf-8"), body, method).hexdigest()
+            headers["X-Hub-Signature-256" if method == "sha256" else "X-Hub-Signature"] = f"{method}={digest}"
+        return requests.post(self.subscription["hub.callback"], data=body, headers=headers, timeout=5)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+async def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.02)
+
+
+def test_websub_verification_and_signed_push(tmp_path):
+    hub = StandInHub()
+    watcher = make_watcher(tmp_path, FakePipeline(), callback_url="http://placeholder", listen_host="127.0.0.1",
+                           listen_port=0)
+    feed_id = next(iter(watcher.feeds))
+    feed_xml = (f'<rss version="2.0"><channel><title>t</title><link rel="hub" href="{hub.url}"/>'
+                '<item><title>a</title></item></channel></rss>').encode("utf-8")
+
+    async def scenario():
+        watcher._loop = asyncio.get_running_loop()
+        watcher._queue = asyncio.Queue()
+        watcher._start_server()
+        watcher.callback_url = f"http://127.0.0.1:{watcher._server.server_address[1]}"
+        try:
+            parsed = feedparser.parse(
+                b'<feed xmlns="http://www.w3.org/2005/Atom"><title>t</title>'
+                + f'<link rel="hub" href="{hub.url}"/><link rel="self" href="{FEED["rss_url"]}"/></feed>'.encode())
+            watcher._discover_hub(feed_id, parsed)
+            await watcher._subscribe(feed_id)
+            state = watcher.state[feed_id]
+
+            # Hub 回调验证: challenge 原样返回，订阅生效
+            await wait_for(lambda: hub.verification is not None)
+            assert hub.verification == (200, "challenge-123")
+            await wait_for(lambda: state["verified"])
+            assert hub.subscription["hub.secret"] == state["secret"]
+            assert hub.subscription["hub.topic"] == FEED["rss_url"]
+
+            # topic 不符的验证请求不被认可
+            status, _ = await asyncio.to_thread(hub.verify, "subscribe", "http://other.invalid/feed")
+            assert status == 404
+
+            # 签名正确的推送进入处理队列
+            assert (await asyncio.to_thread(hub.push, feed_xml, state["secret"])).status_code == 202
+            received_id, body, _ = await asyncio.wait_for(watcher._queue.get(), 5)
+            assert (received_id, body) == (feed_id, feed_xml)
+
+            # 签名错误、缺少签名、旧式 sha1 签名
+            await asyncio.to_thread(hub.push, feed_xml, "wrong-secret")
+            await asyncio.to_thread(hub.push, feed_xml)
+            await asyncio.to_thread(hub.push, b"<rss/>", state["secret"], "sha1")
+            received_id, body, _ = await asyncio.wait_for(watcher._queue.get(), 5)
+            assert body == b"<rss/>"
+            await asyncio.sleep(0.2)
+            assert watcher._queue.empty()
+        finally:
+            watcher._server.shutdown()
+            watcher._server.server_close()
+            hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_denied_subscription_falls_back_to_polling(tmp_path):
+    watcher = make_watcher(tmp_path, FakePipeline(), callback_url="http://127.0.0.1:9")
+    feed_id = next(iter(watcher.feeds))
+    state = watcher.state[feed_id]
+    state.update(hub="http://hub.invalid", topic=FEED["rss_url"], secret="s")
+
+    async def scenario():
+        watcher._loop = asyncio.get_running_loop()
+        assert watcher._verify_intent(feed_id, {"hub.mode": "denied", "hub.topic": FEED["rss_url"]}) == ""
+        await asyncio.sleep(0)
+        assert state["hub"] is None and not state["verified"]
+
+    asyncio.run(scenario())
+
+
+def test_backlog_entries_are_stored_but_not_alerted(tmp_path):
+    article = {"original_title": "Hot", "link": "http://blog.invalid/hot", "author": FEED["name"],
+               "published": "2026-01-01 00:00", "analysis": {"score": 95, "title_translated": "Hot"},
+               "_published_ts": time.time() - 60}
+    pipeline = FakePipeline([article])
+    watcher = make_watcher(tmp_path, pipeline)
+    watcher.store = []
+    feed_id = next(iter(watcher.feeds))
+    parsed = feedparser.parse(b'<rss version="2.0"><channel><title>t</title></channel></rss>')
+
+    async def scenario():
+        # 启动后首次检查: 积压条目只写入存储
+        await watcher._handle(feed_id, parsed, "poll", time.time())
+        assert len(watcher.store) == 1
+        assert pipeline.notified == []
+        assert not (tmp_path / "latency.jsonl").exists()
+        # 之后发现的新条目立即速递并记录延迟
+        await watcher._handle(feed_id, parsed, "poll", time.time())
+        assert len(watcher.store) == 2
+        assert len(pipeline.notified) == 1
+        assert (tmp_path / "latency.jsonl").exists()
+
+    asyncio.run(scenario())
@@ -0,0 +1,40 @@
+from analysis_store import AnalysisStore, article_domain
+from report_renderer import iter_markdown_lines, iter_html_lines
+
+
+def make_article(n, score, domain):
+    analysis = {"title_translated": f"标题 {n}", "score": score, "one_sentence_summary": "一句话",
+                "summary": "摘要", "key_takeaways": ["要点"], "reason": "理由"}
+    if domain is not ...:
+        analysis["domain"] = domain
+    return {"link": f"http://a/{n}", "author": "Blog", "original_title": f"Title {n}",
+            "published": "2025-01-15 08:00", "analysis": analysis}
+
+
+def test_article_domain_defaults_missing_and_empty():
+    assert article_domain({"domain": "AI"}) == "AI"
+    assert article_domain({"domain": ""}) == "未知"
+    assert article_domain({"domain": None}) == "未知"
+    assert article_domain({}) == "未知"
+    assert article_domain(None) == "未知"
+
+
+def test_domain_template_groups_blank_domains_under_one_heading(tmp_path):
+    store = AnalysisStore(str(tmp_path / "store" / "analyses_2025-01-15.jsonl"))
+    store.append(make_article(1, 90, ""))
+    store.append(make_article(2, 80, "AI"))
+    store.append(make_article(3, 70, None))
+    store.append(make_article(4, 60, ...))
+
+    markdown = "".join(iter_markdown_lines(store, "2025-01-15", template="domain"))
+    assert markdown.count("# 🗂️ 未知\n") == 1
+    assert markdown.count("# 🗂️ AI\n") == 1
+    assert "`None`" not in markdown and "``" not in markdown
+
+    page = "".join(iter_html_lines(store, "2025-01-15", template="domain"))
+    assert page.count("<h1>🗂️ 未知</h1>") == 1
+    assert page.count("<code>未知</code>") == 3
+
+    # 重新加载存储后索引与渲染一致
+    reloaded = AnalysisStore(store.path)
+    assert "".join(iter_markdown_lines(reloaded, "2025-01-15", template="domain")) == markdown
@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+
+from source_registry import SourceRegistry, canonical_url, dedup_feeds
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.Example.com/feed/", "example.com/feed"),
+    ("http://example.com:80/feed#top", "example.com/feed"),
+    ("example.com/feed", "example.com/feed"),
+    ("https://example.com:8443/feed", "example.com:8443/feed"),
+    ("https://example.com/feed?utm_source=x&b=2&a=1&ref=hn&utm_foo=y", "example.com/feed?a=1&b=2"),
+    ("https:\\/\\/example.com\\/feed", "example.com/feed"),
+    ("  ", ""),
+    (None, ""),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+def test_canonical_url_keeps_path_case_and_meaningful_query():
+    assert canonical_url("https://example.com/Feed?id=1") != canonical_url("https://example.com/feed?id=1")
+    assert canonical_url("https://example.com/feed?id=1") != canonical_url("https://example.com/feed?id=2")
+
+
+def test_dedup_feeds_keeps_first_occurrence():
+    feeds = [{"name": "A", "rss_url": "https://www.example.com/feed/"},
+             {"name": "B", "rss_url": "http://example.com/feed?utm_medium=rss"},
+             {"name": "C", "rss_url": "https://other.example.com/feed"},
+             {"name": "D", "rss_url": "https://unrelated.example.org/x", "key": "other.example.com/feed"}]
+    assert [f["name"] for f in dedup_feeds(feeds)] == ["A", "C"]
+
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    source = tmp_path / "channels.json"
+    rss_map = tmp_path / "rss_map.json"
+    finder = tmp_path / "finder.json"
+    opml = tmp_path / "podcasts.opml"
+    write_json(source, [
+        {"姓名": "Alice", "网址": "https://www.alice.example/"},
+        {"姓名": "Alice 镜像", "网址": "http://alice.example"},
+        {"姓名": "Bob", "网址": "https://bob.example/feed"},
+        {"姓名": "无地址", "网址": ""},
+    ])
+    write_json(rss_map, {"https://alice.example/": "https://alice.example/rss.xml"})
+    write_json(finder, {"https://carol.example": ["https://carol.example/comments/feed", "https://carol.example/feed"]})
+    opml.write_text('<opml><body>'
+                    '<outline type="rss" text="Bob Cast" xmlUrl="http://www.bob.example/feed/"/>'
+                    '<outline type="rss" text="Pod" xmlUrl="https://pod.example/rss"/>'
+                    '</body></opml>', encoding="utf-8")
+    return {"source_file": str(source), "rss_map_file": str(rss_map), "finder_file": str(finder),
+            "podcast_opml_file": str(opml)}
+
+
+def test_build_merges_inputs_and_records_duplicates(tmp_path, inputs):
+    registry = SourceRegistry(str(tmp_path / "index.json"), **inputs)
+    feeds = registry.load()
+    # 探测结果中的 carol.example 不在源文件里，默认不纳入
+    assert [(f["name"], f["rss_url"]) for f in feeds] == [
+        ("Alice", "https://alice.example/rss.xml"),
+        ("Bob", "https://bob.example/feed"),
+        ("Pod", "https://pod.example/rss"),
+    ]
+    # 同一 Feed 同时出现在博客和播客输入中时保留先出现的条目，并标记为播客
+    assert feeds[1]["is_podcast"] is True
+    assert {(d["kept"], d["dropped"]) for d in registry.duplicates} == {("Alice", "Alice 镜像"), ("Bob", "Bob Cast")}
+    assert len(dedup_feeds(feeds)) == len(feeds)
+
+
+def test_index_is_reused_until_an_input_changes(tmp_path, inputs, capsys):
+    index_file = str(tmp_path / "index.json")
+    first = SourceRegistry(index_file, **inputs).load()
+    assert "索引已重建" in capsys.readouterr().out
+
+    # 只改 mtime 不改内容: 沿用缓存
+    os.utime(inputs["rss_map_file"], (1, 1))
+    registry = SourceRegistry(index_file, **inputs)
+    assert registry.load() == first
+    assert "索引已重建" not in capsys.readouterr().out
+    assert len(registry.duplicates) == 2
+
+    write_json(inputs["rss_map_file"], {"https://alice.example/": "https://alice.example/atom.xml"})
+    feeds = SourceRegistry(index_file, **inputs).load()
+    assert "索引已重建" in capsys.readouterr().out
+    assert feeds[0]["rss_url"] == "https://alice.example/atom.xml"
+
+    # 输入路径变化同样使缓存失效
+    SourceRegistry(index_file, **dict(inputs, podcast_opml_file=None)).load()
+    assert "索引已重建" in capsys.readouterr().out
+
+
+def test_unlisted_sites_are_opt_in(tmp_path, inputs, capsys):
+    index_file = str(tmp_path / "index.json")
+    assert "carol.example" not in [f["name"] for f in SourceRegistry(index_file, **inputs).load()]
+    # 开关变化使缓存失效
+    feeds = SourceRegistry(index_file, include_unlisted=True, **inputs).load()
+    assert ("carol.example", "https://carol.example/feed") in [(f["name"], f["rss_url"]) for f in feeds]
+    assert capsys.readouterr().out.count("索引已重建") == 2
@@ -0,0 +1,40 @@
+import os
+import types
+
+from stage_profiler import StageProfiler
+
+
+def helper(n):
+    return sum(i * i for i in range(n))
+
+
+def work(n):
+    blocks = [bytearray(1024) for _ in range(200)]
+    return helper(n) + len(blocks)
+
+
+def test_wrapped_stage_writes_collapsed_stacks_and_memory_report(tmp_path):
+    module = types.SimpleNamespace(work=work)
+    profiler = StageProfiler(str(tmp_path), snapshot_calls=2).install([(module, "work", "stage_a")])
+    assert module.work is not work
+    for _ in range(3):
+        assert module.work(50000) == helper(50000) + 200
+    profiler.uninstall()
+    assert module.work is work
+
+    summary = profiler.save()
+    files = set(os.listdir(profiler.output_dir))
+    assert {"stage_a.pstats", "stage_a.collapsed", "stage_a.alloc.txt", "summary.txt"} <= files
+    assert summary.splitlines()[1].split()[:2] == ["stage_a", "3"]
+
+    with open(os.path.join(profiler.output_dir, "stage_a.collapsed"), encoding="utf-8") as f:
+        stacks = [line.rsplit(" ", 1) for line in f.read().splitlines()]
+    # 折叠调用栈以被剖析函数为根，子函数出现在同一路径上，耗时为正整数微秒
+    assert stacks and all(stack.startswith("work (test_stage_profiler.py:") for stack, _ in stacks)
+    assert any(";helper (test_stage_profiler.py:" in stack for stack, _ in stacks)
+    assert all(int(micros) > 0 for _, micros in stacks)
+
+    with open(os.path.join(profiler.output_dir, "stage_a.alloc.txt"), encoding="utf-8") as f:
+        report = f.read()
+    assert report.startswith("# stage_a: 前 2 次调用")
+    assert "test_stage_profiler.py:" in report
@@ -0,0 +1,150 @@
+import time
+import asyncio
+import datetime
+
+import feedparser
+import pytest
+
+from analysis_store import AnalysisStore
+from digest_pipeline import DigestPipeline, DigestSettings
+from subscriber_profiles import SubscriberProfile, select_feeds
+from usage_ledger import UsageLedger
+
+FEEDS = [
+    {"name": "Alice", "homepage": "https://alice.example/", "rss_url": "https://alice.example/feed"},
+    {"name": "Bob", "homepage": "https://bob.example/", "rss_url": "https://bob.example/rss.xml"},
+    {"name": "Aggregator", "homepage": "", "rss_url": "https://agg.example/feed"},
+]
+
+
+def article(author, link, score=80, domain="AI", prefiltered=False):
+    item = {"original_title": link, "link": link, "author": author, "published": "2026-01-01 08:00",
+            "analysis": {"title_translated": link, "score": score, "domain": domain}}
+    if prefiltered:
+        item["prefiltered"] = True
+    return item
+
+
+def profile(name="team", **kwargs):
+    return SubscriberProfile(name, "/tmp/unused", **kwargs)
+
+
+def test_select_feeds_is_union_of_profiles_with_extras_last():
+    ai = profile("ai", sources=["Alice", "https://www.bob.example/rss.xml/"])
+    ops = profile("ops", sources=["https://alice.example/", {"name": "Extra", "rss_url": "https://extra.example/feed"},
+                                  {"rss_url": "http://agg.example/feed"}])
+    news = profile("news", sources=["Aggregator"])
+    selected = select_feeds(FEEDS, [ai, ops, news])
+    # Alice 由名称和主页分别匹配；ops 的额外源与注册表中的 Aggregator 重复，只抓取一次
+    assert [f["name"] for f in selected] == ["Alice", "Bob", "Aggregator", "Extra"]
+    assert ai.feed_names == {"Alice", "Bob"}
+    # 两个名称都能匹配，无论文章署名为哪一个
+    assert ops.feed_names == {"Alice", "Aggregator", "Extra", "http://agg.example/feed"}
+    assert select_feeds(FEEDS, [ops])[-1]["name"] == "http://agg.example/feed"
+
+
+def test_select_feeds_all_sources():
+    everyone = profile(sources=["*"])
+    assert select_feeds(FEEDS, [everyone]) == FEEDS
+    assert not everyone.filters
+
+
+@pytest.mark.parametrize("kwargs, item, sources, expected", [
+    ({"sources": ["Alice"]}, article("Alice", "http://a/1"), None, True),
+    ({"sources": ["Alice"]}, article("Bob", "http://a/1"), None, False),
+    # 跨源去重后文章只署名第一个源，但同时出现在订阅源中时仍属于该订阅者
+    ({"sources": ["Alice"]}, article("Bob", "http://a/1"), {"Bob", "Alice"}, True),
+    ({"min_score": 70}, article("Bob", "http://a/1", score=60), None, False),
+    ({"min_score": 70}, article("Bob", "http://a/1", score="bad"), None, False),
+    # 仅列标题的条目不受评分阈值限制，但仍受领域限制
+    ({"min_score": 70}, article("Bob", "http://a/1", score=10, prefiltered=True), None, True),
+    ({"domains": ["AI"]}, article("Bob", "http://a/1", domain="Infra", prefiltered=True), None, False),
+    ({"domains": ["AI"], "min_score": 50}, article("Bob", "http://a/1", score=50), None, True),
+])
+def test_accepts(kwargs, item, sources, expected):
+    p = profile(**kwargs)
+    p.resolve(FEEDS)
+    assert p.accepts(item, sources) is expected
+
+
+def make_pipeline(tmp_path):
+    settings = DigestSettings({"prefilter": {"enabled": False}}, str(tmp_path))
+    settings.health_enabled = False
+    return DigestPipeline(settings, analyzer=object(), notifier=object(), ranker=None,
+                          ledger=UsageLedger(str(tmp_path / "ledger.db")), log=lambda *_: None)
+
+
+def rss(*links):
+    now = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())
+    items = "".join(f"<item><title>{link}</title><link>{link}</link><pubDate>{now}</pubDate></item>" for link in links)
+    return feedparser.parse(f'<rss version="2.0"><channel><title>t</title>{items}</channel></rss>'.encode())
+
+
+def test_sources_of_collects_every_feed_carrying_a_link(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    now, window = datetime.datetime.now(), datetime.timedelta(hours=24)
+    first = list(pipeline._new_entries(FEEDS[0], rss("https://alice.example/p1?utm_source=x"), now, window))
+    # 聚合源中同一链接 (规范化后相同) 被跳过，但记录下来源
+    second = list(pipeline._new_entries(FEEDS[2], rss("http://www.alice.example/p1", "https://agg.example/own"),
+                                        now, window))
+    assert len(first) == 1 and [e.link for _, e, _ in second] == ["https://agg.example/own"]
+    assert pipeline.sources_of(article("Alice", "https://alice.example/p1")) == {"Alice", "Aggregator"}
+    assert pipeline.sources_of(article("Bob", "https://bob.example/unseen")) == {"Bob"}
+
+
+class FlakyAnalyzer:
+    """第一次分析失败，之后成功"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def analyze(self, content, feed=None):
+        self.calls += 1
+        if self.calls == 1:
+            return None
+        return {"title_translated": "t", "one_sentence_summary": "s", "summary": "s", "domain": "AI", "score": 80}
+
+
+class PageFetcher:
+    def fetch(self, url, is_feed=False, validators=None):
+        return b"<html><body><p>" + b"content " * 50 + b"</p></body></html>"
+
+
+def test_failed_analysis_does_not_mark_link_seen(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    pipeline.fetcher, pipeline.analyzer = PageFetcher(), FlakyAnalyzer()
+    parsed = rss("https://alice.example/p1")
+
+    async def collect(feed):
+        return [a async for a in pipeline.process_update(feed, parsed)]
+
+    # 分析失败: 链接不登记，之后的更新 (或其他源) 中出现时重新分析
+    assert asyncio.run(collect(FEEDS[0])) == []
+    assert pipeline.sources_of(article("Alice", "https://alice.example/p1")) == {"Alice"}
+    assert "alice.example/p1" not in pipeline.link_feeds
+    articles = asyncio.run(collect(FEEDS[2]))
+    assert [a["author"] for a in articles] == ["Aggregator"] and pipeline.analyzer.calls == 2
+    # 成功后同一链接不再重复分析
+    assert asyncio.run(collect(FEEDS[0])) == []
+    assert pipeline.analyzer.calls == 2
+    assert pipeline.sources_of(articles[0]) == {"Aggregator", "Alice"}
+
+
+def test_store_view_fans_out_to_profiles(tmp_path):
+    store = AnalysisStore(str(tmp_path / "store.jsonl"))
+    for item in [article("Alice", "http://a/1", score=90), article("Bob", "http://b/1", score=40),
+                 article("Aggregator", "http://c/1", score=75, domain="Infra"),
+                 article("Bob", "http://b/2", score=10, prefiltered=True)]:
+        store.append(item)
+    sources = {"http://c/1": {"Aggregator", "Bob"}}
+    ai = profile("ai", sources=["Alice"], domains=["AI"])
+    bob = profile("bob", sources=["Bob"], min_score=50)
+    for p in (ai, bob):
+        p.resolve(FEEDS)
+
+    views = {p.name: store.view(lambda a, p=p: p.accepts(a, sources.get(a["link"]))) for p in (ai, bob)}
+    assert [a["link"] for a in views["ai"].iter_articles()] == ["http://a/1"]
+    # 视图共享存储文件，保留评分排序与仅列标题的条目
+    assert [a["link"] for a in views["bob"].iter_articles()] == ["http://c/1"]
+    assert [a["link"] for a in views["bob"].iter_articles(views["bob"].brief_index())] == ["http://b/2"]
+    assert views["bob"].path == store.path and len(store) == 4
@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+
+from usage_ledger import UsageLedger, today
+
+USAGE = {"prompt_tokens": 1001, "completion_tokens": 301, "prompt_cache_hit_tokens": 600,
+         "prompt_cache_miss_tokens": 401}
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "ledger.db"))
+    yield ledger
+    ledger.close()
+
+
+def by_key(rows):
+    return {r["key"]: r for r in rows}
+
+
+def test_split_preserves_totals_and_counts_one_request(ledger):
+    ledger.record_split(USAGE, [("A", 1), ("B", 2), ("C", 0)], "article_batch", "deepseek", "deepseek-chat",
+                        latency=3.0)
+    rows = ledger.conn.execute("SELECT feed, prompt_tokens, completion_tokens, cache_hit_tokens, request_id "
+                               "FROM usage ORDER BY id").fetchall()
+    assert [r["feed"] for r in rows] == ["A", "B", "C"]
+    assert sum(r["prompt_tokens"] for r in rows) == 1001
+    assert sum(r["completion_tokens"] for r in rows) == 301
+    assert sum(r["cache_hit_tokens"] for r in rows) == 600
+    assert len({r["request_id"] for r in rows}) == 1
+
+    stage = ledger.summary(group_by="stage")
+    assert len(stage) == 1
+    assert stage[0]["requests"] == 1 and stage[0]["prompt_tokens"] == 1001 and stage[0]["avg_latency"] == 3.0
+    expected_cost = ledger.estimate_cost("deepseek-chat", 1001, 301, 600)
+    assert stage[0]["cost"] == pytest.approx(expected_cost)
+
+    # 按来源汇总时每个来源各计一次，tokens 与费用按权重拆分
+    feeds = by_key(ledger.summary(group_by="feed"))
+    assert {k: r["requests"] for k, r in feeds.items()} == {"A": 1, "B": 1, "C": 1}
+    assert feeds["B"]["prompt_tokens"] == 667
+    assert sum(r["cost"] for r in feeds.values()) == pytest.approx(expected_cost)
+
+
+def test_separate_requests_are_counted_separately(ledger):
+    ledger.record_split(USAGE, [("A", 1), ("B", 1)], "article_batch", "deepseek", "deepseek-chat")
+    ledger.record_split(USAGE, [("A", 1), ("B", 1)], "article_batch", "deepseek", "deepseek-chat", ok=False)
+    ledger.record("article", "deepseek", "deepseek-chat", "A", prompt_tokens=10)
+    stages = by_key(ledger.summary(group_by="stage"))
+    assert stages["article_batch"]["requests"] == 2
+    assert stages["article_batch"]["failures"] == 1
+    assert stages["article"]["requests"] == 1
+    assert by_key(ledger.summary(day=today(), group_by="feed"))["A"]["requests"] == 3
+
+
+def test_rows_from_before_request_ids_count_individually(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE usage (id INTEGER PRIMARY KEY, ts REAL NOT NULL, day TEXT NOT NULL, feed TEXT, "
+                 "stage TEXT NOT NULL, provider TEXT NOT NULL, model TEXT, prompt_tokens INTEGER DEFAULT 0, "
+                 "completion_tokens INTEGER DEFAULT 0, cache_hit_tokens INTEGER DEFAULT 0, "
+                 "cache_miss_tokens INTEGER DEFAULT 0, asr_seconds REAL DEFAULT 0, latency REAL DEFAULT 0, "
+                 "ok INTEGER DEFAULT 1, cost REAL DEFAULT 0)")
+    for feed in ("A", "B"):
+        conn.execute("INSERT INTO usage (ts, day, feed, stage, provider) VALUES (0, '2025-01-01', ?, 'article', 'x')",
+                     (feed,))
+    conn.commit()
+    conn.close()
+
+    ledger = UsageLedger(path)
+    try:
+        assert ledger.summary(group_by="stage")[0]["requests"] == 2
+    finally:
+        ledger.close()
+
+
+def test_budget_and_unknown_grouping(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "ledger.db"), budgets={"per_feed_daily_llm_tokens": 900})
+    try:
+        ledger.record_split(USAGE, [("A", 3), ("B", 1)], "article_batch", "deepseek", "deepseek-chat")
+        assert ledger.budget_exceeded("llm", "A")
+        assert ledger.budget_exceeded("llm", "B") is None
+        with pytest.raises(ValueError):
+            ledger.summary(group_by="feed; DROP TABLE usage")
+    finally:
+        ledger.close()
+
+
+def test_recent_asr_speed_needs_enough_samples(ledger):
+    for seconds, latency in ((600, 60), (600, 30)):
+        ledger.record("podcast_asr", "dashscope", "paraformer-v1", asr_seconds=seconds, latency=latency)
+    assert ledger.recent_asr_speed() is None
+    ledger.record("podcast_asr", "dashscope", "paraformer-v1", asr_seconds=600, latency=120)
+    ledger.record("podcast_asr", "dashscope", "paraformer-v1", asr_seconds=600, latency=1, ok=False)
+    assert ledger.recent_asr_speed() == 10
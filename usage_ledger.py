@@ -0,0 +1,254 @@
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import threading
+import argparse
+import datetime
+
+# ==========================================
+# Token / 费用账本
+# ==========================================
+# 记录每次 LLM / ASR 请求的用量，按来源 (feed)、阶段 (stage)、模型 (model) 打标签:
+#   - prompt / completion tokens，DeepSeek 的缓存命中 / 未命中 tokens
+#   - ASR 音频时长、请求耗时
+# 可按天、按来源查询，并按配置的硬性预算在超限后停止新的 LLM / ASR 工作。
+
+DEFAULT_LEDGER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_reports", "usage_ledger.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    feed TEXT,
+    stage TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    cache_hit_tokens INTEGER DEFAULT 0,
+    cache_miss_tokens INTEGER DEFAULT 0,
+    asr_seconds REAL DEFAULT 0,
+    latency REAL DEFAULT 0,
+    ok INTEGER DEFAULT 1,
+    cost REAL DEFAULT 0,
+    request_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_usage_day_feed ON usage(day, feed);
+"""
+
+# 默认单价 (元 / 百万 tokens；ASR 为元 / 分钟)，可在 config.json 的 usage.pricing 中覆盖
+DEFAULT_PRICING = {
+    "deepseek-chat": {"input": 2.0, "input_cache_hit": 0.5, "output": 8.0},
+    "qwen-turbo": {"input": 0.3, "output": 0.6},
+    "paraformer-v1": {"per_minute": 0.0144},
+}
+
+
+def today(clock=datetime.datetime.now):
+    return clock().strftime("%Y-%m-%d")
+
+
+class UsageLedger:
+    """LLM / ASR 用量账本 (SQLite)"""
+
+    def __init__(self, path=DEFAULT_LEDGER_FILE, pricing=None, budgets=None, clock=datetime.datetime.now, log=print):
+        """
+        clock: 返回当前时间的函数，决定用量记入哪一天 (回放时传入 cassette.now，与日报日期一致)。
+        log: 预算告警的输出函数。
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # 流水线会在线程池中记录用量，连接跨线程共享并由锁串行化
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        columns = {r[1] for r in self.conn.execute("PRAGMA table_info(usage)")}
+        if "request_id" not in columns:
+            # 批量请求拆分到多个来源时各行共享同一 request_id，汇总时按请求计数 (旧记录按行计数)
+            self.conn.execute("ALTER TABLE usage ADD COLUMN request_id TEXT")
+        self.conn.commit()
+        self.pricing = dict(DEFAULT_PRICING)
+        self.pricing.update(pricing or {})
+        # 支持的预算项 (均为当日上限，0 或缺省表示不限制):
+        #   daily_llm_tokens / daily_asr_minutes / daily_cost / per_feed_daily_llm_tokens
+        self.budgets = budgets or {}
+        self._warned = set()
+        self.clock = clock
+        self.log = log
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- 记录 ----------
+
+    def estimate_cost(self, model, prompt_tokens=0, completion_tokens=0, cache_hit_tokens=0, asr_seconds=0):
+        price = self.pricing.get(model, {})
+        if "per_minute" in price:
+            return asr_seconds / 60 * price["per_minute"]
+        cache_miss = max(prompt_tokens - cache_hit_tokens, 0)
+        return (cache_miss * price.get("input", 0)
+                + cache_hit_tokens * price.get("input_cache_hit", price.get("input", 0))
+                + completion_tokens * price.get("output", 0)) / 1_000_000
+
+    def record(self, stage, provider, model, feed=None, prompt_tokens=0, completion_tokens=0,
+               cache_hit_tokens=0, cache_miss_tokens=0, asr_seconds=0, latency=0, ok=True, request_id=None):
+        """记录一行用量；request_id 缺省时视为独立请求"""
+        cost = self.estimate_cost(model, prompt_tokens, completion_tokens, cache_hit_tokens, asr_seconds)
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO usage (ts, day, feed, stage, provider, model, prompt_tokens, completion_tokens, "
+                "cache_hit_tokens, cache_miss_tokens, asr_seconds, latency, ok, cost, request_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), today(self.clock), feed, stage, provider, model, prompt_tokens, completion_tokens,
+                 cache_hit_tokens, cache_miss_tokens, asr_seconds, round(latency, 3), 1 if ok else 0, cost,
+                 request_id or uuid.uuid4().hex),
+            )
+            self.conn.commit()
+
+    def record_openai_usage(self, usage, stage, provider, model, feed=None, latency=0, ok=True, request_id=None):
+        """记录 OpenAI 兼容接口 (DeepSeek) 返回的 usage 块"""
+        usage = usage or {}
+        self.record(stage, provider, model, feed,
+                    prompt_tokens=usage.get("prompt_tokens", 0),
+                    completion_tokens=usage.get("completion_tokens", 0),
+                    cache_hit_tokens=usage.get("prompt_cache_hit_tokens", 0),
+                    cache_miss_tokens=usage.get("prompt_cache_miss_tokens", 0),
+                    latency=latency, ok=ok, request_id=request_id)
+
+    def record_split(self, usage, feeds_weights, stage, provider, model, latency=0, ok=True):
+        """
+        把一次批量请求的 usage 按权重拆分到多个来源 (feed, weight)，保证各项合计等于原值。
+        拆分出的各行共享同一 request_id，汇总时仍计为一次请求。
+        """
+        usage = usage or {}
+        request_id = uuid.uuid4().hex
+        total_weight = sum(w for _, w in feeds_weights) or 1
+        keys = ("prompt_tokens", "completion_tokens", "prompt_cache_hit_tokens", "prompt_cache_miss_tokens")
+        allocated = {k: 0 for k in keys}
+        for i, (feed, weight) in enumerate(feeds_weights):
+            part = {}
+            for k in keys:
+                value = usage.get(k, 0) or 0
+                if i == len(feeds_weights) - 1:
+                    part[k] = value - allocated[k]
+                else:
+                    part[k] = int(value * weight / total_weight)
+                    allocated[k] += part[k]
+            self.record_openai_usage(part, stage, provider, model, feed, latency=latency, ok=ok, request_id=request_id)
+
+    # ---------- 预算 ----------
+
+    def _day_totals(self, feed=None):
+        sql = ("SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) AS tokens, "
+               "COALESCE(SUM(asr_seconds), 0) AS asr_seconds, COALESCE(SUM(cost), 0) AS cost "
+               "FROM usage WHERE day = ?")
+        params = [today(self.clock)]
+        if feed is not None:
+            sql += " AND feed = ?"
+            params.append(feed)
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def budget_exceeded(self, kind, feed=None):
+        """
+        返回超限原因字符串 (未超限返回 None)。
+        kind: "llm" 或 "asr"。llm 预算只停止 LLM 调用，asr 预算只停止播客转写，费用预算两者都停。
+        """
+        totals = self._day_totals()
+        reason = None
+        if self.budgets.get("daily_cost") and totals["cost"] >= self.budgets["daily_cost"]:
+            reason = f"当日费用 {totals['cost']:.2f} 已达上限 {self.budgets['daily_cost']}"
+        elif kind == "llm" and self.budgets.get("daily_llm_tokens") and totals["tokens"] >= self.budgets["daily_llm_tokens"]:
+            reason = f"当日 LLM tokens {totals['tokens']} 已达上限 {self.budgets['daily_llm_tokens']}"
+        elif kind == "asr" and self.budgets.get("daily_asr_minutes") and totals["asr_seconds"] / 60 >= self.budgets["daily_asr_minutes"]:
+            reason = f"当日 ASR {totals['asr_seconds'] / 60:.1f} 分钟已达上限 {self.budgets['daily_asr_minutes']}"
+        elif kind == "llm" and feed and self.budgets.get("per_feed_daily_llm_tokens"):
+            feed_tokens = self._day_totals(feed)["tokens"]
+            if feed_tokens >= self.budgets["per_feed_daily_llm_tokens"]:
+                reason = f"来源 {feed} 当日 LLM tokens {feed_tokens} 已达上限"
+        if reason and reason not in self._warned:
+            self._warned.add(reason)
+            self.log(f"[!] 预算已用尽，停止新的 {kind.upper()} 工作: {reason}")
+        return reason
+
+    # ---------- 查询 ----------
+
+    def recent_asr_speed(self, limit=20, min_samples=3):
+        """最近成功转写的处理速度中位数 (音频秒数 / 耗时秒数)，样本不足时返回 None"""
+        sql = ("SELECT asr_seconds / latency AS speed FROM usage "
+               "WHERE stage = 'podcast_asr' AND ok = 1 AND asr_seconds > 0 AND latency > 0 "
+               "ORDER BY id DESC LIMIT ?")
+        with self._lock:
+            speeds = sorted(r["speed"] for r in self.conn.execute(sql, (limit,)))
+        if len(speeds) < min_samples:
+            return None
+        return speeds[len(speeds) // 2]
+
+    def summary(self, day=None, group_by="feed", since=None, until=None):
+        """
+        按 feed / stage / model / day 汇总用量。
+        请求数按 request_id 去重 (批量请求拆分的多行在同一分组内只计一次)，耗时按请求平均。
+        """
+        if group_by not in ("feed", "stage", "model", "day", "provider"):
+            raise ValueError(f"不支持的分组: {group_by}")
+        clauses, params = [], []
+        if day:
+            clauses.append("day = ?")
+            params.append(day)
+        if since:
+            clauses.append("day >= ?")
+            params.append(since)
+        if until:
+            clauses.append("day <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        per_request = (f"SELECT {group_by} AS key, MAX(1 - ok) AS failed, "
+                       "SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens, "
+                       "SUM(cache_hit_tokens) AS cache_hit_tokens, SUM(asr_seconds) AS asr_seconds, "
+                       "MAX(latency) AS latency, SUM(cost) AS cost "
+                       f"FROM usage {where} GROUP BY {group_by}, COALESCE(request_id, 'row-' || id)")
+        sql = ("SELECT key, COUNT(*) AS requests, SUM(failed) AS failures, "
+               "SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens, "
+               "SUM(cache_hit_tokens) AS cache_hit_tokens, SUM(asr_seconds) AS asr_seconds, "
+               "AVG(latency) AS avg_latency, SUM(cost) AS cost "
+               f"FROM ({per_request}) GROUP BY key ORDER BY cost DESC")
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(sql, params)]
+
+
+def format_summary(rows, group_by):
+    lines = [f"{group_by:<30} {'请求':>6} {'失败':>4} {'输入tokens':>11} {'输出tokens':>10} "
+             f"{'缓存命中':>9} {'ASR分钟':>8} {'平均耗时':>8} {'费用(元)':>9}"]
+    total = 0.0
+    for r in rows:
+        total += r['cost'] or 0
+        lines.append(f"{str(r['key'] or '-')[:30]:<30} {r['requests']:>6} {r['failures'] or 0:>4} "
+                     f"{r['prompt_tokens'] or 0:>11} {r['completion_tokens'] or 0:>10} "
+                     f"{r['cache_hit_tokens'] or 0:>9} {(r['asr_seconds'] or 0) / 60:>8.1f} "
+                     f"{r['avg_latency'] or 0:>7.1f}s {r['cost'] or 0:>9.3f}")
+    lines.append(f"[*] 合计费用: {total:.3f} 元")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查询 LLM / ASR 用量账本")
+    parser.add_argument("--db", default=DEFAULT_LEDGER_FILE)
+    parser.add_argument("--day", help="日期 YYYY-MM-DD (默认今天，与 --since/--until 互斥)")
+    parser.add_argument("--since")
+    parser.add_argument("--until")
+    parser.add_argument("--by", default="feed", choices=["feed", "stage", "model", "day", "provider"])
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"[-] 账本不存在: {args.db}")
+        sys.exit(1)
+
+    ledger = UsageLedger(args.db)
+    day = args.day or (None if (args.since or args.until) else today())
+    print(format_summary(ledger.summary(day, args.by, args.since, args.until), args.by))
+    ledger.close()